@@ -0,0 +1,131 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, "../flask")
+
+import app as server  # noqa: E402
+import database  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+
+def make_batch(rng, movie_ids, size):
+    """A mixed batch: mostly adds and watches, some removes and review edits.
+
+    Removes take back a film added earlier in the batch, as the one-film
+    route answers 500 for a film that is not on the backlog.
+    """
+    operations, added = [], []
+    for movie_id in rng.sample(movie_ids, size):
+        op = rng.choices(
+            ["add_to_backlog", "mark_watched", "remove_from_backlog", "update_review"],
+            weights=[4, 4, 1, 1],
+        )[0]
+        if op == "remove_from_backlog" and added:
+            movie_id = added.pop(rng.randrange(len(added)))
+        elif op == "remove_from_backlog":
+            op = "add_to_backlog"
+        if op == "add_to_backlog":
+            added.append(movie_id)
+        operation = {"op": op, "movie_id": movie_id}
+        if op in ("mark_watched", "update_review"):
+            operation.update(review="Bulk test", rating=rng.randint(0, 10))
+        operations.append(operation)
+    return operations
+
+
+def one_by_one(client, username, operations):
+    """The same operations through the one-film routes, a request each."""
+    for operation in operations:
+        movie_id = operation["movie_id"]
+        body = dict(operation, username=username)
+        if operation["op"] == "add_to_backlog":
+            response = client.post("/add_to_backlog", json={"movie_id": movie_id})
+        elif operation["op"] == "remove_from_backlog":
+            response = client.delete(f"/remove_from_backlog/{movie_id}")
+        elif operation["op"] == "mark_watched":
+            response = client.post("/mark_watched", json=body)
+        else:
+            response = client.post("/update_movie_review", json=body)
+        assert response.status_code == 200, (operation, response.status_code)
+
+
+def in_bulk(client, username, operations):
+    response = client.post("/bulk", json={"operations": operations})
+    assert response.status_code == 200, response.json
+
+
+def snapshot(db_path, username):
+    """The user's backlog and watched rows, without timestamps."""
+    conn = sqlite3.connect(db_path)
+    backlog = conn.execute(
+        "SELECT movie_id FROM backlog WHERE username = ? ORDER BY movie_id",
+        (username,),
+    ).fetchall()
+    watched = conn.execute(
+        "SELECT movie_id, review, rating FROM watched WHERE username = ? "
+        "ORDER BY movie_id",
+        (username,),
+    ).fetchall()
+    conn.close()
+    return backlog, watched
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput of 1k-operation batches through /bulk against"
+        " one request per operation"
+    )
+    parser.add_argument("--db", default=database.DATABASE, help="copied, not changed")
+    parser.add_argument("--size", type=int, default=1000, help="operations per batch")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    source = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    username = source.execute("SELECT username FROM users LIMIT 1").fetchone()[0]
+    movie_ids = [row[0] for row in source.execute("SELECT id FROM movies")]
+    rng = random.Random(args.seed)
+    batches = [make_batch(rng, movie_ids, args.size) for _ in range(args.batches)]
+
+    modes = {"one by one": one_by_one, "bulk": in_bulk}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, apply in modes.items():
+            # Both start from the same copy and apply the same batches
+            db_path = os.path.join(tmp, f"{name.replace(' ', '-')}.sqlite")
+            target = sqlite3.connect(db_path)
+            source.backup(target)
+            target.close()
+            database.pool = ConnectionPool(db_path)
+            client = server.app.test_client()
+            with client.session_transaction() as session:
+                session["_user_id"] = username
+                session["_fresh"] = True
+
+            samples = []
+            for operations in batches:
+                start = time.perf_counter()
+                apply(client, username, operations)
+                samples.append(time.perf_counter() - start)
+            database.pool.close()
+            results[name] = (statistics.median(samples), snapshot(db_path, username))
+    source.close()
+
+    print(f"{'mode':<12}{'ms/batch':>10}{'ops/s':>10}")
+    for name, (seconds, _) in results.items():
+        print(f"{name:<12}{seconds * 1000:>10.1f}{args.size / seconds:>10.0f}")
+    same = results["one by one"][1] == results["bulk"][1]
+    print(
+        f"median of {args.batches} batches of {args.size} operations;"
+        f" final backlog and watched rows {'match' if same else 'DIFFER'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
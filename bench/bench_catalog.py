@@ -0,0 +1,135 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import database  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+ENGINES = ("sqlite", "columnar")
+LIMIT = 25
+
+
+def cases(genre, collection):
+    """Sorts and filters to time, each as get_movies keyword arguments."""
+    filters = {
+        "": {},
+        f"genre={genre}": {"genre": genre},
+        "collection": {"collection": collection},
+        f"{genre}+collection": {"genre": genre, "collection": collection},
+    }
+    for sort_by in database.SORT_COLUMNS:
+        for label, extra in filters.items():
+            yield f"{sort_by} {label}".strip(), dict(sort_by=sort_by, **extra)
+
+
+def browse(case, order, offset=0, **kwargs):
+    return database.get_movies(
+        LIMIT,
+        offset,
+        case["sort_by"],
+        order,
+        genre=case.get("genre"),
+        collection=case.get("collection"),
+        **kwargs,
+    )
+
+
+def walk(engine, case, pages, order):
+    """Every page from the first, by cursor, as get_movies returns them."""
+    database.CATALOG_ENGINE = engine
+    results, cursor = [], None
+    for _ in range(pages):
+        result = browse(case, order, cursor=cursor)
+        results.append(result)
+        cursor = result[2]
+        if cursor is None:
+            break
+    return results
+
+
+def timed(engine, call, repeat):
+    database.CATALOG_ENGINE = engine
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="The movie browser in SQLite and in the columnar catalog"
+    )
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=40, help="pages compared per case")
+    parser.add_argument("--offset", type=int, default=2000, help="deep page offset")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    genre = conn.execute(
+        "SELECT genre FROM movie_genres GROUP BY genre ORDER BY COUNT(*) DESC"
+    ).fetchone()[0]
+    collection = conn.execute(
+        f"SELECT collection FROM movies WHERE {database.BROWSABLE} AND "
+        "collection IS NOT NULL GROUP BY collection ORDER BY COUNT(*) DESC"
+    ).fetchone()[0]
+    conn.close()
+
+    database.pool = ConnectionPool(args.db)
+    database.CATALOG_ENGINE = "columnar"
+    started = time.perf_counter()
+    catalog = database.get_columnar_catalog()
+    print(
+        f"loaded {len(catalog)} browsable movies in"
+        f" {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+
+    print(
+        f"{'case':<36}{'sqlite':>9}{'columnar':>9}{'sqlite':>9}{'columnar':>9}"
+        f"{'':>4}{'pages':>7}"
+    )
+    print(f"{'':<36}{'first page':>18}{f'offset {args.offset}':>18}")
+    differ = 0
+    for label, case in cases(genre, collection):
+        # Both directions, every page until the end or --pages
+        pages, same = 0, True
+        for order in ("desc", "asc"):
+            sqlite_pages = walk("sqlite", case, args.pages, order)
+            same &= walk("columnar", case, args.pages, order) == sqlite_pages
+            pages += len(sqlite_pages)
+        differ += not same
+
+        def first_page():
+            # A new total every time, as the count cache would otherwise hide it
+            database.count_cache.clear()
+            browse(case, "desc")
+
+        def deep_page():
+            browse(case, "desc", args.offset, with_total=False)
+
+        times = [
+            timed(engine, page, args.repeat)
+            for page in (first_page, deep_page)
+            for engine in ENGINES
+        ]
+        print(
+            f"{label:<36}"
+            + "".join(f"{ms:>9.2f}" for ms in times)
+            + f"{'' if same else ' !!':>4}{pages:>7}"
+        )
+    database.pool.close()
+    print(
+        f"median ms per get_movies call; the first page includes the total."
+        f" Up to {args.pages} pages compared each way per case:"
+        f" {differ or 'no'} cases differ"
+    )
+
+
+if __name__ == "__main__":
+    main()
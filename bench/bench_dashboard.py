@@ -0,0 +1,111 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import app as server  # noqa: E402
+import database  # noqa: E402
+import metrics  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+
+def separate_calls(client, username):
+    """What ProfilePage.vue did: four requests, the last one for the posters."""
+    client.get(f"/get_user_profile?username={username}")
+    client.get(f"/friends/{username}")
+    movies = client.get(f"/get_watched_movies?username={username}").json["movies"]
+    imdb_ids = ",".join(dict.fromkeys(movie["imdb_id"] for movie in movies))
+    client.get(f"/get_posters?imdb_ids={imdb_ids}")
+    return 4
+
+
+def dashboard(limit):
+    def view(client, username):
+        response = client.get(f"/dashboard/{username}?limit={limit}")
+        assert response.status_code == 200, response.status_code
+        return 1
+
+    return view
+
+
+def measure(view, client, username, repeat):
+    """Return (median ms per page view, requests, SQL statements, transactions)."""
+    statements = metrics.registry.total("reelfriends_sql_statement_seconds")
+    transactions = database.pool.stats()["checkouts"]
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        requests = view(client, username)
+        samples.append((time.perf_counter() - start) * 1000)
+    statements = (
+        metrics.registry.total("reelfriends_sql_statement_seconds") - statements
+    )
+    transactions = database.pool.stats()["checkouts"] - transactions
+    return (
+        statistics.median(samples),
+        requests,
+        statements / repeat,
+        transactions / repeat,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Loading a profile page through separate calls or /dashboard"
+    )
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    # A user with a typical watched list, and the one with the longest
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    counts = conn.execute(
+        "SELECT username, COUNT(*) FROM watched GROUP BY username ORDER BY 2"
+    ).fetchall()
+    imdb_ids = [row[0] for row in conn.execute("SELECT imdb_id FROM movies")]
+    conn.close()
+    users = {"median user": counts[len(counts) // 2], "heaviest user": counts[-1]}
+
+    database.pool = ConnectionPool(args.db, factory=metrics.InstrumentedConnection)
+    metrics.SLOW_QUERY_SECONDS = float("inf")
+    # Every poster is already cached, so no call goes out to TMDB
+    for imdb_id in imdb_ids:
+        database.poster_cache.memory.put(imdb_id, (None, time.time()))
+
+    views = {
+        "separate calls": separate_calls,
+        "dashboard": dashboard(server.DASHBOARD_LIMIT),
+        "dashboard 100": dashboard(100),
+    }
+    print(f"{'user':<22}{'view':<16}{'ms':>8}{'requests':>10}{'stmts':>7}{'txns':>6}")
+    for label, (username, watched) in users.items():
+        client = server.app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = username
+            session["_fresh"] = True
+        results = {}
+        for _ in range(args.rounds):
+            # Alternate so drift in the machine hits both sides alike
+            for name, view in views.items():
+                view(client, username)  # warm up
+                result = measure(view, client, username, args.repeat)
+                if name not in results or result[0] < results[name][0]:
+                    results[name] = result
+        for name, (ms, requests, statements, transactions) in results.items():
+            print(
+                f"{f'{label} ({watched})':<22}{name:<16}{ms:>8.2f}{requests:>10}"
+                f"{statements:>7.0f}{transactions:>6.0f}"
+            )
+    print(
+        "best median ms per page view through the test client; stmts include"
+        " BEGIN/COMMIT, and a browser also pays a network round trip per request"
+    )
+    database.pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, "../data")
+
+from fix_data import process_movies  # noqa: E402
+
+# The columns of the raw TMDB dump that fix_data.py reads
+RAW_COLUMNS = [
+    "belongs_to_collection",
+    "budget",
+    "genres",
+    "id",
+    "imdb_id",
+    "original_language",
+    "original_title",
+    "overview",
+    "popularity",
+    "production_companies",
+    "production_countries",
+    "release_date",
+    "revenue",
+    "runtime",
+    "spoken_languages",
+    "title",
+    "vote_average",
+    "vote_count",
+]
+GENRES = ["Drama", "Comedy", "Thriller", "Romance", "Action", "Horror", "Crime"]
+WORDS = ["night", "love", "war", "king's", "star", "dark", "city", "o'brien", "river"]
+
+
+def name_list(rng, names, most):
+    items = rng.sample(names, rng.randint(0, most))
+    return repr([{"id": rng.randrange(1000), "name": name} for name in items])
+
+
+def write_raw(path, rows, seed):
+    """Write a synthetic dump shaped like the real one, apostrophes included."""
+    rng = random.Random(seed)
+    companies = [f"{rng.choice(WORDS).title()} Pictures {i}" for i in range(2000)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(RAW_COLUMNS)
+        for i in range(rows):
+            title = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+            collection = (
+                repr({"id": i, "name": f"{title} Collection", "poster_path": None})
+                if rng.random() < 0.1
+                else ""
+            )
+            writer.writerow(
+                [
+                    collection,
+                    rng.randrange(10**8),
+                    name_list(rng, GENRES, 3),
+                    i,
+                    f"tt{i:07d}",
+                    "en",
+                    title,
+                    " ".join(rng.choice(WORDS) for _ in range(40)),
+                    rng.random() * 50,
+                    name_list(rng, companies, 3),
+                    repr([{"iso_3166_1": "US", "name": "United States of America"}]),
+                    "" if rng.random() < 0.01 else "1999-01-01",
+                    rng.randrange(10**8),
+                    rng.randrange(60, 200),
+                    repr([{"iso_639_1": "en", "name": "English"}]),
+                    title,
+                    round(rng.random() * 10, 1),
+                    rng.randrange(5000),
+                ]
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fix_data.py pipeline")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--workers", default=None, help="comma-separated, e.g. 1,2,4")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    workers = (
+        [int(w) for w in args.workers.split(",")]
+        if args.workers
+        else sorted({1, 2, max(cores // 2, 1), cores})
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "movies_raw.csv")
+        write_raw(raw, args.rows, args.seed)
+        print(f"{args.rows} synthetic rows, {cores} cores")
+        print(f"{'workers':>8}{'seconds':>10}{'rows/sec':>12}{'speedup':>10}")
+        baseline = None
+        for count in workers:
+            result = process_movies(
+                raw,
+                os.path.join(tmp, "movies_clean.csv"),
+                os.path.join(tmp, "rejects.jsonl"),
+                workers=count,
+            )
+            baseline = baseline or result["rows_per_sec"]
+            print(
+                f"{count:>8}{result['seconds']:>10.2f}{result['rows_per_sec']:>12.0f}"
+                f"{result['rows_per_sec'] / baseline:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import csv
+import io
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, "../flask")
+
+import app as server  # noqa: E402
+import database  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+HEADER = ["Date", "Name", "Year", "Letterboxd URI", "Rating", "Rewatch", "Tags"]
+
+
+def diary(rng, films, rows, miss_rate):
+    """A Letterboxd diary.csv: catalog films, some rewatched, some unknown."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(HEADER + ["Watched Date"])
+    for i in range(rows):
+        title, year = rng.choice(films)
+        if rng.random() < miss_rate:
+            title = f"Not In The Catalog {i}"
+        rating = rng.choice(["", "0.5", "2", "3.5", "4", "5"])
+        watched_on = (
+            f"20{rng.randint(10, 23)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        )
+        writer.writerow(["", title, year, "", rating, "", "", watched_on])
+    return out.getvalue().encode()
+
+
+def other_requests(client, stop, latencies):
+    """Everyone else browsing the catalog meanwhile."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.get("/get_movies?sort_by=popularity&fields=title")
+        assert response.status_code == 200, response.status_code
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def run(client, others, body, concurrent):
+    stop, latencies, threads = threading.Event(), [], []
+    for other in others if concurrent else ():
+        thread = threading.Thread(target=other_requests, args=(other, stop, latencies))
+        thread.start()
+        threads.append(thread)
+    start = time.perf_counter()
+    report = None
+    if body is not None:
+        response = client.post(
+            "/import", data={"file": (io.BytesIO(body), "diary.csv")}
+        )
+        assert response.status_code == 200, response.json
+        report = response.json
+    else:
+        time.sleep(2)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return elapsed, report, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time a diary.csv import and what it does to other requests"
+    )
+    parser.add_argument("--db", default=database.DATABASE, help="copied, not changed")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--miss-rate", type=float, default=0.02)
+    parser.add_argument("--readers", type=int, default=4, help="concurrent browsers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    source = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    films = source.execute(
+        "SELECT title, substr(release_date, 1, 4) FROM movies WHERE title IS NOT NULL"
+    ).fetchall()
+    username = source.execute("SELECT username FROM users LIMIT 1").fetchone()[0]
+    body = diary(random.Random(args.seed), films, args.rows, args.miss_rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "import.sqlite")
+        target = sqlite3.connect(db_path)
+        source.backup(target)
+        target.close()
+        database.pool = ConnectionPool(db_path)
+
+        clients = []
+        for _ in range(args.readers + 1):
+            client = server.app.test_client()
+            with client.session_transaction() as session:
+                session["_user_id"] = username
+                session["_fresh"] = True
+            clients.append(client)
+        client, others = clients[0], clients[1:]
+        database.get_title_index()  # built once per catalog version
+
+        _, _, idle = run(client, others, None, True)
+        alone, report, _ = run(client, others, body, False)
+        # Import the same file again, with the other requests running
+        together, _, busy = run(client, others, body, True)
+        database.pool.close()
+    source.close()
+
+    print(
+        f"{args.rows} rows: {report['imported']} imported, {report['unmatched']}"
+        f" unmatched in {alone:.2f}s ({args.rows / alone:.0f} rows/s)"
+    )
+    print(f"again with {args.readers} browsing threads: {together:.2f}s")
+    for label, latencies in (("idle", idle), ("during import", busy)):
+        latencies.sort()
+        print(
+            f"/get_movies {label:<14} p50 {statistics.median(latencies):6.2f} ms"
+            f"  p99 {latencies[int(len(latencies) * 0.99) - 1]:6.2f} ms"
+            f"  ({len(latencies)} requests)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import database  # noqa: E402
+import metrics  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+
+def workload(username, imdb_id, movie_id):
+    """Read helpers the way a browsing session calls them."""
+    return [
+        ("get_user", lambda: database.get_user(username)),
+        ("get_movie_by_imdb_id", lambda: database.get_movie_by_imdb_id(imdb_id)),
+        ("get_movie_reviews", lambda: database.get_movie_reviews(movie_id)),
+        ("get_movies", lambda: database.get_movies(25, 0, "popularity", "desc")),
+        ("get_friends", lambda: database.get_friends(username)),
+        ("get_friend_activities", lambda: database.get_friend_activities(username)),
+        ("get_watched_movies", lambda: database.get_watched_movies(username)),
+    ]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure what the SQL instrumentation adds to each helper call"
+    )
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    username = conn.execute(
+        "SELECT username FROM watched GROUP BY username ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+    movie_id, imdb_id = conn.execute(
+        "SELECT id, imdb_id FROM movies ORDER BY vote_count DESC LIMIT 1"
+    ).fetchone()
+    conn.close()
+
+    pools = {
+        "plain": ConnectionPool(args.db),
+        "instrumented": ConnectionPool(args.db, factory=metrics.InstrumentedConnection),
+    }
+    # Keep the slow-query log out of the timings
+    metrics.SLOW_QUERY_SECONDS = float("inf")
+
+    results = {}
+    for name, call in workload(username, imdb_id, movie_id):
+        best = {}
+        for _ in range(args.rounds):
+            # Alternate so drift in the machine hits both sides alike
+            for kind, pool in pools.items():
+                database.pool = pool
+                call()  # warm the statement caches
+                before = metrics.registry.total("reelfriends_sql_statement_seconds")
+                median = timed(call, args.repeat)
+                statements = (
+                    metrics.registry.total("reelfriends_sql_statement_seconds") - before
+                ) / args.repeat
+                best[kind] = min(best.get(kind, (median,))[0], median), statements
+        results[name] = best
+
+    print(
+        f"{'helper':<24}{'plain':>10}{'instr':>10}{'added':>10}{'%':>7}"
+        f"{'stmts':>7}{'per stmt':>10}"
+    )
+    for name, best in results.items():
+        plain, instrumented = best["plain"][0], best["instrumented"][0]
+        statements = best["instrumented"][1]
+        added = instrumented - plain
+        print(
+            f"{name:<24}{plain:>10.1f}{instrumented:>10.1f}{added:>10.1f}"
+            f"{added / plain * 100:>+6.1f}%{statements:>7.1f}"
+            f"{added / statements if statements else 0:>10.1f}"
+        )
+    print("median µs per call, best of each round; stmts includes BEGIN/COMMIT")
+    for pool in pools.values():
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import gzip
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import app as server  # noqa: E402
+import compress  # noqa: E402
+import database  # noqa: E402
+import fastjson  # noqa: E402
+from fastjson import FastJSONProvider  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+# What the list pages show: a title, a poster (looked up by imdb_id) and a rating
+LIST_FIELDS = "title,imdb_id,vote_average,release_date"
+
+
+def routes(username):
+    return {
+        "get_movies": "/get_movies?sort_by=popularity",
+        "get_backlog": f"/get_backlog?username={username}",
+        "get_watched_movies": f"/get_watched_movies?username={username}&limit=500",
+    }
+
+
+def measure(client, path, accept_encoding, repeat):
+    """Return (median ms per request, body bytes on the wire, body bytes decoded)."""
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+    assert response.status_code == 200, (path, response.status_code)
+    wire = response.get_data()
+    body = gzip.decompress(wire) if response.content_encoding == "gzip" else wire
+    if response.content_encoding == "br":
+        body = compress.brotli.decompress(wire)
+    return statistics.median(samples), len(wire), len(body)
+
+
+def serialize_time(provider, payload, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        provider.response(payload)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Payload size and time per route, before and after projection,"
+        " fast JSON and compression"
+    )
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    # The user with the longest watched list, so the personal pages are big
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    username = conn.execute(
+        "SELECT username FROM watched GROUP BY username ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+    conn.close()
+
+    database.pool = ConnectionPool(args.db)
+    client = server.app.test_client()
+    # The baseline runs under the user's session like every other request
+    with client.session_transaction() as session:
+        session["_user_id"] = username
+        session["_fresh"] = True
+
+    encoding = "br, gzip" if compress.brotli else "gzip"
+    setups = {
+        "before": (DefaultJSONProvider(server.app), "", None),
+        "fast json": (FastJSONProvider(server.app), "", None),
+        "+ fields": (FastJSONProvider(server.app), LIST_FIELDS, None),
+        f"+ {encoding.split(',')[0]}": (
+            FastJSONProvider(server.app),
+            LIST_FIELDS,
+            encoding,
+        ),
+    }
+
+    print(f"{'route':<20}{'setup':<12}{'ms':>8}{'wire KB':>10}{'json KB':>10}")
+    for name, path in routes(username).items():
+        for label, (provider, fields, accept_encoding) in setups.items():
+            server.app.json = provider
+            full_path = f"{path}&fields={fields}" if fields else path
+            measure(client, full_path, accept_encoding, 1)  # warm up
+            ms, wire, body = measure(client, full_path, accept_encoding, args.repeat)
+            print(
+                f"{name:<20}{label:<12}{ms:>8.2f}{wire / 1024:>10.1f}{body / 1024:>10.1f}"
+            )
+
+    # Serialization alone, on the full watched list
+    movies = list(database.iter_watched_movies(username))
+    payload = {"movies": movies}
+    with server.app.app_context():
+        default = serialize_time(DefaultJSONProvider(server.app), payload, args.repeat)
+        fast = serialize_time(FastJSONProvider(server.app), payload, args.repeat)
+    print(
+        f"Serializing {len(movies)} watched movies: {default:.2f} ms with the default"
+        f" provider, {fast:.2f} ms with {'orjson' if fastjson.orjson else 'the fallback'}"
+    )
+    print("ms is the median time per request through the test client")
+
+
+if __name__ == "__main__":
+    main()
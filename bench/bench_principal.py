@@ -0,0 +1,90 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import app as server  # noqa: E402
+import database  # noqa: E402
+import metrics  # noqa: E402
+from cache import LRUCache  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+# Authenticated routes, cheapest first. The genre list is revalidated with
+# its ETag, so its 304 is close to the bare cost of authenticating.
+ROUTES = {
+    "get_genres (304)": "/get_genres",
+    "get_genres": "/get_genres",
+    "get_movies": "/get_movies?sort_by=popularity&fields=title,imdb_id",
+    "friend_activities": "/friend_activities/{username}",
+}
+
+
+def measure(client, path, headers, repeat):
+    """Return (median ms per request, SQL statements per request)."""
+    before = metrics.registry.total("reelfriends_sql_statement_seconds")
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+    assert response.status_code in (200, 304), (path, response.status_code)
+    statements = metrics.registry.total("reelfriends_sql_statement_seconds") - before
+    return statistics.median(samples), statements / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-request cost of authenticating with and without the"
+        " principal cache"
+    )
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    username = conn.execute("SELECT username FROM users LIMIT 1").fetchone()[0]
+    conn.close()
+
+    database.pool = ConnectionPool(args.db, factory=metrics.InstrumentedConnection)
+    metrics.SLOW_QUERY_SECONDS = float("inf")
+    client = server.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = username
+        session["_fresh"] = True
+    etag = client.get("/get_genres").headers["ETag"]
+
+    caches = {
+        # Nothing is ever kept, so every request looks the user up
+        "uncached": LRUCache(maxsize=0),
+        "cached": database.principal_cache,
+    }
+    print(f"{'route':<20}{'uncached':>10}{'cached':>10}{'saved':>8}{'stmts':>12}")
+    for name, path in ROUTES.items():
+        path = path.format(username=username)
+        headers = {"If-None-Match": etag} if "304" in name else {}
+        results = {}
+        for _ in range(args.rounds):
+            # Alternate so drift in the machine hits both sides alike
+            for label, cache in caches.items():
+                database.principal_cache = cache
+                measure(client, path, headers, 10)  # warm up
+                ms, statements = measure(client, path, headers, args.repeat)
+                results[label] = min(results.get(label, (ms,))[0], ms), statements
+        (uncached, uncached_stmts), (cached, cached_stmts) = results.values()
+        print(
+            f"{name:<20}{uncached:>10.3f}{cached:>10.3f}{uncached - cached:>8.3f}"
+            f"{f'{uncached_stmts:.0f} -> {cached_stmts:.0f}':>12}"
+        )
+    stats = caches["cached"].stats()
+    print(
+        f"best median ms per request; principal cache hit rate {stats['hit_rate']:.2%}"
+        f" over {stats['hits'] + stats['misses']} lookups"
+    )
+
+
+if __name__ == "__main__":
+    main()
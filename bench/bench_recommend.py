@@ -0,0 +1,88 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import numpy as np  # noqa: E402
+from recommend import ItemItemRecommender  # noqa: E402
+
+
+def synthetic_ratings(users, movies, per_user, seed):
+    """Ratings driven by a hidden one-dimensional taste, so neighbours exist.
+
+    Movie popularity is skewed so a few films collect most of the ratings,
+    as in the real watched table.
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, movies + 1) ** 0.8
+    popularity /= popularity.sum()
+    positions = rng.random(movies)
+    rows = []
+    for user in range(users):
+        taste = rng.random()
+        seen = rng.choice(
+            movies, size=min(per_user, movies), replace=False, p=popularity
+        )
+        noise = rng.normal(0, 1.5, size=len(seen))
+        ratings = np.clip(
+            np.rint(10 * (1 - np.abs(taste - positions[seen])) + noise), 0, 10
+        )
+        rows.extend((f"user{user}", int(m), int(r)) for m, r in zip(seen, ratings))
+    return rows
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.median(samples),
+        samples[max(int(len(samples) * 0.95) - 1, 0)],
+        samples[max(int(len(samples) * 0.99) - 1, 0)],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the item-item recommender")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--movies", type=int, default=20000)
+    parser.add_argument("--per-user", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = synthetic_ratings(args.users, args.movies, args.per_user, args.seed)
+    print(f"{len(rows)} ratings from {args.users} users over {args.movies} movies")
+
+    model = ItemItemRecommender()
+    print(f"full build: {model.build(rows):.2f}s")
+
+    history = {}
+    for username, movie_id, rating in rows:
+        history.setdefault(username, {})[movie_id] = rating
+    usernames = list(history)
+    rng = random.Random(args.seed)
+
+    latencies = []
+    for _ in range(args.queries):
+        user_ratings = history[rng.choice(usernames)]
+        start = time.perf_counter()
+        model.recommend(user_ratings, n=20)
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p95, p99 = percentiles(latencies)
+    print(f"query ms: p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}")
+
+    latencies = []
+    for _ in range(args.updates):
+        username = rng.choice(usernames)
+        start = time.perf_counter()
+        model.record_rating(username, rng.randrange(args.movies), rng.randint(0, 10))
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p95, p99 = percentiles(latencies)
+    print(f"incremental update ms: p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}")
+
+
+if __name__ == "__main__":
+    main()
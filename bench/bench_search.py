@@ -0,0 +1,70 @@
+import argparse
+import statistics
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import database  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+MOVIE_LIMIT = 25
+TERMS = ["star", "love", "the", "war", "godfather", "dark knight", "toy", "zzzz"]
+
+# The title search as it was before the FTS index
+LIKE_COUNT = "SELECT COUNT(*) FROM movies WHERE vote_count >= 100 AND title LIKE ?"
+LIKE_PAGE = """
+    SELECT * FROM movies
+    WHERE vote_count >= 100 AND title LIKE ?
+    ORDER BY vote_average desc
+    LIMIT ? OFFSET ?
+"""
+
+
+def like_search(term):
+    with database.get_db() as conn:
+        total = conn.execute(LIKE_COUNT, (f"%{term}%",)).fetchone()[0]
+        rows = conn.execute(LIKE_PAGE, (f"%{term}%", MOVIE_LIMIT, 0)).fetchall()
+    return total, rows
+
+
+def fts_search(term, sort_by):
+    return database.get_movies(MOVIE_LIMIT, 0, sort_by, "desc", search=term)[:2]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LIKE and FTS5 title search")
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    database.pool = ConnectionPool(args.db)
+    print(
+        f"{'term':<14}{'like p50':>10}{'like p95':>10}{'fts p50':>10}"
+        f"{'fts p95':>10}{'rel p50':>10}{'hits like/fts':>16}"
+    )
+    for term in TERMS:
+        like_total = like_search(term)[0]
+        fts_total = fts_search(term, "vote_average")[0]
+        like = timed(lambda: like_search(term), args.repeat)
+        fts = timed(lambda: fts_search(term, "vote_average"), args.repeat)
+        relevance = timed(lambda: fts_search(term, "relevance"), args.repeat)
+        print(
+            f"{term:<14}{like[0]:>10.2f}{like[1]:>10.2f}{fts[0]:>10.2f}"
+            f"{fts[1]:>10.2f}{relevance[0]:>10.2f}{f'{like_total}/{fts_total}':>16}"
+        )
+    print("latencies in ms; FTS also matches overview, collection and companies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, "../flask")
+
+import database  # noqa: E402
+import pool as pool_module  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from writer import GroupCommitWriter  # noqa: E402
+
+# Relative frequency of each write, roughly as the load test issues them
+MIX = {
+    "add_to_backlog": 4,
+    "remove_from_backlog": 2,
+    "mark_movie_as_watched": 4,
+    "update_movie_review": 2,
+    "add_friend": 1,
+}
+
+
+def direct_write(operation, *args):
+    """The old path: every write takes the write lock and commits on its own."""
+    with database.get_db(write=True) as conn:
+        return operation(conn, *args)
+
+
+group_write = database._write
+
+
+def client(rng, usernames, movie_ids, deadline, results):
+    username = rng.choice(usernames)
+    names, weights = zip(*MIX.items())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights=weights)[0]
+        movie_id = rng.choice(movie_ids)
+        if name == "add_friend":
+            args = (username, rng.choice(usernames))
+        elif name in ("mark_movie_as_watched", "update_movie_review"):
+            args = (username, movie_id, "Stress test", rng.randint(0, 10))
+        else:
+            args = (username, movie_id)
+        started = time.perf_counter()
+        try:
+            outcome = getattr(database, name)(*args)
+            ok = (
+                outcome is None
+                or outcome is True
+                or (isinstance(outcome, tuple) and outcome[0])
+            )
+        except sqlite3.Error:
+            ok = False
+        results.append((time.perf_counter() - started, ok))
+
+
+def run(mode, db_path, clients, duration, synchronous, seed):
+    pragmas = dict(pool_module.PRAGMAS, synchronous=synchronous)
+    database.pool = ConnectionPool(db_path, pragmas=pragmas)
+    database.writer = GroupCommitWriter(database.get_db)
+    database._write = direct_write if mode == "direct" else group_write
+
+    conn = sqlite3.connect(db_path)
+    usernames = [row[0] for row in conn.execute("SELECT username FROM users")]
+    movie_ids = [row[0] for row in conn.execute("SELECT id FROM movies LIMIT 5000")]
+    conn.close()
+
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=client,
+            args=(random.Random(seed + i), usernames, movie_ids, deadline, results),
+        )
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    database.writer.close()
+    database.pool.close()
+
+    latencies = sorted(seconds * 1000 for seconds, _ in results)
+    return {
+        "writes": len(results),
+        "per_sec": len(results) / elapsed,
+        "failed": sum(1 for _, ok in results if not ok),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "mean_batch": database.writer.stats()["mean_batch"] if mode == "group" else 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write throughput with many concurrent clients, committing each"
+        " write on its own or in groups"
+    )
+    parser.add_argument("--db", default=database.DATABASE, help="copied, not changed")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument(
+        "--synchronous",
+        default="NORMAL",
+        choices=["OFF", "NORMAL", "FULL"],
+        help="FULL syncs on every commit, where grouping saves the most",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'clients':>8}{'mode':>8}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'failed':>8}{'batch':>7}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for clients in args.clients:
+            for mode in ("direct", "group"):
+                # Every run starts from the same copy of the database
+                db_path = os.path.join(tmp, f"{mode}-{clients}.sqlite")
+                source = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+                target = sqlite3.connect(db_path)
+                source.backup(target)
+                source.close()
+                target.close()
+                result = run(
+                    mode, db_path, clients, args.duration, args.synchronous, args.seed
+                )
+                print(
+                    f"{clients:>8}{mode:>8}{result['per_sec']:>10.0f}"
+                    f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                    f"{result['failed']:>8}{result['mean_batch']:>7.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+import argparse
+import csv
+import io
+import json
+import random
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+
+import requests
+
+# Relative traffic per endpoint, roughly what a browsing session produces.
+# Writes and exports are kept rare.
+MIX = {
+    "get_movies": 20,
+    "get_movies_cursor": 8,
+    "get_movies_fields": 4,
+    "get_movies_search": 6,
+    "movie": 10,
+    "reviews": 6,
+    "export_reviews": 1,
+    "posters": 6,
+    "poster": 2,
+    "friend_activities": 8,
+    "friends": 4,
+    "recommendations": 4,
+    "dashboard": 6,
+    "dashboard_cursor": 2,
+    "get_backlog": 4,
+    "get_watched_movies": 4,
+    "export_watched": 1,
+    "get_user_profile": 4,
+    "get_genres": 2,
+    "get_collections": 1,
+    "stats": 1,
+    "metrics": 1,
+    "add_to_backlog": 2,
+    "remove_from_backlog": 1,
+    "mark_watched": 2,
+    "update_movie_review": 1,
+    "bulk": 1,
+    "import": 1,
+    "update_bio": 1,
+    "add_friend": 1,
+    "signup": 1,
+    "home": 1,
+}
+
+# The flask/app.py route each endpoint above requests, plus the login and
+# logout every client makes. tests/test_load_test.py fails when a route of
+# the app is missing here, so a new route gets a scenario.
+ROUTES = {
+    "get_movies": "/get_movies",
+    "get_movies_cursor": "/get_movies",
+    "get_movies_fields": "/get_movies",
+    "get_movies_search": "/get_movies",
+    "movie": "/movies/<imdb_id>",
+    "reviews": "/reviews/<movie_id>",
+    "export_reviews": "/reviews/<movie_id>",
+    "posters": "/get_posters",
+    "poster": "/get_poster/<imdb_id>",
+    "friend_activities": "/friend_activities/<username>",
+    "friends": "/friends/<username>",
+    "recommendations": "/recommendations/<username>",
+    "dashboard": "/dashboard/<username>",
+    "dashboard_cursor": "/dashboard/<username>",
+    "get_backlog": "/get_backlog",
+    "get_watched_movies": "/get_watched_movies",
+    "export_watched": "/get_watched_movies",
+    "get_user_profile": "/get_user_profile",
+    "get_genres": "/get_genres",
+    "get_collections": "/get_collections",
+    "stats": "/stats",
+    "metrics": "/metrics",
+    "add_to_backlog": "/add_to_backlog",
+    "remove_from_backlog": "/remove_from_backlog/<int:movie_id>",
+    "mark_watched": "/mark_watched",
+    "update_movie_review": "/update_movie_review",
+    "bulk": "/bulk",
+    "import": "/import",
+    "update_bio": "/update_bio",
+    "add_friend": "/add_friend",
+    "signup": "/signup",
+    "home": "/",
+    "login": "/login",
+    "logout": "/logout",
+}
+# The columns a list page shows, as the frontend asks for them
+LIST_FIELDS = "id,imdb_id,title,release_date,vote_average"
+SORTS = ["vote_average", "popularity", "release_date", "title", "user_rating"]
+
+
+class Sample:
+    """Usernames and movies drawn from the database under test."""
+
+    def __init__(self, db_path, users):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self.usernames = [
+            row[0]
+            for row in conn.execute(
+                "SELECT username FROM users ORDER BY random() LIMIT ?", (users,)
+            )
+        ]
+        self.movies = conn.execute(
+            "SELECT id, imdb_id FROM movies WHERE vote_count >= 100 "
+            "ORDER BY random() LIMIT 2000"
+        ).fetchall()
+        self.genres = [
+            row[0] for row in conn.execute("SELECT DISTINCT genre FROM movie_genres")
+        ]
+        # (title, year) rows for import diaries
+        self.diary = conn.execute(
+            "SELECT title, substr(release_date, 1, 4) FROM movies "
+            "WHERE vote_count >= 100 AND title IS NOT NULL "
+            "ORDER BY random() LIMIT 500"
+        ).fetchall()
+        conn.close()
+
+
+class Client(threading.Thread):
+    """One logged-in user issuing the request mix until the deadline."""
+
+    def __init__(self, base_url, username, password, sample, deadline, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.sample = sample
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.results = []  # (endpoint, seconds, status)
+        self.next_cursor = None
+        self.fields_cursor = None
+        self.dashboard_cursor = None  # (username, watched cursor)
+        self.backlog = []  # movies this client added, so removals hit a row
+
+    def request(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}", timeout=30, **kwargs
+            )
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        self.results.append((endpoint, time.perf_counter() - started, status))
+        return response
+
+    def login(self):
+        response = self.request(
+            "login",
+            "POST",
+            "/login",
+            json={"username": self.username, "password": self.password},
+        )
+        return response is not None and response.status_code == 200
+
+    def movie(self):
+        return self.rng.choice(self.sample.movies)
+
+    def run_one(self, endpoint):
+        user = self.username
+        other = self.rng.choice(self.sample.usernames)
+        movie_id, imdb_id = self.movie()
+        if endpoint == "get_movies":
+            params = {"sort_by": self.rng.choice(SORTS), "include_total": "1"}
+            if self.rng.random() < 0.3 and self.sample.genres:
+                params["genre"] = self.rng.choice(self.sample.genres)
+            response = self.request(endpoint, "GET", "/get_movies", params=params)
+            if response is not None and response.ok:
+                self.next_cursor = (params, response.json().get("next_cursor"))
+        elif endpoint == "get_movies_cursor":
+            if not self.next_cursor or not self.next_cursor[1]:
+                return self.run_one("get_movies")
+            params, cursor = self.next_cursor
+            params = {**params, "cursor": cursor, "include_total": "0"}
+            response = self.request(endpoint, "GET", "/get_movies", params=params)
+            if response is not None and response.ok:
+                self.next_cursor = (params, response.json().get("next_cursor"))
+        elif endpoint == "get_movies_fields":
+            # Pages through the catalog the way the list view does, with a
+            # cursor and only the columns it shows
+            params = {"sort_by": "vote_average", "fields": LIST_FIELDS}
+            if self.fields_cursor:
+                params["cursor"] = self.fields_cursor
+            response = self.request(endpoint, "GET", "/get_movies", params=params)
+            if response is not None and response.ok:
+                self.fields_cursor = response.json().get("next_cursor")
+        elif endpoint == "get_movies_search":
+            params = {"search": self.rng.choice(["star", "night", "love", "the"])}
+            if self.rng.random() < 0.5:
+                params["sort_by"] = "relevance"
+            self.request(endpoint, "GET", "/get_movies", params=params)
+        elif endpoint == "movie":
+            self.request(endpoint, "GET", f"/movies/{imdb_id}")
+        elif endpoint == "reviews":
+            self.request(endpoint, "GET", f"/reviews/{movie_id}")
+        elif endpoint == "export_reviews":
+            self.request(
+                endpoint, "GET", f"/reviews/{movie_id}", params={"format": "ndjson"}
+            )
+        elif endpoint == "posters":
+            ids = ",".join(self.movie()[1] for _ in range(25))
+            self.request(endpoint, "GET", "/get_posters", params={"imdb_ids": ids})
+        elif endpoint == "poster":
+            self.request(endpoint, "GET", f"/get_poster/{imdb_id}")
+        elif endpoint == "friend_activities":
+            self.request(endpoint, "GET", f"/friend_activities/{user}")
+        elif endpoint == "friends":
+            self.request(endpoint, "GET", f"/friends/{user}")
+        elif endpoint == "recommendations":
+            self.request(endpoint, "GET", f"/recommendations/{user}")
+        elif endpoint == "dashboard":
+            username = self.rng.choice([user, other])
+            response = self.request(endpoint, "GET", f"/dashboard/{username}")
+            if response is not None and response.ok:
+                cursor = response.json()["watched"]["next_cursor"]
+                self.dashboard_cursor = (username, cursor) if cursor else None
+        elif endpoint == "dashboard_cursor":
+            if not self.dashboard_cursor:
+                return self.run_one("dashboard")
+            username, cursor = self.dashboard_cursor
+            response = self.request(
+                endpoint,
+                "GET",
+                f"/dashboard/{username}",
+                params={"watched_cursor": cursor},
+            )
+            if response is not None and response.ok:
+                cursor = response.json()["watched"]["next_cursor"]
+                self.dashboard_cursor = (username, cursor) if cursor else None
+        elif endpoint == "get_backlog":
+            self.request(endpoint, "GET", "/get_backlog", params={"username": other})
+        elif endpoint == "get_watched_movies":
+            self.request(
+                endpoint, "GET", "/get_watched_movies", params={"username": other}
+            )
+        elif endpoint == "export_watched":
+            self.request(
+                endpoint,
+                "GET",
+                "/get_watched_movies",
+                params={"username": other, "format": "ndjson", "fields": LIST_FIELDS},
+            )
+        elif endpoint == "get_user_profile":
+            self.request(
+                endpoint, "GET", "/get_user_profile", params={"username": other}
+            )
+        elif endpoint == "get_genres":
+            self.request(endpoint, "GET", "/get_genres")
+        elif endpoint == "get_collections":
+            self.request(endpoint, "GET", "/get_collections")
+        elif endpoint == "stats":
+            self.request(endpoint, "GET", "/stats")
+        elif endpoint == "metrics":
+            self.request(endpoint, "GET", "/metrics")
+        elif endpoint == "add_to_backlog":
+            self.request(
+                endpoint, "POST", "/add_to_backlog", json={"movie_id": movie_id}
+            )
+            self.backlog.append(movie_id)
+        elif endpoint == "remove_from_backlog":
+            if not self.backlog:
+                return self.run_one("add_to_backlog")
+            movie_id = self.backlog.pop(self.rng.randrange(len(self.backlog)))
+            self.request(endpoint, "DELETE", f"/remove_from_backlog/{movie_id}")
+        elif endpoint == "mark_watched":
+            # Marking a film watched also takes it off the backlog
+            if movie_id in self.backlog:
+                self.backlog.remove(movie_id)
+            self.request(
+                endpoint,
+                "POST",
+                "/mark_watched",
+                json={
+                    "username": user,
+                    "movie_id": movie_id,
+                    "review": "Load test review",
+                    "rating": self.rng.randint(0, 10),
+                },
+            )
+        elif endpoint == "update_movie_review":
+            self.request(
+                endpoint,
+                "POST",
+                "/update_movie_review",
+                json={
+                    "username": user,
+                    "movie_id": movie_id,
+                    "review": "Updated by the load test",
+                    "rating": self.rng.randint(0, 10),
+                },
+            )
+        elif endpoint == "bulk":
+            # What a multi-select on the backlog page sends
+            added, watched = self.movie()[0], self.movie()[0]
+            if watched in self.backlog:
+                self.backlog.remove(watched)
+            self.request(
+                endpoint,
+                "POST",
+                "/bulk",
+                json={
+                    "operations": [
+                        {"op": "add_to_backlog", "movie_id": added},
+                        {"op": "add_to_backlog", "movie_id": movie_id},
+                        {"op": "remove_from_backlog", "movie_id": movie_id},
+                        {
+                            "op": "mark_watched",
+                            "movie_id": watched,
+                            "rating": self.rng.randint(0, 10),
+                        },
+                    ]
+                },
+            )
+            self.backlog.append(added)
+        elif endpoint == "import":
+            rows = self.rng.sample(self.sample.diary, min(10, len(self.sample.diary)))
+            diary = io.StringIO()
+            writer = csv.writer(diary)
+            writer.writerow(["Name", "Year", "Rating"])
+            for title, year in rows:
+                writer.writerow([title, year, self.rng.randint(1, 10) / 2])
+            self.request(
+                endpoint,
+                "POST",
+                "/import",
+                files={"file": ("diary.csv", diary.getvalue(), "text/csv")},
+            )
+        elif endpoint == "update_bio":
+            self.request(
+                endpoint,
+                "POST",
+                "/update_bio",
+                json={"username": user, "bio": f"Bio at {time.time():.0f}"},
+            )
+        elif endpoint == "add_friend":
+            self.request(
+                endpoint, "POST", "/add_friend", json={"user_a": user, "user_b": other}
+            )
+        elif endpoint == "signup":
+            # A fresh session, so this client stays logged in as itself
+            started = time.perf_counter()
+            try:
+                status = requests.post(
+                    f"{self.base_url}/signup",
+                    json={
+                        "username": f"loadtest-{uuid.uuid4().hex[:12]}",
+                        "password": self.password,
+                    },
+                    timeout=30,
+                ).status_code
+            except requests.RequestException:
+                status = 0
+            self.results.append((endpoint, time.perf_counter() - started, status))
+        elif endpoint == "home":
+            self.request(endpoint, "GET", "/")
+
+    def run(self):
+        if not self.login():
+            return
+        endpoints, weights = zip(*MIX.items())
+        while time.perf_counter() < self.deadline:
+            self.run_one(self.rng.choices(endpoints, weights=weights)[0])
+        self.request("logout", "POST", "/logout")
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(int(round(fraction * len(sorted_samples))) - 1, 0)
+    return sorted_samples[min(index, len(sorted_samples) - 1)]
+
+
+def summarize(results, elapsed):
+    by_endpoint = {}
+    for endpoint, seconds, status in results:
+        by_endpoint.setdefault(endpoint, []).append((seconds, status))
+    summary = {}
+    for endpoint, samples in sorted(by_endpoint.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in samples)
+        errors = sum(1 for _, status in samples if status == 0 or status >= 500)
+        summary[endpoint] = {
+            "requests": len(samples),
+            "errors": errors,
+            "rps": len(samples) / elapsed,
+            "mean_ms": statistics.fmean(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(summary, baseline=None):
+    header = (
+        f"{'endpoint':<22}{'reqs':>7}{'err':>5}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}"
+    )
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header)
+    for endpoint, row in summary.items():
+        line = (
+            f"{endpoint:<22}{row['requests']:>7}{row['errors']:>5}{row['rps']:>8.1f}"
+            f"{row['p50_ms']:>8.1f}{row['p95_ms']:>8.1f}{row['p99_ms']:>8.1f}"
+        )
+        base = (baseline or {}).get(endpoint)
+        if base and base["p95_ms"]:
+            line += f"{(row['p95_ms'] / base['p95_ms'] - 1) * 100:>+12.0f}%"
+        print(line)
+    print("latencies in ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive every route of a running server with logged-in clients"
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--db", default="../sql/bench.sqlite", help="database the server is using"
+    )
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--output", default="load_test.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sample = Sample(args.db, args.clients)
+    if len(sample.usernames) < args.clients:
+        parser.error(f"the database has only {len(sample.usernames)} users")
+
+    deadline = time.perf_counter() + args.duration
+    clients = [
+        Client(args.base_url, username, args.password, sample, deadline, args.seed + i)
+        for i, username in enumerate(sample.usernames)
+    ]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    results = [result for client in clients for result in client.results]
+    summary = summarize(results, elapsed)
+    total = {
+        "requests": len(results),
+        "errors": sum(row["errors"] for row in summary.values()),
+        "rps": len(results) / elapsed,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["endpoints"]
+    print_table(summary, baseline)
+    print(
+        f"{total['requests']} requests in {elapsed:.1f}s from {args.clients} clients:"
+        f" {total['rps']:.1f} req/s, {total['errors']} errors"
+    )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "commit": git_commit(),
+                "base_url": args.base_url,
+                "clients": args.clients,
+                "duration": elapsed,
+                "mix": MIX,
+                "total": total,
+                "endpoints": summary,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import sqlite3
+import sys
+
+HISTOGRAM = [f"h{i}" for i in range(11)]
+COLUMNS = ["watch_count", "rating_count", "rating_sum"] + HISTOGRAM
+
+# The same aggregates the movie_stats triggers maintain, computed from scratch
+RECOMPUTE_QUERY = f"""
+    SELECT
+        movie_id,
+        COUNT(*) AS watch_count,
+        COUNT(rating) AS rating_count,
+        IFNULL(SUM(rating), 0) AS rating_sum,
+        {", ".join(f"SUM(rating IS {i}) AS h{i}" for i in range(11))}
+    FROM watched
+    GROUP BY movie_id
+"""
+
+
+def find_mismatches(conn):
+    """Return [(movie_id, column, stored, expected)] wherever movie_stats is off."""
+    conn.row_factory = sqlite3.Row
+    expected = {row["movie_id"]: row for row in conn.execute(RECOMPUTE_QUERY)}
+    stored = {
+        row["movie_id"]: row
+        for row in conn.execute(
+            f"SELECT movie_id, rating_mean, {', '.join(COLUMNS)} FROM movie_stats"
+        )
+    }
+
+    mismatches = []
+    for movie_id in expected.keys() | stored.keys():
+        want, have = expected.get(movie_id), stored.get(movie_id)
+        for column in COLUMNS:
+            want_value = want[column] if want else 0
+            have_value = have[column] if have else 0
+            if want_value != have_value:
+                mismatches.append((movie_id, column, have_value, want_value))
+        if have and have["rating_count"]:
+            mean = have["rating_sum"] / have["rating_count"]
+            if have["rating_mean"] is None or abs(have["rating_mean"] - mean) > 1e-9:
+                mismatches.append((movie_id, "rating_mean", have["rating_mean"], mean))
+    return sorted(mismatches, key=lambda m: (m[0], m[1]))
+
+
+def rebuild(conn):
+    conn.execute("DELETE FROM movie_stats")
+    conn.execute(
+        f"""
+        INSERT INTO movie_stats (movie_id, {", ".join(COLUMNS)}, rating_mean)
+        SELECT movie_id, {", ".join(COLUMNS)},
+               CAST(rating_sum AS REAL) / NULLIF(rating_count, 0)
+        FROM ({RECOMPUTE_QUERY})
+        """
+    )
+    # Cached responses that showed the old stats are no longer current
+    conn.execute(
+        "UPDATE ratings_version SET version = version + 1, "
+        "updated_at = CURRENT_TIMESTAMP WHERE id = 1"
+    )
+
+
+def main():
+    # Path to the SQLite database
+    db_path = "../sql/db.sqlite"
+
+    conn = sqlite3.connect(db_path)
+    mismatches = find_mismatches(conn)
+    for movie_id, column, stored, expected in mismatches[:50]:
+        print(f"movie {movie_id}: {column} is {stored}, expected {expected}")
+    if len(mismatches) > 50:
+        print(f"... and {len(mismatches) - 50} more")
+
+    if not mismatches:
+        print("movie_stats matches a full recompute.")
+    elif "--fix" in sys.argv:
+        with conn:
+            rebuild(conn)
+        print("Rebuilt movie_stats from watched.")
+    conn.close()
+    sys.exit(1 if mismatches and "--fix" not in sys.argv else 0)
+
+
+if __name__ == "__main__":
+    main()
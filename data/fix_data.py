@@ -1,5 +1,47 @@
+import argparse
+import ast
 import csv
 import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+CHUNK_SIZE = 2000  # rows handed to a worker at a time
+
+# Columns holding a Python-literal list of {'id': ..., 'name': ...} dicts
+NAME_LIST_COLUMNS = [
+    "genres",
+    "production_companies",
+    "production_countries",
+    "spoken_languages",
+]
+
+# Fields can hold long overviews and cast lists
+csv.field_size_limit(sys.maxsize)
+
+
+class RowError(ValueError):
+    """A row that cannot be cleaned, with the column that failed."""
+
+    def __init__(self, field, reason):
+        super().__init__(reason)
+        self.field = field
+        self.reason = reason
+
+
+@lru_cache(maxsize=65536)
+def parse_literal(value):
+    """Parse a Python literal from the dump.
+
+    The dump stores lists and dicts as Python reprs, so titles such as
+    "Schindler's List" keep their apostrophes and are not valid JSON.
+    The same genre and country lists repeat on thousands of rows, so results
+    are cached per worker.
+    """
+    return ast.literal_eval(value)
 
 
 def extract_names(dict_like_string):
@@ -7,96 +49,182 @@ def extract_names(dict_like_string):
     if not dict_like_string or dict_like_string.strip() in ["null", "[]"]:
         return ""  # Return an empty string for null or empty values
 
-    try:
-        # Replace single quotes with double quotes to make it JSON-parsable
-        corrected_string = dict_like_string.replace("'", '"')
-        # Parse the corrected JSON string
-        parsed_json = json.loads(corrected_string)
-        # Extract the 'name' values
-        names = [
-            item.get("name", "") for item in parsed_json
-        ]  # Handle missing 'name' key
-        # Join the names with a comma
-        return ", ".join(names)
-    except (json.JSONDecodeError, ValueError) as e:
-        # In case of JSON parsing error, print the error and return an empty string
-        print(f"Error parsing JSON: {e}")
-        return ""
+    parsed = parse_literal(dict_like_string)
+    if not isinstance(parsed, (list, tuple)):
+        raise ValueError(f"expected a list, got {type(parsed).__name__}")
+    # Handle missing 'name' key
+    return ", ".join(item.get("name", "") for item in parsed)
 
 
 def extract_collection_name(dict_like_string):
     """Extracts the 'name' value from a 'belongs_to_collection' string."""
     if dict_like_string in [None, "null", "", "[]"]:  # Check for null or empty values
         return ""
+    parsed = parse_literal(dict_like_string)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"expected a dict, got {type(parsed).__name__}")
+    return parsed.get("name", "")
+
+
+def output_fieldnames(input_fieldnames):
+    """Replace 'belongs_to_collection' with 'collection' and put 'id' first."""
+    return ["id"] + [
+        field if field != "belongs_to_collection" else "collection"
+        for field in input_fieldnames
+        if field not in ["original_title", "id"]
+    ]
+
+
+def clean_row(row):
+    """Return the cleaned copy of one raw row (a dict), or raise RowError."""
+    if not row.get("release_date"):
+        raise RowError("release_date", "missing release_date")
+
+    cleaned = dict(row)
+    for field in NAME_LIST_COLUMNS:
+        try:
+            cleaned[field] = extract_names(row.get(field, ""))
+        except (ValueError, SyntaxError, TypeError, AttributeError, MemoryError) as e:
+            raise RowError(field, f"unparseable {field} ({type(e).__name__})") from None
     try:
-        corrected_string = dict_like_string.replace("'", '"')
-        parsed_json = json.loads(corrected_string)
-        return parsed_json["name"] if "name" in parsed_json else ""
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON for collection: {e}")
-        return ""
-
-
-def process_movies(input_file, output_file):
-    original_row_count = 0
-    modified_row_count = 0
-    skipped_row_count = 0
+        cleaned["collection"] = extract_collection_name(
+            row.get("belongs_to_collection", "")
+        )
+    except (ValueError, SyntaxError, TypeError, AttributeError, MemoryError) as e:
+        raise RowError(
+            "belongs_to_collection", f"unparseable collection ({type(e).__name__})"
+        ) from None
+    return cleaned
+
+
+def clean_chunk(header, fieldnames, chunk):
+    """Clean a chunk of (line, values) rows in a worker process.
+
+    Returns (rows, rejects): rows are value lists in ``fieldnames`` order
+    without the id (the writer numbers them once they are back in order),
+    and rejects are dicts ready for the reject file.
+    """
+    rows, rejects = [], []
+    for line, values in chunk:
+        if len(values) != len(header):
+            rejects.append(
+                {
+                    "line": line,
+                    "field": None,
+                    "reason": f"expected {len(header)} columns, got {len(values)}",
+                }
+            )
+            continue
+        row = dict(zip(header, values))
+        try:
+            cleaned = clean_row(row)
+        except RowError as e:
+            rejects.append(
+                {
+                    "line": line,
+                    "field": e.field,
+                    "reason": e.reason,
+                    "imdb_id": row.get("imdb_id"),
+                    "title": row.get("title"),
+                }
+            )
+            continue
+        rows.append([cleaned.get(field, "") for field in fieldnames[1:]])
+    return rows, rejects
+
+
+def read_chunks(reader, chunk_size):
+    """Yield lists of (line, values) from a csv.reader without loading the file."""
+    chunk = []
+    for values in reader:
+        chunk.append((reader.line_num, values))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def cleaned_chunks(executor, header, fieldnames, chunks, max_pending):
+    """Run chunks through the executor and yield results in input order.
+
+    At most ``max_pending`` chunks are in flight, so memory stays bounded
+    however large the input is.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(clean_chunk, header, fieldnames, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_movies(
+    input_file, output_file, reject_file=None, workers=None, chunk_size=CHUNK_SIZE
+):
+    """Clean the raw TMDB dump into the CSV that insert_movies.py loads.
+
+    Rows are parsed on ``workers`` processes (all cores by default) and
+    written in their original order with fresh sequential ids. Rows that
+    cannot be cleaned are written to ``reject_file`` as JSON lines.
+    Returns a dict of counts and throughput.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    counts = {"read": 0, "written": 0, "rejected": 0}
     new_id = 1  # Initialize the new ID counter
 
-    with open(input_file, mode="r", encoding="utf-8") as infile, open(
+    with open(input_file, mode="r", newline="", encoding="utf-8") as infile, open(
         output_file, mode="w", newline="", encoding="utf-8"
-    ) as outfile:
-        reader = csv.DictReader(infile)
-        # Update fieldnames, replace 'belongs_to_collection' with 'collection', and add 'id' at the start
-        fieldnames = ["id"] + [
-            field if field != "belongs_to_collection" else "collection"
-            for field in reader.fieldnames
-            if field not in ["original_title", "id"]
-        ]
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-
-        writer.writeheader()
-
-        for row in reader:
-            original_row_count += 1
-
-            # Skip rows where 'release_date' is null or empty
-            if not row["release_date"]:
-                skipped_row_count += 1
-                continue
-
-            try:
-                # Assign the new ID and increment it
-                row["id"] = new_id
+    ) as outfile, open(
+        reject_file or os.devnull, mode="w", encoding="utf-8"
+    ) as rejectfile, ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        reader = csv.reader(infile)
+        header = next(reader)
+        fieldnames = output_fieldnames(header)
+        writer = csv.writer(outfile)
+        writer.writerow(fieldnames)
+
+        results = cleaned_chunks(
+            executor, header, fieldnames, read_chunks(reader, chunk_size), workers * 2
+        )
+        for rows, rejects in results:
+            counts["read"] += len(rows) + len(rejects)
+            for row in rows:
+                writer.writerow([new_id, *row])
                 new_id += 1
-
-                # Modify the relevant fields
-                row["genres"] = extract_names(row["genres"])
-                row["production_companies"] = extract_names(row["production_companies"])
-                row["production_countries"] = extract_names(row["production_countries"])
-                row["spoken_languages"] = extract_names(row["spoken_languages"])
-                row["collection"] = extract_collection_name(
-                    row.get("belongs_to_collection", "")
-                )
-
-                # Prepare the row for writing, aligning with the new fieldnames
-                modified_row = {
-                    fieldname: row.get(fieldname, "") for fieldname in fieldnames
-                }
-
-                # Write the modified row
-                writer.writerow(modified_row)
-                modified_row_count += 1
-            except Exception as e:
-                # Print the error and skip this row
-                print(f"Error processing row: {e}. Skipping row.")
-                skipped_row_count += 1
-
-    print(f"Original CSV Row Count: {original_row_count}")
-    print(f"Modified CSV Row Count: {modified_row_count}")
-    print(f"Rows Not Added: {skipped_row_count}")
-
-
-input_filename = "movies_raw.csv"
-output_filename = "movies_clean.csv"
-process_movies(input_filename, output_filename)
+            counts["written"] += len(rows)
+            for reject in rejects:
+                rejectfile.write(json.dumps(reject) + "\n")
+            counts["rejected"] += len(rejects)
+
+    counts["seconds"] = time.perf_counter() - started
+    counts["rows_per_sec"] = (
+        counts["read"] / counts["seconds"] if counts["seconds"] else 0
+    )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the raw TMDB movie dump")
+    parser.add_argument("input", nargs="?", default="movies_raw.csv")
+    parser.add_argument("output", nargs="?", default="movies_clean.csv")
+    parser.add_argument("--rejects", default="movies_rejects.jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    counts = process_movies(
+        args.input, args.output, args.rejects, args.workers, args.chunk_size
+    )
+    print(f"Original CSV Row Count: {counts['read']}")
+    print(f"Modified CSV Row Count: {counts['written']}")
+    print(f"Rows Not Added: {counts['rejected']} (see {args.rejects})")
+    print(f"{counts['rows_per_sec']:.0f} rows/sec in {counts['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.security import generate_password_hash
+
+from insert_movies import rebuild_movie_genres
+from migrate import connect, migrate
+from rebuild_feed import prune_feed
+
+GENRES = [
+    "Action",
+    "Adventure",
+    "Animation",
+    "Comedy",
+    "Crime",
+    "Documentary",
+    "Drama",
+    "Family",
+    "Fantasy",
+    "Horror",
+    "Romance",
+    "Science Fiction",
+    "Thriller",
+]
+WORDS = ["night", "love", "war", "king", "star", "dark", "city", "river", "last", "red"]
+REVIEWS = ["Loved it.", "Not for me.", "A classic.", "Overrated.", "Would rewatch."]
+BATCH_SIZE = 10000
+
+
+def synthetic_movies(rng, count):
+    """Rows for an empty catalog, used when no real movies have been loaded."""
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title()
+        # Vote counts are heavy-tailed too: most films have few votes
+        vote_count = int(rng.paretovariate(1.2) * 20)
+        yield (
+            f"tt{9000000 + i:07d}",
+            title,
+            f"A film about the {rng.choice(WORDS)} and the {rng.choice(WORDS)}.",
+            ", ".join(rng.sample(GENRES, rng.randint(1, 3))),
+            f"{title} Collection" if rng.random() < 0.05 else None,
+            f"{rng.randint(1930, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            rng.randint(70, 180),
+            rng.paretovariate(1.5),
+            round(rng.uniform(2, 9), 1),
+            vote_count,
+        )
+
+
+def preferential_attachment(rng, users, friends_per_user):
+    """Yield friendship pairs whose degree distribution follows a power law.
+
+    Barabasi-Albert: every new user befriends ``friends_per_user`` existing
+    users, each picked with probability proportional to their current
+    degree, so a few users end up with very many friends.
+    """
+    endpoints = []  # every user appears once per friendship they are in
+    for index, username in enumerate(users):
+        targets = set()
+        if index <= friends_per_user:
+            targets.update(users[:index])
+        else:
+            while len(targets) < friends_per_user:
+                targets.add(rng.choice(endpoints))
+        for target in targets:
+            endpoints += [username, target]
+            yield username, target
+
+
+def accumulate(weights):
+    total = 0.0
+    for weight in weights:
+        total += weight
+        yield total
+
+
+def pick_pairs(rng, users, user_weights, movie_ids, movie_weights, count, exclude):
+    """Pick ``count`` distinct (user, movie) pairs, both sides skewed.
+
+    Heavy users and popular films are drawn far more often, as in the real
+    watched table. Pairs in ``exclude`` are skipped.
+    """
+    pairs = set()
+    user_cumulative = list(accumulate(user_weights))
+    movie_cumulative = list(accumulate(movie_weights))
+    attempts = 0
+    while len(pairs) < count and attempts < 50:
+        need = count - len(pairs)
+        picked_users = rng.choices(users, cum_weights=user_cumulative, k=need)
+        picked_movies = rng.choices(movie_ids, cum_weights=movie_cumulative, k=need)
+        before = len(pairs)
+        pairs.update(
+            pair for pair in zip(picked_users, picked_movies) if pair not in exclude
+        )
+        attempts = attempts + 1 if len(pairs) - before < need / 100 else 0
+    return pairs
+
+
+def random_timestamp(rng, now, days):
+    moment = now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def batched(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def generate(
+    conn,
+    users,
+    watched,
+    backlog,
+    friends_per_user=5,
+    movies=20000,
+    password="password",
+    alpha=1.5,
+    days=365,
+    seed=0,
+):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    timings = {}
+
+    def step(name):
+        timings[name] = time.perf_counter()
+        print(f"{name}...")
+
+    step("users")
+    # One hash for everyone: hashing per user would dominate the run
+    hashed = generate_password_hash(password)
+    usernames = [f"user{i:06d}" for i in range(users)]
+    conn.execute("BEGIN")
+    batched(
+        conn,
+        "INSERT OR IGNORE INTO users (username, password, bio) VALUES (?, ?, ?)",
+        ((username, hashed, f"Bio of {username}") for username in usernames),
+    )
+    conn.execute("COMMIT")
+
+    existing = conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+    if existing == 0:
+        step("movies")
+        conn.execute("BEGIN")
+        batched(
+            conn,
+            """
+            INSERT INTO movies (imdb_id, title, overview, genres, collection,
+                                release_date, runtime, popularity, vote_average,
+                                vote_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            synthetic_movies(rng, movies),
+        )
+        rebuild_movie_genres(conn)
+        conn.execute("COMMIT")
+
+    # Films are watched in proportion to their vote count, users in
+    # proportion to a Pareto activity level
+    catalog = conn.execute("SELECT id, vote_count, vote_average FROM movies").fetchall()
+    movie_ids = [row[0] for row in catalog]
+    movie_weights = [(row[1] or 0) + 1 for row in catalog]
+    averages = {row[0]: row[2] or 5.0 for row in catalog}
+    user_weights = [rng.paretovariate(alpha) for _ in usernames]
+
+    step("watched")
+    watched_pairs = pick_pairs(
+        rng, usernames, user_weights, movie_ids, movie_weights, watched, set()
+    )
+    conn.execute("BEGIN")
+    batched(
+        conn,
+        "INSERT OR IGNORE INTO watched (username, movie_id, review, rating, timestamp) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                username,
+                movie_id,
+                rng.choice(REVIEWS) if rng.random() < 0.3 else None,
+                (
+                    min(10, max(0, round(rng.gauss(averages[movie_id], 1.5))))
+                    if rng.random() < 0.8
+                    else None
+                ),
+                random_timestamp(rng, now, days),
+            )
+            for username, movie_id in sorted(watched_pairs)
+        ),
+    )
+    conn.execute("COMMIT")
+
+    step("backlog")
+    backlog_pairs = pick_pairs(
+        rng, usernames, user_weights, movie_ids, movie_weights, backlog, watched_pairs
+    )
+    conn.execute("BEGIN")
+    batched(
+        conn,
+        "INSERT OR IGNORE INTO backlog (username, movie_id, timestamp) VALUES (?, ?, ?)",
+        (
+            (username, movie_id, random_timestamp(rng, now, days))
+            for username, movie_id in sorted(backlog_pairs)
+        ),
+    )
+    conn.execute("COMMIT")
+
+    # Friends go in last, so each new friendship backfills the feed once
+    # instead of every watch fanning out to a growing friend list
+    step("friends")
+    shuffled = usernames[:]
+    rng.shuffle(shuffled)
+    conn.execute("BEGIN")
+    batched(
+        conn,
+        "INSERT OR IGNORE INTO friends (user_a, user_b) VALUES (?, ?)",
+        (
+            pair
+            for a, b in preferential_attachment(rng, shuffled, friends_per_user)
+            for pair in ((a, b), (b, a))
+        ),
+    )
+    conn.execute("COMMIT")
+
+    step("feed")
+    conn.execute("BEGIN")
+    prune_feed(conn)
+    conn.execute("COMMIT")
+
+    step("analyze")
+    conn.execute("ANALYZE")
+    timings["done"] = time.perf_counter()
+
+    names = list(timings)
+    for name, following in zip(names, names[1:]):
+        print(f"  {name:<10}{timings[following] - timings[name]:>8.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fill a database with synthetic users, friends, watches and backlogs"
+    )
+    parser.add_argument("--db", default="../sql/bench.sqlite")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--watched", type=int, default=500000)
+    parser.add_argument("--backlog", type=int, default=100000)
+    parser.add_argument(
+        "--friends-per-user",
+        type=int,
+        default=5,
+        help="friendships each new user starts (mean degree is twice this)",
+    )
+    parser.add_argument(
+        "--movies",
+        type=int,
+        default=20000,
+        help="synthetic movies to create if the catalog is empty",
+    )
+    parser.add_argument("--alpha", type=float, default=1.5, help="activity skew")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    migrate(conn)
+    generate(
+        conn,
+        args.users,
+        args.watched,
+        args.backlog,
+        friends_per_user=args.friends_per_user,
+        movies=args.movies,
+        password=args.password,
+        alpha=args.alpha,
+        seed=args.seed,
+    )
+    for table in ("users", "friends", "watched", "backlog", "feed", "movies"):
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"{table:<10}{count:>10}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import sys
+import time
+
+sys.path.insert(0, "../flask")
+
+import database  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import a Letterboxd (or IMDb) CSV export into a user's"
+        " watched list or backlog"
+    )
+    parser.add_argument("csv", help="diary.csv, watched.csv, ratings.csv, ...")
+    parser.add_argument("--username", required=True)
+    parser.add_argument(
+        "--target",
+        default="watched",
+        choices=sorted(database.IMPORT_STATEMENTS),
+        help="backlog for watchlist.csv",
+    )
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--chunk-size", type=int, default=database.IMPORT_CHUNK_SIZE)
+    parser.add_argument(
+        "--show-unmatched", type=int, default=20, help="unmatched rows to list"
+    )
+    args = parser.parse_args()
+
+    database.pool = ConnectionPool(args.db)
+    if database.get_principal(args.username) is None:
+        sys.exit(f"No user named {args.username}")
+
+    start = time.perf_counter()
+    with open(args.csv, encoding="utf-8-sig", errors="replace", newline="") as lines:
+        try:
+            progress = database.import_history(
+                args.username, lines, args.target, args.chunk_size
+            )
+        except ValueError as e:
+            sys.exit(str(e))
+        for report in progress:
+            print(
+                f"{report['rows']} rows read, {report['imported']} imported,"
+                f" {report['unmatched']} unmatched"
+            )
+    database.writer.close()
+
+    for row in report["unmatched_rows"][: args.show_unmatched]:
+        print(f"  line {row['line']}: {row['title']} ({row['year']}): {row['reason']}")
+    if report["unmatched"] > args.show_unmatched:
+        print(f"  ... and {report['unmatched'] - args.show_unmatched} more")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,235 @@
-import pandas as pd
+import argparse
+import csv
+import resource
 import sqlite3
+import sys
+import time
+from itertools import islice
 
-# Path to the CSV file
-csv_file_path = "movies_clean.csv"
+# Rows per executemany call, and per transaction
+BATCH_SIZE = 10000
 
-# Path to the SQLite database
-db_path = "../sql/db.sqlite"
+# Tables whose indexes and triggers a full load drops and rebuilds at the end
+DEFERRED_TABLES = ("movies", "movie_genres")
+# Kept through a full load because the upsert needs it
+UPSERT_INDEX = "idx_movies_imdb_id"
 
-# Read the CSV file into a DataFrame
+csv.field_size_limit(sys.maxsize)
 
-df = pd.read_csv(csv_file_path)
 
-# Replace NaN with None for proper NULL handling in SQLite
-df = df.where(pd.notnull(df), None)
+def rebuild_movie_genres(conn, changed_only=False):
+    """Repopulate the movie_genres join table from the comma-joined genres column.
 
-# Connect to the SQLite database
-conn = sqlite3.connect(db_path)
+    With ``changed_only`` only the movies recorded in changed_movies (see
+    ``track_changes``) are replaced. Rows are streamed from a cursor rather
+    than fetched, so memory does not grow with the catalog.
+    """
+    if changed_only:
+        conn.execute(
+            "DELETE FROM movie_genres WHERE movie_id IN (SELECT id FROM changed_movies)"
+        )
+        rows = conn.execute(
+            """
+            SELECT id, genres FROM movies
+            WHERE id IN (SELECT id FROM changed_movies) AND genres != ''
+            """
+        )
+    else:
+        conn.execute("DELETE FROM movie_genres")
+        rows = conn.execute(
+            "SELECT id, genres FROM movies WHERE genres IS NOT NULL AND genres != ''"
+        )
+    conn.executemany(
+        "INSERT OR IGNORE INTO movie_genres (genre, movie_id) VALUES (?, ?)",
+        (
+            (genre, movie_id)
+            for movie_id, genres in rows
+            for genre in {g.strip() for g in genres.split(",")}
+            if genre
+        ),
+    )
 
-# Insert data into the database using a transaction
-with conn:
-    # Disable the default SQLite behavior of starting a transaction
+
+def upsert_sql(columns):
+    """Insert new movies and update existing ones only where a value changed.
+
+    Rows are matched on imdb_id and keep their id, so watched, backlog and
+    the stats tables stay attached. An unchanged row is not written at all,
+    so its triggers do not fire and the catalog version does not move.
+    """
+    updates = [column for column in columns if column != "imdb_id"]
+    return f"""
+        INSERT INTO movies ({", ".join(columns)})
+        VALUES ({", ".join("?" for _ in columns)})
+        ON CONFLICT(imdb_id) DO UPDATE SET
+            {", ".join(f"{c} = excluded.{c}" for c in updates)}
+        WHERE {" OR ".join(f"movies.{c} IS NOT excluded.{c}" for c in updates)}
+    """
+
+
+def read_rows(csv_file_path, columns, counts):
+    """Yield one tuple per CSV row, streaming, with empty fields as NULL.
+
+    Rows without an imdb_id cannot be matched on a later run and are skipped.
+    """
+    with open(csv_file_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            counts["read"] += 1
+            if not row.get("imdb_id"):
+                counts["skipped"] += 1
+                continue
+            yield tuple(
+                row[column] if row[column] != "" else None for column in columns
+            )
+
+
+def load_columns(conn, csv_file_path):
+    """The CSV columns that exist in movies. The id is always assigned here."""
+    with open(csv_file_path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    table_columns = {row[1] for row in conn.execute("PRAGMA table_info(movies)")}
+    unknown = [c for c in header if c not in table_columns]
+    if unknown:
+        print(f"Ignoring columns not in movies: {', '.join(unknown)}")
+    return [c for c in header if c in table_columns and c != "id"]
+
+
+def drop_secondary_objects(conn):
+    """Drop the loaded tables' indexes and triggers, returning the SQL to recreate them."""
+    placeholders = ", ".join("?" for _ in DEFERRED_TABLES)
+    objects = conn.execute(
+        f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name IN ({placeholders}) AND type IN ('index', 'trigger')
+          AND sql IS NOT NULL AND name != ?
+        """,
+        (*DEFERRED_TABLES, UPSERT_INDEX),
+    ).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    return [sql for _, _, sql in objects]
+
+
+def track_changes(conn):
+    """Record the id of every movie the load inserts or updates."""
     conn.execute(
-        "PRAGMA foreign_keys = ON;"
-    )  # Optional: enforce foreign key constraints
-    df.to_sql("movies", conn, if_exists="append", index=False)
+        "CREATE TEMP TABLE IF NOT EXISTS changed_movies (id INTEGER PRIMARY KEY)"
+    )
+    conn.execute("DELETE FROM changed_movies")
+    for event in ("INSERT", "UPDATE"):
+        conn.execute(
+            f"""
+            CREATE TEMP TRIGGER IF NOT EXISTS changed_movies_{event.lower()} AFTER {event} ON movies
+            BEGIN INSERT OR IGNORE INTO changed_movies (id) VALUES (new.id); END
+            """
+        )
+
+
+def load(conn, csv_file_path, delta=False, batch_size=BATCH_SIZE):
+    """Stream the CSV into movies and refresh the tables derived from it.
+
+    A full load drops the secondary indexes and triggers on movies and
+    movie_genres first. If anything changed it rebuilds the FTS index and
+    movie_genres and bumps the catalog version once, then recreates the
+    indexes and triggers. A delta load leaves them in place, so only the
+    changed rows touch them, and then refreshes those rows' genres.
+    """
+    counts = {"read": 0, "skipped": 0, "changed": 0}
+    columns = load_columns(conn, csv_file_path)
+    sql = upsert_sql(columns)
+    track_changes(conn)
+
+    deferred = []
+    if not delta:
+        with conn:
+            deferred = drop_secondary_objects(conn)
+    try:
+        rows = read_rows(csv_file_path, columns, counts)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            with conn:
+                conn.executemany(sql, batch)
+            print(f"Loaded {counts['read']} rows")
+
+        counts["changed"] = conn.execute(
+            "SELECT COUNT(*) FROM changed_movies"
+        ).fetchone()[0]
+        if counts["changed"]:
+            with conn:
+                if delta:
+                    rebuild_movie_genres(conn, changed_only=True)
+                else:
+                    conn.execute(
+                        "INSERT INTO movies_fts (movies_fts) VALUES ('rebuild')"
+                    )
+                    rebuild_movie_genres(conn)
+                    # The version triggers are dropped for the load
+                    conn.execute(
+                        """
+                        UPDATE catalog_version
+                        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = 1
+                        """
+                    )
+    finally:
+        if deferred:
+            started = time.perf_counter()
+            with conn:
+                for statement in deferred:
+                    conn.execute(statement)
+            print(
+                f"Rebuilt {len(deferred)} indexes and triggers"
+                f" in {time.perf_counter() - started:.1f}s"
+            )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load movies_clean.csv into movies")
+    parser.add_argument("csv_file", nargs="?", default="movies_clean.csv")
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="apply only changed rows, keeping indexes and triggers live",
+    )
+    parser.add_argument(
+        "--genres-only",
+        action="store_true",
+        help="only rebuild movie_genres from the movies already loaded",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    # Path to the SQLite database
+    db_path = "../sql/db.sqlite"
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA cache_size = -64000")
+
+    if args.genres_only:
+        # Rebuild the genre index for a database whose movies are already loaded
+        with conn:
+            rebuild_movie_genres(conn)
+        conn.close()
+        print("Genre index has been rebuilt.")
+        return
+
+    started = time.perf_counter()
+    counts = load(conn, args.csv_file, delta=args.delta, batch_size=args.batch_size)
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"Read {counts['read']} rows, {counts['changed']} inserted or changed,"
+        f" {counts['skipped']} skipped without an imdb_id."
+    )
+    print(f"Finished in {elapsed:.1f}s, peak RSS {peak_mb:.0f} MB.")
 
-# Close the connection to the database
-conn.close()
 
-print("Data has been successfully inserted into the database.")
+if __name__ == "__main__":
+    main()
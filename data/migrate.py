@@ -0,0 +1,278 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+
+MIGRATIONS_DIR = "../sql/migrations"
+
+# Databases created before migrations were tracked already have the tables
+# from migrations up to this version, whose CREATE TABLEs are not re-runnable.
+# Every later migration is written to be safe to apply over an existing schema.
+BASELINE_VERSION = 5
+
+# A migration whose first line is this runs each statement in its own
+# transaction, retrying while the app holds the write lock
+ONLINE_DIRECTIVE = "-- migrate: online"
+ONLINE_RETRIES = 20
+ONLINE_BACKOFF = 0.25  # seconds, doubled on every retry up to 5s
+
+# A migration whose first line is "-- migrate: before NNNN" runs just ahead of
+# that earlier version, for a fix the earlier migration needs on some
+# databases. Migrations that have been applied are never edited.
+BEFORE_DIRECTIVE = re.compile(r"-- migrate: before (\d{4})\s*$")
+
+MIGRATION_NAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Return [(version, name, path)] for every migration file, in order."""
+    migrations = {}
+    for path in glob.glob(os.path.join(directory, "*.sql")):
+        match = MIGRATION_NAME.match(os.path.basename(path))
+        if not match:
+            raise MigrationError(f"Migration file name not NNNN_name.sql: {path}")
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(
+                f"Two migrations share version {version}: "
+                f"{migrations[version][2]} and {path}"
+            )
+        migrations[version] = (version, match.group(2), path)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def run_order(migrations):
+    """Return [(position, version, name, path)] in the order they are applied.
+
+    ``position`` is the version a migration is applied as part of: its own,
+    or the one its before directive names.
+    """
+    ordered = []
+    for version, name, path in migrations:
+        with open(path) as f:
+            match = BEFORE_DIRECTIVE.match(f.readline())
+        if not match:
+            ordered.append((version, 1, version, name, path))
+            continue
+        position = int(match.group(1))
+        if position >= version:
+            raise MigrationError(
+                f"{os.path.basename(path)} can only run before an earlier version"
+            )
+        ordered.append((position, 0, version, name, path))
+    ordered.sort()
+    return [
+        (position, version, name, path) for position, _, version, name, path in ordered
+    ]
+
+
+def has_sql(text):
+    """True unless ``text`` is only blank lines and ``--`` comments."""
+    return any(
+        line.strip() and not line.strip().startswith("--") for line in text.splitlines()
+    )
+
+
+def split_statements(script):
+    """Split a SQL script into complete statements, keeping trigger bodies whole."""
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if has_sql(buffer):
+                statements.append(buffer.strip())
+            buffer = ""
+    if has_sql(buffer):
+        raise MigrationError(f"Incomplete statement at end of script: {buffer.strip()}")
+    return statements
+
+
+def checksum(script):
+    return hashlib.sha256(script.encode()).hexdigest()
+
+
+def ensure_migrations_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            duration REAL
+        )
+        """
+    )
+
+
+def applied_versions(conn):
+    return {
+        row[0]: (row[1], row[2])
+        for row in conn.execute("SELECT version, name, checksum FROM schema_migrations")
+    }
+
+
+def record(conn, version, name, script, duration):
+    conn.execute(
+        "INSERT INTO schema_migrations (version, name, checksum, duration) "
+        "VALUES (?, ?, ?, ?)",
+        (version, name, checksum(script), duration),
+    )
+
+
+def adopt_legacy_database(conn, migrations):
+    """Mark the baseline as applied on a database built before migrations.
+
+    Returns the versions adopted, if any.
+    """
+    if applied_versions(conn):
+        return []
+    has_tables = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+    ).fetchone()
+    if not has_tables:
+        return []
+    adopted = []
+    conn.execute("BEGIN IMMEDIATE")
+    for version, name, path in migrations:
+        if version > BASELINE_VERSION:
+            break
+        with open(path) as f:
+            record(conn, version, name, f.read(), 0.0)
+        adopted.append(version)
+    conn.execute("COMMIT")
+    return adopted
+
+
+def run_in_transaction(conn, statements):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in statements:
+            conn.execute(statement)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def run_online(conn, statements):
+    """Run each statement in its own short transaction.
+
+    SQLite builds an index under the write lock, so splitting a migration up
+    keeps each wait short for a running app. Under WAL, readers are never
+    blocked. Statements must be re-runnable (IF NOT EXISTS) because a failure
+    part-way leaves the earlier ones applied.
+    """
+    for statement in statements:
+        delay = ONLINE_BACKOFF
+        for attempt in range(ONLINE_RETRIES):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                if attempt == ONLINE_RETRIES - 1:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+        try:
+            conn.execute(statement)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    conn.execute("BEGIN IMMEDIATE")
+
+
+def migrate(conn, target=None, directory=MIGRATIONS_DIR):
+    """Apply every pending migration up to ``target``. Returns the versions applied."""
+    migrations = discover(directory)
+    ensure_migrations_table(conn)
+    adopted = adopt_legacy_database(conn, migrations)
+    if adopted:
+        print(
+            f"Existing database: recorded migrations {adopted[0]}-{adopted[-1]}"
+            " as already applied."
+        )
+
+    applied = applied_versions(conn)
+    done = []
+    for position, version, name, path in run_order(migrations):
+        if target is not None and position > target:
+            break
+        with open(path) as f:
+            script = f.read()
+        if version in applied:
+            if applied[version][1] != checksum(script):
+                print(f"Warning: {os.path.basename(path)} changed after it was applied")
+            continue
+
+        started = time.perf_counter()
+        statements = split_statements(script)
+        if script.startswith(ONLINE_DIRECTIVE):
+            run_online(conn, statements)
+        else:
+            run_in_transaction(conn, statements)
+        # Both leave a transaction open for the version record. For a regular
+        # migration it is the one its statements ran in, so the schema change
+        # and its record commit together.
+        record(conn, version, name, script, time.perf_counter() - started)
+        conn.execute("COMMIT")
+        done.append(version)
+        print(
+            f"Applied {os.path.basename(path)} in {time.perf_counter() - started:.2f}s"
+        )
+
+    if done:
+        # Refresh planner statistics for the tables the new indexes cover
+        conn.execute("PRAGMA optimize")
+    return done
+
+
+def status(conn, directory=MIGRATIONS_DIR):
+    ensure_migrations_table(conn)
+    applied = applied_versions(conn)
+    for _, version, name, path in run_order(discover(directory)):
+        state = "applied" if version in applied else "pending"
+        print(f"{version:04d} {name:<32} {state}")
+
+
+def connect(db_path):
+    # Transactions are issued explicitly by the runner
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the schema migrations")
+    parser.add_argument("--db", default="../sql/db.sqlite")
+    parser.add_argument("--to", type=int, default=None, help="stop at this version")
+    parser.add_argument("--status", action="store_true", help="list migrations")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        if args.status:
+            status(conn)
+            return
+        applied = migrate(conn, target=args.to)
+        print(f"{len(applied)} migration(s) applied." if applied else "Up to date.")
+    except (MigrationError, sqlite3.Error) as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
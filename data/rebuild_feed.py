@@ -0,0 +1,73 @@
+import sqlite3
+import sys
+
+# Newest feed rows kept per user. The app trims the feeds its writes grow to
+# the same number (prune_feeds in flask/database.py), and the friends trigger
+# in sql/migrations/0011_create_watched_feed.sql backfills it. Run with
+# --prune-only after writing watches or friendships outside the app.
+FEED_RETENTION = 200
+
+
+def rebuild_feed(conn, retention=FEED_RETENTION):
+    """Recompute the whole feed table from friends and watched.
+
+    Only each owner's newest ``retention`` rows are inserted, so there is
+    nothing left to prune afterwards.
+    """
+    conn.execute("DELETE FROM feed")
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO feed (owner, timestamp, actor, movie_id)
+        SELECT owner, timestamp, actor, movie_id FROM (
+            SELECT f.user_a AS owner, w.timestamp, w.username AS actor, w.movie_id,
+                row_number() OVER (
+                    PARTITION BY f.user_a
+                    ORDER BY w.timestamp DESC, w.username DESC, w.movie_id DESC
+                ) AS position
+            FROM friends f JOIN watched w ON w.username = f.user_b
+            WHERE f.user_a != f.user_b
+        )
+        WHERE position <= ?
+        """,
+        (retention,),
+    )
+
+
+def prune_feed(conn, retention=FEED_RETENTION):
+    """Drop everything older than each owner's newest `retention` rows."""
+    owners = [row[0] for row in conn.execute("SELECT DISTINCT owner FROM feed")]
+    removed = 0
+    for owner in owners:
+        cursor = conn.execute(
+            """
+            DELETE FROM feed
+            WHERE owner = ?
+              AND (timestamp, actor, movie_id) < (
+                  SELECT timestamp, actor, movie_id FROM feed
+                  WHERE owner = ?
+                  ORDER BY timestamp DESC, actor DESC, movie_id DESC
+                  LIMIT 1 OFFSET ?
+              )
+            """,
+            (owner, owner, retention - 1),
+        )
+        removed += cursor.rowcount
+    return removed
+
+
+def main():
+    # Path to the SQLite database
+    db_path = "../sql/db.sqlite"
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        if "--prune-only" not in sys.argv:
+            rebuild_feed(conn)
+            print("Rebuilt the feed table.")
+        removed = prune_feed(conn)
+        print(f"Pruned {removed} rows past the {FEED_RETENTION}-row retention limit.")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,19 @@
-from flask import Flask, jsonify, request
+import functools
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    make_response,
+    request,
+    stream_with_context,
+)
 from flask_login import (
     LoginManager,
     UserMixin,
@@ -9,18 +24,160 @@ from flask_login import (
 )
 from flask_cors import CORS
 import database
+import metrics
+from compress import compress_response
+from fastjson import FastJSONProvider
 from werkzeug.security import check_password_hash, generate_password_hash
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 MOVIE_LIMIT = 25
+POSTER_BATCH_LIMIT = 100
+DASHBOARD_LIMIT = 20
+BULK_LIMIT = 1000
+REVIEWS_LIMIT = 50
+WATCHED_LIMIT = 100
+PAGE_LIMIT_MAX = 500
+IMPORT_SPOOL_BYTES = 1 << 20  # larger streamed uploads go to a temp file
 app.config["SECRET_KEY"] = "nXcjUL2vkn"
 CORS(app, supports_credentials=True, origins=["http://localhost:8011"])
 
+# /stats and /metrics expose internal state, so they only answer requests
+# from this machine and from the addresses listed here (a metrics scraper)
+MONITORING_HOSTS = {"127.0.0.1", "::1"} | {
+    host.strip()
+    for host in os.getenv("REELFRIENDS_MONITORING_HOSTS", "").split(",")
+    if host.strip()
+}
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
 
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    g.metrics_token = metrics.start_request()
+
+
+def record_request(status):
+    token = g.pop("metrics_token", None)
+    if token is None:
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    elapsed = time.perf_counter() - g.request_started
+    metrics.finish_request(token, request.method, route, status, elapsed)
+
+
+@app.after_request
+def stop_timer(response):
+    record_request(response.status_code)
+    return response
+
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings)
+
+
+@app.teardown_request
+def stop_timer_on_error(error):
+    # Only reached with the timer still running when a handler raised
+    record_request(500)
+
+
+@app.errorhandler(database.WriteQueueFull)
+def write_queue_full(error):
+    # Too many writes are already waiting; the client should back off and retry
+    return jsonify({"error": str(error)}), 503, {"Retry-After": "1"}
+
+
+def conditional(validators, private=False):
+    """Serve the view with an ETag, answering a matching revalidation with 304.
+
+    ``validators`` takes the view's arguments and returns (tag, last_modified)
+    from version counters, so a client whose copy is current costs no query.
+    Clients may keep a copy but must revalidate it on every use.
+    """
+    cache_control = f"{'private' if private else 'public'}, no-cache"
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            tag, last_modified = validators(*args, **kwargs)
+            if tag is None:
+                return view(*args, **kwargs)
+            # If-None-Match wins over If-Modified-Since when both are sent
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(tag)
+            else:
+                since = request.if_modified_since
+                fresh = bool(since and last_modified and last_modified <= since)
+            if fresh:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def monitoring_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # A request a proxy forwarded carries X-Forwarded-For and counts as
+        # remote, even when the proxy runs on this machine
+        forwarded = "X-Forwarded-For" in request.headers
+        if forwarded or request.remote_addr not in MONITORING_HOSTS:
+            return jsonify({"message": "Forbidden"}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def wants_ndjson():
+    """?format=ndjson asks for the whole list, streamed one JSON row per line."""
+    return request.args.get("format") == "ndjson"
+
+
+def ndjson_response(rows):
+    def generate():
+        for row in rows:
+            yield app.json.dumps(row) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+def requested_fields():
+    """The movie columns named in ?fields=a,b,c, or None for all of them."""
+    fields = request.args.get("fields", type=str)
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()]
+
+
+def catalog_validators(*args, **kwargs):
+    return database.get_catalog_validators()
+
+
+def rated_catalog_validators(*args, **kwargs):
+    return database.get_catalog_validators(with_ratings=True)
+
+
+def user_validators(*args, **kwargs):
+    username = request.args.get("username")
+    return database.get_user_validators(username) if username else (None, None)
+
+
 @app.route("/")
 def home():
     return "Hello from Flask!"
@@ -37,9 +194,9 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    user = database.get_user(user_id)
-    if user:
-        return User(user["username"])
+    principal = database.get_principal(user_id)
+    if principal:
+        return User(principal["username"])
     return None
 
 
@@ -76,12 +233,28 @@ def fetch_friend_activities(username):
     if (
         current_user.id == username
     ):  # Ensuring the logged-in user is requesting their own data
-        activities = database.get_friend_activities(username)
-        return jsonify({"activities": activities}), 200
+        limit = min(request.args.get("limit", 10, type=int), 100)
+        try:
+            activities, next_cursor = database.get_friend_activities(
+                username, limit, request.args.get("cursor", type=str)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"activities": activities, "next_cursor": next_cursor}), 200
     else:
         return jsonify({"message": "Unauthorized"}), 403
 
 
+@app.route("/recommendations/<username>", methods=["GET"])
+@login_required
+def get_recommendations(username):
+    if current_user.id != username:
+        return jsonify({"message": "Unauthorized"}), 403
+    limit = min(request.args.get("limit", 20, type=int), 100)
+    recommendations = database.get_recommendations(username, limit)
+    return jsonify({"recommendations": recommendations}), 200
+
+
 @app.route("/signup", methods=["POST"])
 def signup():
     data = request.get_json()
@@ -109,6 +282,7 @@ def signup():
 @login_required
 def logout():
     if current_user.is_authenticated:
+        database.invalidate_principal(current_user.id)
         logout_user()
         return jsonify({"logout": True, "message": "Logged out successfully"}), 200
     else:
@@ -117,6 +291,7 @@ def logout():
 
 @app.route("/get_genres", methods=["GET"])
 @login_required
+@conditional(catalog_validators, private=True)
 def get_genres():
     genres = database.get_all_genres()
     return jsonify(genres)
@@ -124,19 +299,29 @@ def get_genres():
 
 @app.route("/friends/<username>", methods=["GET"])
 def get_friends(username):
-    friends = database.get_friends(username)
-    non_friends = database.get_non_friends(username, friends)
-    return jsonify({"friends": friends, "nonFriends": non_friends})
+    search = request.args.get("q", type=str)
+    limit = min(request.args.get("limit", 50, type=int), 200)
+    cursor = request.args.get("cursor", type=str)
+    friends, non_friends, next_cursor = database.get_friends_page(
+        username, search, limit, cursor
+    )
+    return jsonify(
+        {"friends": friends, "nonFriends": non_friends, "next_cursor": next_cursor}
+    )
 
 
 @app.route("/add_friend", methods=["POST"])
 def add_friend():
     data = request.json
-    database.add_friend(data["user_a"], data["user_b"])
-    return jsonify({"status": "success"})
+    success, message = database.add_friend(data["user_a"], data["user_b"])
+    if success:
+        return jsonify({"status": "success"})
+    status = 404 if message == database.UNKNOWN_REFERENCE else 500
+    return jsonify({"status": "error", "error": message}), status
 
 
 @app.route("/movies/<imdb_id>", methods=["GET"])
+@conditional(rated_catalog_validators)
 def get_movie(imdb_id):
     movie_details = database.get_movie_by_imdb_id(imdb_id)
     if movie_details:
@@ -147,8 +332,15 @@ def get_movie(imdb_id):
 
 @app.route("/reviews/<movie_id>", methods=["GET"])
 def get_reviews(movie_id):
-    reviews = database.get_movie_reviews(movie_id)
-    return jsonify(reviews)
+    limit = min(request.args.get("limit", REVIEWS_LIMIT, type=int), PAGE_LIMIT_MAX)
+    cursor = request.args.get("cursor", type=str)
+    try:
+        if wants_ndjson():
+            return ndjson_response(database.iter_movie_reviews(movie_id, cursor))
+        reviews, next_cursor = database.get_movie_reviews(movie_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"reviews": reviews, "next_cursor": next_cursor})
 
 
 @app.route("/remove_from_backlog/<int:movie_id>", methods=["DELETE"])
@@ -167,6 +359,7 @@ def remove_from_backlog(movie_id):
 
 @app.route("/get_movies", methods=["GET"])
 @login_required
+@conditional(rated_catalog_validators, private=True)
 def get_movies():
     page = request.args.get("page", 1, type=int)
     sort_by = request.args.get("sort_by", "vote_average", type=str)
@@ -174,13 +367,32 @@ def get_movies():
     genre = request.args.get("genre", type=str)
     search = request.args.get("search", type=str)
     collection = request.args.get("collection", type=str)
+    cursor = request.args.get("cursor", type=str)
+    include_total = request.args.get("include_total", "0") in ("1", "true")
 
+    # Offset paging is kept for old clients; a cursor takes precedence over it
     offset = (page - 1) * MOVIE_LIMIT
 
-    total, movies = database.get_movies(
-        MOVIE_LIMIT, offset, sort_by, order, genre, search, collection
-    )
-    return jsonify({"movies": movies, "total": total})
+    try:
+        total, movies, next_cursor = database.get_movies(
+            MOVIE_LIMIT,
+            offset,
+            sort_by,
+            order,
+            genre,
+            search,
+            collection,
+            cursor=cursor,
+            with_total=include_total,
+            fields=requested_fields(),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = {"movies": movies, "next_cursor": next_cursor}
+    if total is not None:
+        response["total"] = total
+    return jsonify(response)
 
 
 @app.route("/get_poster/<imdb_id>", methods=["GET"])
@@ -190,6 +402,28 @@ def get_movie_poster(imdb_id):
     return jsonify({"poster_url": poster_url})
 
 
+@app.route("/get_posters", methods=["GET"])
+@login_required
+def get_movie_posters():
+    # Accepts ?imdb_ids=tt1,tt2 as well as repeated imdb_ids parameters
+    imdb_ids = [
+        imdb_id
+        for value in request.args.getlist("imdb_ids")
+        for imdb_id in value.split(",")
+        if imdb_id
+    ]
+    if not imdb_ids:
+        return jsonify({"error": "imdb_ids is required"}), 400
+    if len(imdb_ids) > POSTER_BATCH_LIMIT:
+        return (
+            jsonify({"error": f"At most {POSTER_BATCH_LIMIT} imdb_ids per request"}),
+            400,
+        )
+
+    posters, failed = database.fetch_movie_posters(imdb_ids)
+    return jsonify({"posters": posters, "failed": failed})
+
+
 @app.route("/add_to_backlog", methods=["POST"])
 @login_required  # Assuming you want this route protected as well
 def add_to_backlog():
@@ -205,12 +439,16 @@ def add_to_backlog():
 
 
 @app.route("/get_backlog", methods=["GET"])
+@conditional(user_validators, private=True)
 def get_backlog():
     username = request.args.get("username")
     if not username:
         return jsonify({"error": "Username is required"}), 400
 
-    backlog_movies, message = database.get_backlog(username)
+    try:
+        backlog_movies, message = database.get_backlog(username, requested_fields())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if backlog_movies is not None:
         return jsonify({"movies": backlog_movies}), 200
     else:
@@ -225,17 +463,73 @@ def mark_watched():
     review = data.get("review")
     rating = data.get("rating")
 
-    database.remove_from_backlog(username, movie_id)
     success, message = database.mark_movie_as_watched(
-        username, movie_id, review, rating
+        username, movie_id, review, rating, from_backlog=True
     )
     if success:
         return jsonify({"message": message}), 200
+    elif message == database.UNKNOWN_REFERENCE:
+        return jsonify({"error": message}), 404
     else:
         return jsonify({"error": message}), 500
 
 
+@app.route("/bulk", methods=["POST"])
+@login_required
+def bulk():
+    # Many backlog and watched changes in one request and one transaction,
+    # e.g. {"operations": [{"op": "mark_watched", "movie_id": 1, "rating": 8}]}
+    operations = (request.get_json(silent=True) or {}).get("operations")
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > BULK_LIMIT:
+        return jsonify({"error": f"At most {BULK_LIMIT} operations per request"}), 400
+
+    applied, results, error = database.apply_bulk(current_user.id, operations)
+    if applied:
+        return jsonify({"applied": True, "results": results}), 200
+    elif results is not None:
+        return jsonify({"applied": False, "error": error, "results": results}), 400
+    else:
+        return jsonify({"applied": False, "error": error}), 500
+
+
+@app.route("/import", methods=["POST"])
+@login_required
+def import_history():
+    # A Letterboxd (or IMDb) CSV export, uploaded as the "file" field or sent
+    # as the request body. ?target=backlog imports a watchlist instead.
+    upload = request.files.get("file")
+    body = upload.stream if upload else request.stream
+    if wants_ndjson():
+        # Werkzeug closes the upload when the view returns, before the
+        # response streams, so keep a copy the generator owns
+        spooled = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+        shutil.copyfileobj(body, spooled)
+        spooled.seek(0)
+        body = spooled
+    lines = io.TextIOWrapper(
+        body,
+        encoding="utf-8-sig",  # spreadsheet exports often start with a BOM
+        errors="replace",
+        newline="",
+    )
+    try:
+        progress = database.import_history(
+            current_user.id, lines, request.args.get("target", "watched")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if wants_ndjson():
+        # A progress line after every chunk, then the report
+        return ndjson_response(stream_with_context(progress))
+    for report in progress:
+        pass
+    return jsonify(report), 200
+
+
 @app.route("/get_user_profile", methods=["GET"])
+@conditional(user_validators, private=True)
 def get_user_profile():
     username = request.args.get("username")
     user = database.get_user_profile(username)
@@ -246,10 +540,47 @@ def get_user_profile():
 
 
 @app.route("/get_watched_movies", methods=["GET"])
+@conditional(user_validators, private=True)
 def get_watched_movies():
     username = request.args.get("username")
-    movies = database.get_watched_movies(username)
-    return jsonify({"movies": movies}), 200
+    limit = min(request.args.get("limit", WATCHED_LIMIT, type=int), PAGE_LIMIT_MAX)
+    cursor = request.args.get("cursor", type=str)
+    try:
+        if wants_ndjson():
+            # A full export of the history, without holding it in memory
+            return ndjson_response(
+                database.iter_watched_movies(username, requested_fields(), cursor)
+            )
+        movies, next_cursor = database.get_watched_movies(
+            username, requested_fields(), limit, cursor
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if movies is None:
+        return jsonify({"error": "Could not load watched movies"}), 500
+    return jsonify({"movies": movies, "next_cursor": next_cursor}), 200
+
+
+@app.route("/dashboard/<username>", methods=["GET"])
+@login_required
+def get_dashboard(username):
+    # Profile, friends, the first page of watched and backlog, and cached
+    # posters in one request; the cursors page through the two lists
+    limit = min(request.args.get("limit", DASHBOARD_LIMIT, type=int), 100)
+    try:
+        dashboard = database.get_dashboard(
+            username,
+            limit,
+            request.args.get("watched_cursor", type=str),
+            request.args.get("backlog_cursor", type=str),
+            with_feed=current_user.id == username,
+            viewer=current_user.id,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if dashboard is None:
+        return jsonify({"message": "User not found"}), 404
+    return jsonify(dashboard), 200
 
 
 @app.route("/update_bio", methods=["POST"])
@@ -271,14 +602,49 @@ def handle_update_movie_review():
     movie_id = data["movie_id"]
     review = data["review"]
     rating = data["rating"]
-    result = database.update_movie_review(username, movie_id, review, rating)
-    if result:
+    success, message = database.update_movie_review(username, movie_id, review, rating)
+    if success:
         return jsonify({"status": "success"}), 200
+    elif message == database.UNKNOWN_REFERENCE:
+        return jsonify({"status": "error", "error": message}), 404
     else:
         return jsonify({"status": "error"}), 500
 
 
+@app.route("/stats", methods=["GET"])
+@monitoring_only
+def stats():
+    return jsonify(database.stats()), 200
+
+
+@app.route("/metrics", methods=["GET"])
+@monitoring_only
+def get_metrics():
+    gauges = {
+        "reelfriends_pool": ("Connection pool state.", database.pool.stats()),
+        "reelfriends_count_cache": (
+            "Movie count cache state.",
+            database.count_cache.stats(),
+        ),
+        "reelfriends_principal_cache": (
+            "Logged-in user cache state.",
+            database.principal_cache.stats(),
+        ),
+        "reelfriends_writer": ("Group-commit writer state.", database.writer.stats()),
+        "reelfriends_poster_cache": (
+            "Poster memory cache state.",
+            database.poster_cache.memory.stats(),
+        ),
+    }
+    body = metrics.registry.render() + "".join(
+        metrics.gauge_lines(name, help, values, label="stat")
+        for name, (help, values) in gauges.items()
+    )
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 @app.route("/get_collections")
+@conditional(catalog_validators)
 def get_collections():
     collections = database.get_collections()
     if collections:
@@ -0,0 +1,141 @@
+import bisect
+import time
+
+import numpy as np
+
+
+def sort_key(value):
+    """A tuple that orders like ``value`` in an SQLite ORDER BY.
+
+    SQLite puts NULLs first, then numbers (integers and reals compared by
+    value), then text in BINARY collation, which for UTF-8 is code point
+    order, then blobs.
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+class ColumnarCatalog:
+    """The browsable movies held as NumPy columns, for the movie browser.
+
+    Built from (id, collection, *sort columns) rows ordered by id and
+    (movie_id, genre) rows. Each sort column is kept as the rank of every
+    movie's value among the column's distinct values, so that filters,
+    counts and keyset positions are integer comparisons and the order of
+    any filtered set is a pass over one precomputed permutation. Genres are
+    bitmasks over the movies, collections small integer codes. Only movie
+    ids come back; the rows themselves are still read from SQLite.
+    """
+
+    def __init__(self, movies, genres, sort_columns):
+        started = time.perf_counter()
+        movies = list(movies)
+        self.ids = np.array([row[0] for row in movies], dtype=np.int64)
+        position = {movie_id: i for i, movie_id in enumerate(self.ids.tolist())}
+
+        self.collections = {}  # collection -> code; movies without one get -1
+        codes = [-1] * len(movies)
+        for i, row in enumerate(movies):
+            if row[1] is not None:
+                codes[i] = self.collections.setdefault(row[1], len(self.collections))
+        self.collection_codes = np.array(codes, dtype=np.int64)
+
+        self.genres = {}  # genre -> bit
+        rows, bits = [], []
+        for movie_id, genre in genres:
+            if movie_id in position:
+                rows.append(position[movie_id])
+                bits.append(self.genres.setdefault(genre, len(self.genres)))
+        rows, bits = np.array(rows, dtype=np.int64), np.array(bits, dtype=np.uint64)
+        words = max(1, -(-len(self.genres) // 64))
+        self.genre_masks = np.zeros((len(movies), words), dtype=np.uint64)
+        np.bitwise_or.at(
+            self.genre_masks,
+            (rows, (bits // np.uint64(64)).astype(np.int64)),
+            np.uint64(1) << (bits % np.uint64(64)),
+        )
+
+        # Ranks are odd (2 * index + 1) so that a cursor value that is not in
+        # the column any more still gets an even rank between its neighbours
+        self.keys, self.ranks, self.ascending = {}, {}, {}
+        for column, name in enumerate(sort_columns, start=2):
+            keys = [sort_key(row[column]) for row in movies]
+            distinct = sorted(set(keys))
+            index = {key: i for i, key in enumerate(distinct)}
+            self.keys[name] = distinct
+            self.ranks[name] = np.array(
+                [2 * index[key] + 1 for key in keys], dtype=np.int64
+            )
+            # ids are ascending, so a stable sort breaks ties by id
+            self.ascending[name] = np.argsort(self.ranks[name], kind="stable")
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - started
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, column, value):
+        """The rank ``value`` would have in ``column``."""
+        keys, key = self.keys[column], sort_key(value)
+        i = bisect.bisect_left(keys, key)
+        return 2 * i + 1 if i < len(keys) and keys[i] == key else 2 * i
+
+    def search(
+        self,
+        sort_by,
+        order,
+        genre=None,
+        collection=None,
+        after=None,
+        offset=0,
+        limit=None,
+    ):
+        """Return (total, movie ids) for a page of the browsable movies.
+
+        The page is ordered by ``sort_by`` and then id, both ``order``, with
+        NULLs placed as SQLite places them. ``total`` counts every movie
+        matching ``genre`` and ``collection``. ``after`` is the (value, id)
+        keyset position of the row before the page.
+        """
+        matches = np.ones(len(self.ids), dtype=bool)
+        if genre:
+            bit = self.genres.get(genre)
+            if bit is None:
+                matches[:] = False
+            else:
+                word = self.genre_masks[:, bit // 64]
+                matches &= (word & np.uint64(1 << (bit % 64))) != 0
+        if collection:
+            code = self.collections.get(collection, -2)
+            matches &= self.collection_codes == code
+        total = int(np.count_nonzero(matches))
+
+        ranks = self.ranks[sort_by]
+        if after is not None:
+            value, row_id = after
+            rank = self.rank(sort_by, value)
+            if order == "asc":
+                matches &= (ranks > rank) | ((ranks == rank) & (self.ids > row_id))
+            else:
+                matches &= (ranks < rank) | ((ranks == rank) & (self.ids < row_id))
+
+        rows = self.ascending[sort_by]
+        if order == "desc":
+            rows = rows[::-1]
+        rows = rows[matches[rows]]
+        end = None if limit is None else offset + limit
+        return total, self.ids[rows[offset:end]].tolist()
+
+    def stats(self):
+        return {
+            "movies": len(self.ids),
+            "genres": len(self.genres),
+            "collections": len(self.collections),
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+        }
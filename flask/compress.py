@@ -0,0 +1,52 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # responses are only gzipped
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+GZIP_LEVEL = 4  # past 4, each level costs about 50% more time for ~5% fewer bytes
+BROTLI_QUALITY = 4  # higher qualities cost far more time than they save in bytes
+
+
+def choose_encoding(accept_encodings):
+    """The best encoding we can produce from a request's Accept-Encoding."""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response, accept_encodings):
+    """Compress a buffered response body in place, if it is worth it.
+
+    Streamed responses, statuses without a body and anything already
+    encoded are left alone.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or not response.mimetype.startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    # The body depends on the request's Accept-Encoding from here on
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encodings)
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, GZIP_LEVEL, mtime=0))
+    else:
+        return response
+    response.headers["Content-Encoding"] = encoding
+    return response
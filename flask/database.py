@@ -1,25 +1,243 @@
+import base64
+import itertools
+import json
+import os
+import re
 import sqlite3
-import requests
+import threading
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
+import metrics
+from cache import LRUCache
+from catalog import ColumnarCatalog
+from importer import TitleIndex, read_csv
+from pool import ConnectionPool
+from posters import PosterCache
+from recommend import ItemItemRecommender
+from writer import GroupCommitWriter, WriteQueueFull
+
 
-DATABASE = "../sql/db.sqlite"
 load_dotenv()
+# REELFRIENDS_DATABASE points the app at another database, such as one built
+# by data/generate_data.py for load tests
+DATABASE = os.getenv("REELFRIENDS_DATABASE", "../sql/db.sqlite")
 
+# Every statement is timed and counted for /metrics; see flask/metrics.py
+pool = ConnectionPool(DATABASE, factory=metrics.InstrumentedConnection)
+
+# How long a read of catalog_version (and ratings_version) is trusted before
+# asking SQLite again. The catalog only changes when the loader runs, so a
+# second of lag is fine; this process's own rating writes expire it at once.
+CATALOG_VERSION_TTL = 1.0
+
+# Filter-result counts for the movie browser, keyed by the catalog version
+# and the normalized filters
+count_cache = LRUCache(maxsize=1024)
+
+# Logged-in users as flask-login's user_loader needs them: the username and
+# nothing else, never the password hash. Entries expire so a user removed by
+# another process stops authenticating within PRINCIPAL_TTL. Usernames with
+# no account are remembered for a shorter time.
+PRINCIPAL_TTL = 300
+MISSING_PRINCIPAL_TTL = 30
+principal_cache = LRUCache(maxsize=10000, ttl=PRINCIPAL_TTL)
+_MISSING = object()
+
+# Each user's feed keeps its newest FEED_RETENTION rows, as
+# data/rebuild_feed.py does. Watches and friendships only add rows, so the
+# users whose writes grew feeds are noted, and those feeds are trimmed
+# together on the writer thread at most every FEED_PRUNE_INTERVAL seconds
+# rather than on every row fanned out.
+FEED_RETENTION = 200
+FEED_PRUNE_INTERVAL = 60
+_feed_growth = {"usernames": set(), "pruned": time.monotonic()}
+_feed_growth_lock = threading.Lock()
+
+# Rows read per transaction when a whole list is streamed as NDJSON
+STREAM_PAGE_SIZE = 500
+
+# Imports match titles against an in-memory index of the catalog, rebuilt
+# when the catalog version changes. Matched rows are written this many to a
+# transaction; the report lists at most IMPORT_UNMATCHED_LIMIT unmatched rows.
+IMPORT_CHUNK_SIZE = 500
+IMPORT_UNMATCHED_LIMIT = 1000
+_title_index = {"version": None, "index": None}
+_title_index_lock = threading.Lock()
+
+# With REELFRIENDS_CATALOG_ENGINE=columnar the movie browser filters, sorts
+# and counts in NumPy (see flask/catalog.py) and only reads the page's rows
+# from SQLite. The columns are reloaded when the catalog version changes.
+# Text search and the sorts on our users' ratings always run in SQL.
+CATALOG_ENGINE = os.getenv("REELFRIENDS_CATALOG_ENGINE", "sqlite")
+_columnar_catalog = {"version": None, "catalog": None}
+_columnar_catalog_lock = threading.Lock()
+
+# The recommender applies each rating as it is written, and is rebuilt from
+# scratch this often to pick up writes made by other processes
+RECOMMENDER_REBUILD_INTERVAL = 3600
+recommender = ItemItemRecommender()
+_recommender_rebuilding = threading.Lock()
+
+_catalog_version = {
+    "version": None,
+    "updated_at": None,
+    "ratings_version": None,
+    "ratings_updated_at": None,
+    "checked": 0.0,
+}
+_catalog_version_lock = threading.Lock()
+
+
+def get_db(write=False):
+    """Check out a pooled connection wrapped in a transaction.
+
+    Use as ``with get_db() as conn:``. Pass ``write=True`` for helpers that
+    modify data so the write lock is taken when the transaction begins.
+    """
+    return pool.connection(write=write)
+
+
+poster_cache = PosterCache(get_db)
+
+# Backlog, watched and friend writes are queued and committed in groups by
+# one writer thread; see flask/writer.py
+writer = GroupCommitWriter(get_db)
+
+
+def _write(operation, *args):
+    """Run ``operation(conn, *args)`` on the writer thread and return its result.
+
+    Write helpers are split in two: ``_name`` does the SQL on the writer's
+    connection, and ``name`` submits it and waits for the group to commit.
+    The helpers let WriteQueueFull through, for app.py to answer with a 503.
+    """
+    return writer.submit(operation, *args).result()
+
+
+# What a write helper reports when the user or film it names does not exist,
+# which the foreign keys (see PRAGMAS in flask/pool.py) reject
+UNKNOWN_REFERENCE = "Unknown user or movie"
+
+
+def _write_error(e):
+    """The message a write helper returns for a sqlite3 error."""
+    if isinstance(e, sqlite3.IntegrityError) and "FOREIGN KEY" in str(e):
+        return UNKNOWN_REFERENCE
+    return str(e)
+
+
+def stats():
+    return {
+        "pool": pool.stats(),
+        "count_cache": count_cache.stats(),
+        "principals": principal_cache.stats(),
+        "posters": poster_cache.stats(),
+        "writer": writer.stats(),
+        "recommender": recommender.stats(),
+        "catalog": (
+            _columnar_catalog["catalog"].stats()
+            if _columnar_catalog["catalog"]
+            else None
+        ),
+        "catalog_version": get_catalog_version(),
+        "ratings_version": _read_catalog_version()["ratings_version"],
+        "slow_queries": list(metrics.slow_queries),
+        "statements": metrics.statements(),
+    }
+
+
+def _read_catalog_version():
+    """Return a copy of the version state, re-read at most every CATALOG_VERSION_TTL.
+
+    A catalog version change drops every cache derived from the catalog.
+    """
+    with _catalog_version_lock:
+        now = time.monotonic()
+        if (
+            _catalog_version["version"] is not None
+            and now - _catalog_version["checked"] < CATALOG_VERSION_TTL
+        ):
+            return dict(_catalog_version)
+
+        with get_db() as conn:
+            row = conn.execute(
+                "SELECT c.version, c.updated_at, r.version AS ratings_version, "
+                "r.updated_at AS ratings_updated_at "
+                "FROM catalog_version c LEFT JOIN ratings_version r ON r.id = 1 "
+                "WHERE c.id = 1"
+            ).fetchone()
+        state = dict(row) if row else {}
+        version = state.get("version") or 0
+        if version != _catalog_version["version"]:
+            count_cache.clear()
+        _catalog_version["version"] = version
+        _catalog_version["updated_at"] = state.get("updated_at")
+        _catalog_version["ratings_version"] = state.get("ratings_version") or 0
+        _catalog_version["ratings_updated_at"] = state.get("ratings_updated_at")
+        _catalog_version["checked"] = now
+        return dict(_catalog_version)
+
+
+def _expire_catalog_version():
+    """Make the next read go to SQLite, after a write that bumps ratings_version."""
+    with _catalog_version_lock:
+        _catalog_version["checked"] = 0.0
+
+
+def get_catalog_version():
+    return _read_catalog_version()["version"]
+
+
+def _parse_timestamp(value):
+    """A CURRENT_TIMESTAMP string as an aware UTC datetime, or None."""
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
 
-def get_db():
-    try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
-        print(f"Error connecting to database: {e}")
+
+def _latest(*values):
+    parsed = [timestamp for timestamp in map(_parse_timestamp, values) if timestamp]
+    return max(parsed) if parsed else None
+
+
+def get_catalog_validators(with_ratings=False):
+    """Return (tag, last_modified) for a response built from the catalog.
+
+    ``with_ratings`` covers responses that also include movie_stats. Most
+    calls are answered from memory, without touching SQLite.
+    """
+    state = _read_catalog_version()
+    if not with_ratings:
+        return f"c{state['version']}", _latest(state["updated_at"])
+    return (
+        f"c{state['version']}r{state['ratings_version']}",
+        _latest(state["updated_at"], state["ratings_updated_at"]),
+    )
+
+
+def get_user_validators(username):
+    """Return (tag, last_modified) for a user's backlog, watched list or profile.
+
+    These also show catalog columns, so the catalog version is part of the tag.
+    """
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT version, updated_at FROM user_versions WHERE username = ?",
+            (username,),
+        ).fetchone()
+    state = _read_catalog_version()
+    version, updated_at = (row["version"], row["updated_at"]) if row else (0, None)
+    return (
+        f"u{version}c{state['version']}",
+        _latest(updated_at, state["updated_at"]),
+    )
 
 
 def get_user(username):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_db() as conn:
             user = conn.execute(
                 "SELECT * FROM users WHERE username = ?", (username,)
             ).fetchone()
@@ -29,107 +247,260 @@ def get_user(username):
         return None
 
 
+def get_principal(username):
+    """Return {"username"} for an existing user, or None. Cached in principal_cache."""
+    principal = principal_cache.get(username)
+    if principal is not None:
+        return None if principal is _MISSING else principal
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT username FROM users WHERE username = ?", (username,)
+        ).fetchone()
+    if row is None:
+        principal_cache.put(username, _MISSING, ttl=MISSING_PRINCIPAL_TTL)
+        return None
+    principal = {"username": row["username"]}
+    principal_cache.put(username, principal)
+    return principal
+
+
+def invalidate_principal(username):
+    principal_cache.invalidate(username)
+
+
 def get_friends(username):
+    # Friendships are stored in both directions, so this is one primary-key range
     with get_db() as conn:
         rows = conn.execute(
-            "SELECT DISTINCT users.username, users.bio FROM users "
-            "JOIN friends ON (users.username = friends.user_a OR users.username = friends.user_b) "
-            "WHERE (friends.user_a = ? OR friends.user_b = ?) AND users.username != ?",
-            (username, username, username),
+            "SELECT users.username, users.bio FROM friends "
+            "JOIN users ON users.username = friends.user_b "
+            "WHERE friends.user_a = ? AND friends.user_b != ? "
+            "ORDER BY users.username",
+            (username, username),
         ).fetchall()
         return [dict(row) for row in rows]
 
 
-def get_friend_activities(username):
+def get_friend_activities(username, limit=10, cursor=None):
+    """Return (activities, next_cursor) from the user's materialized feed.
+
+    The feed primary key is (owner, timestamp, actor, movie_id), so a page
+    is one backwards range scan of that index plus a primary-key lookup
+    into watched and movies per row.
+    """
+    params = [username]
+    after = ""
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position, list) or len(position) != 3:
+            raise ValueError("Invalid cursor")
+        after = "AND (f.timestamp, f.actor, f.movie_id) < (?, ?, ?)"
+        params += position
     with get_db() as conn:
         activities = conn.execute(
-            """
-            SELECT w.username, m.imdb_id, w.review, w.rating, w.timestamp, m.title, m.genres
-            FROM watched w
-            JOIN (
-                SELECT user_b as friend FROM friends WHERE user_a = ?
-                UNION
-                SELECT user_a as friend FROM friends WHERE user_b = ?
-            ) friends ON w.username = friends.friend
-            JOIN movies m ON m.id = w.movie_id
-            WHERE w.username != ?
-            ORDER BY w.timestamp DESC
-            LIMIT 10
+            f"""
+            SELECT f.actor AS username, f.movie_id, m.imdb_id, w.review, w.rating,
+                   f.timestamp, m.title, m.genres
+            FROM feed f
+            JOIN watched w ON w.username = f.actor AND w.movie_id = f.movie_id
+            JOIN movies m ON m.id = f.movie_id
+            WHERE f.owner = ? {after}
+            ORDER BY f.timestamp DESC, f.actor DESC, f.movie_id DESC
+            LIMIT ?
         """,
-            (username, username, username),
+            params + [limit + 1],
         ).fetchall()
-        return [dict(activity) for activity in activities]
+    activities = [dict(activity) for activity in activities]
+    next_cursor = None
+    if len(activities) > limit:
+        activities = activities[:limit]
+        last = activities[-1]
+        next_cursor = encode_cursor(
+            last["timestamp"], last["username"], last["movie_id"]
+        )
+    return activities, next_cursor
+
+
+PRUNE_FEED_SQL = """
+    DELETE FROM feed
+    WHERE owner = :owner
+      AND (timestamp, actor, movie_id) < (
+          SELECT timestamp, actor, movie_id FROM feed
+          WHERE owner = :owner
+          ORDER BY timestamp DESC, actor DESC, movie_id DESC
+          LIMIT 1 OFFSET :offset
+      )
+"""
+
+
+def _prune_feeds(conn, usernames):
+    owners = set(usernames)
+    for username in usernames:
+        rows = conn.execute(
+            "SELECT user_b FROM friends WHERE user_a = ?", (username,)
+        ).fetchall()
+        owners.update(row["user_b"] for row in rows)
+    cursor = conn.executemany(
+        PRUNE_FEED_SQL,
+        [{"owner": owner, "offset": FEED_RETENTION - 1} for owner in sorted(owners)],
+    )
+    return max(cursor.rowcount, 0)
+
+
+def prune_feeds(usernames):
+    """Trim the feeds of ``usernames`` and their friends to FEED_RETENTION rows.
+
+    Returns the number of rows removed.
+    """
+    return _write(_prune_feeds, list(usernames))
+
+
+def _feeds_grew(*usernames):
+    """Note writes that fanned out feed rows, and queue a prune if one is due.
+
+    Nothing waits for the prune; it runs on the writer thread after the
+    writes already queued.
+    """
+    with _feed_growth_lock:
+        _feed_growth["usernames"].update(usernames)
+        if time.monotonic() - _feed_growth["pruned"] < FEED_PRUNE_INTERVAL:
+            return
+        usernames = sorted(_feed_growth["usernames"])
+        _feed_growth["usernames"] = set()
+        _feed_growth["pruned"] = time.monotonic()
+    try:
+        future = writer.submit(_prune_feeds, usernames)
+    except WriteQueueFull:
+        with _feed_growth_lock:
+            _feed_growth["usernames"].update(usernames)
+        return
+
+    def report(future):
+        if future.exception() is not None:
+            print(f"Feed prune failed: {future.exception()}")
 
+    future.add_done_callback(report)
 
-def get_non_friends(username, friends):
-    # Assuming we can now directly use usernames without converting them from a dict
-    friends_usernames = [f["username"] for f in friends]
-    # Include the username in the list to exclude from non-friends
-    friends_usernames.append(username)
-    query_placeholders = ", ".join("?" for _ in friends_usernames)
+
+def get_non_friends(username, search=None, limit=50, cursor=None):
+    """Return (users, next_cursor) for users who are not friends with username.
+
+    An anti-join against the user's own friendship rows, in username order.
+    ``search`` is a username prefix and ``cursor`` the last username of the
+    previous page, so both are ranges on the users primary key.
+    """
+    where_clause = (
+        "WHERE u.username != ? AND NOT EXISTS ("
+        "SELECT 1 FROM friends f WHERE f.user_a = ? AND f.user_b = u.username)"
+    )
+    params = [username, username]
+    if search:
+        # Every string with this prefix sorts between the prefix and the
+        # prefix followed by the highest code point
+        where_clause += " AND u.username >= ? AND u.username < ?"
+        params += [search, search + chr(0x10FFFF)]
+    if cursor:
+        where_clause += " AND u.username > ?"
+        params.append(cursor)
     with get_db() as conn:
-        query = f"SELECT username, bio FROM users WHERE username NOT IN ({query_placeholders})"
-        rows = conn.execute(query, friends_usernames).fetchall()
-        return [dict(row) for row in rows]
+        rows = conn.execute(
+            f"SELECT u.username, u.bio FROM users u {where_clause} "
+            "ORDER BY u.username LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+    users = [dict(row) for row in rows[:limit]]
+    next_cursor = users[-1]["username"] if len(rows) > limit else None
+    return users, next_cursor
+
 
+def get_friends_page(username, search=None, limit=50, cursor=None):
+    """Friends plus a page of non-friends, read in one transaction."""
+    # The helpers' own get_db blocks join this one
+    with get_db():
+        friends = get_friends(username)
+        non_friends, next_cursor = get_non_friends(username, search, limit, cursor)
+    return friends, non_friends, next_cursor
 
-def get_movie_reviews(movie_id):
+
+def _movie_reviews_page(movie_id, limit, cursor):
+    with get_db() as conn:
+        return _timeline_page(
+            conn,
+            """
+            SELECT t.username, t.review, t.rating, t.timestamp
+            FROM watched t
+            WHERE t.movie_id = ? {after}
+            """,
+            [movie_id],
+            "username",
+            limit,
+            cursor,
+        )
+
+
+def get_movie_reviews(movie_id, limit=50, cursor=None):
+    """Return (reviews, next_cursor), newest first."""
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            conn.row_factory = sqlite3.Row
-            reviews = conn.execute(
-                """
-                SELECT username, review, rating, timestamp
-                FROM watched
-                WHERE movie_id = ?
-                ORDER BY timestamp DESC
-                """,
-                (movie_id,),
-            ).fetchall()
-            return [dict(row) for row in reviews]
+        return _movie_reviews_page(movie_id, limit, cursor)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
-        return []
+        return [], None
+
+
+def iter_movie_reviews(movie_id, cursor=None):
+    """Every review of a film from ``cursor`` on, newest first, as a generator."""
+    return _stream_pages(
+        lambda limit, cursor: _movie_reviews_page(movie_id, limit, cursor), cursor
+    )
+
+
+def _remove_movie_from_backlog(conn, username, movie_id):
+    cursor = conn.execute(
+        "DELETE FROM backlog WHERE username = ? AND movie_id = ?",
+        (username, movie_id),
+    )
+    return cursor.rowcount > 0  # Returns True if any row was affected
 
 
 def remove_movie_from_backlog(username, movie_id):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM backlog WHERE username = ? AND movie_id = ?",
-                (username, movie_id),
-            )
-            conn.commit()
-            return cursor.rowcount > 0  # Returns True if any row was affected
+        return _write(_remove_movie_from_backlog, username, movie_id)
+    except WriteQueueFull:
+        raise
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return False
 
 
+def _add_friend(conn, user_a, user_b):
+    # Stored in both directions; OR IGNORE skips a friendship that exists
+    conn.executemany(
+        "INSERT OR IGNORE INTO friends (user_a, user_b) VALUES (?, ?)",
+        [(user_a, user_b), (user_b, user_a)],
+    )
+
+
 def add_friend(user_a, user_b):
     # This function inserts a new friendship, ensuring not to duplicate existing ones
-    with get_db() as conn:
-        # Check if friendship already exists to avoid duplicates
-        check = conn.execute(
-            "SELECT 1 FROM friends WHERE (user_a = ? AND user_b = ?) OR (user_a = ? AND user_b = ?)",
-            (user_a, user_b, user_b, user_a),
-        ).fetchone()
-        if not check:
-            conn.execute(
-                "INSERT INTO friends (user_a, user_b) VALUES (?, ?)", (user_a, user_b)
-            )
-            conn.commit()
+    try:
+        _write(_add_friend, user_a, user_b)
+    except WriteQueueFull:
+        raise
+    except sqlite3.Error as e:
+        return False, _write_error(e)
+    _feeds_grew(user_a, user_b)
+    return True, "Friend added"
 
 
 def create_user(username, hashed_password):
     try:
-        with sqlite3.connect(DATABASE) as conn:
+        with get_db(write=True) as conn:
             conn.execute(
                 "INSERT INTO users (username, password) VALUES (?, ?)",
                 (username, hashed_password),
             )
-            conn.commit()
+        # It may be remembered as missing from a lookup before signing up
+        invalidate_principal(username)
     except sqlite3.IntegrityError:
         print("Username already exists")
     except sqlite3.Error as e:
@@ -137,201 +508,554 @@ def create_user(username, hashed_password):
 
 
 def fetch_movie_poster(imdb_id):
-    url = f"https://api.themoviedb.org/3/find/{imdb_id}?api_key={REELFRIENDS_API_KEY}&external_source=imdb_id"
-    response = requests.get(url)
-    data = response.json()
-    # Assuming the movie is always found and has a poster, adjust as necessary
-    poster_path = (
-        data["movie_results"][0]["poster_path"] if data["movie_results"] else None
-    )
-    return f"http://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
+    return poster_cache.get(imdb_id)
+
+
+def fetch_movie_posters(imdb_ids):
+    """Return ({imdb_id: poster_url}, failed_ids) for a batch of films."""
+    return poster_cache.get_many(imdb_ids)
 
 
 def get_movies_count():
-    conn = get_db()
-    count = conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
-    conn.close()
-    return count
+    with get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
 
 
 def get_all_genres():
-    conn = get_db()
-    query = "SELECT DISTINCT genres FROM movies"
-    all_genres = conn.execute(query).fetchall()
-    unique_genres = set()
-    for row in all_genres:
-        if row["genres"]:
-            unique_genres.update(map(str.strip, row["genres"].split(",")))
-    conn.close()
-    return sorted(list(unique_genres))
+    with get_db() as conn:
+        # Served straight from the movie_genres primary key, already sorted
+        query = "SELECT DISTINCT genre FROM movie_genres ORDER BY genre"
+        return [row["genre"] for row in conn.execute(query).fetchall()]
 
 
 def get_collections():
-    db = get_db()
     try:
-        cursor = db.cursor()
-        query = "SELECT DISTINCT collection FROM movies WHERE collection IS NOT NULL AND collection != '' ORDER BY collection;"
-        cursor.execute(query)
-        collections = cursor.fetchall()
-        return [collection["collection"] for collection in collections]
+        with get_db() as conn:
+            query = "SELECT DISTINCT collection FROM movies WHERE collection IS NOT NULL AND collection != '' ORDER BY collection;"
+            collections = conn.execute(query).fetchall()
+            return [collection["collection"] for collection in collections]
     except sqlite3.Error as e:
         print(f"Error fetching collections: {e}")
         return []
-    finally:
-        db.close()
 
 
-def get_movie_by_imdb_id(imdb_id):
-    conn = get_db()
-    if conn is None:
-        return None
+def movie_stats_dict(row):
+    """Shape a movie_stats row (or None) as the user_stats object of a movie."""
+    if row is None:
+        return {
+            "watch_count": 0,
+            "rating_count": 0,
+            "rating_sum": 0,
+            "rating_mean": None,
+            "histogram": [0] * 11,
+        }
+    return {
+        "watch_count": row["watch_count"],
+        "rating_count": row["rating_count"],
+        "rating_sum": row["rating_sum"],
+        "rating_mean": row["rating_mean"],
+        "histogram": [row[f"h{i}"] for i in range(11)],
+    }
 
+
+def get_movie_by_imdb_id(imdb_id):
     try:
-        # Assuming the movie details are stored in a table named 'movies'
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM movies WHERE imdb_id = ?", (imdb_id,))
-        movie = cursor.fetchone()
-        return dict(movie) if movie else None
+        with get_db() as conn:
+            movie = conn.execute(
+                "SELECT * FROM movies WHERE imdb_id = ?", (imdb_id,)
+            ).fetchone()
+            if not movie:
+                return None
+            stats = conn.execute(
+                "SELECT * FROM movie_stats WHERE movie_id = ?", (movie["id"],)
+            ).fetchone()
+        movie = dict(movie)
+        movie["user_stats"] = movie_stats_dict(stats)
+        return movie
     except Exception as e:
         print(f"Database error: {e}")
         return None
-    finally:
-        conn.close()
 
 
-def get_movies(limit, offset, sort_by, order, genre=None, search=None, collection=None):
-    conn = get_db()
-    where_clause = "WHERE vote_count >= 100"
+# The movies /get_movies browses. The partial indexes in
+# sql/migrations/0008_create_movies_browse.sql repeat this condition word for
+# word, which is what lets SQLite use them.
+BROWSABLE = "vote_count >= 100"
+
+# Columns /get_movies may sort by. Each has a (column, id) index in
+# sql/migrations/0008_create_movies_browse.sql so keyset pages are a single
+# index seek.
+SORT_COLUMNS = (
+    "vote_average",
+    "vote_count",
+    "popularity",
+    "release_date",
+    "runtime",
+    "title",
+)
+
+# Sorts on our own users' ratings, served from movie_stats
+STATS_SORT_COLUMNS = {
+    "user_rating": "movie_stats.rating_mean",
+    "user_rating_count": "movie_stats.rating_count",
+}
+
+# Columns of movies that a fields= parameter may pick. id is always returned,
+# and so are the columns an endpoint adds itself (user_rating, added_on, ...).
+MOVIE_FIELDS = (
+    "id",
+    "collection",
+    "budget",
+    "genres",
+    "imdb_id",
+    "original_language",
+    "overview",
+    "popularity",
+    "production_companies",
+    "production_countries",
+    "release_date",
+    "revenue",
+    "runtime",
+    "spoken_languages",
+    "title",
+    "vote_average",
+    "vote_count",
+)
+
+
+def movie_columns(fields, table, extra=()):
+    """Return (SELECT list, columns) for the movie ``fields`` of ``table``.
+
+    ``fields`` None selects every column. Names in ``extra`` are the
+    endpoint's own columns; they are always returned, so asking for them is
+    allowed and changes nothing. Unknown names raise ValueError.
+    """
+    if fields is None:
+        return f"{table}.*", MOVIE_FIELDS
+    unknown = [name for name in fields if name not in MOVIE_FIELDS + tuple(extra)]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    columns = tuple(dict.fromkeys(["id", *(f for f in fields if f in MOVIE_FIELDS)]))
+    return ", ".join(f"{table}.{column}" for column in columns), columns
+
+
+# Column weights for bm25(): title, overview, collection, production_companies
+FTS_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+
+def fts_query(search):
+    """Turn free text into an FTS5 MATCH expression with prefix matching.
+
+    Every word becomes a quoted prefix term, so punctuation in the input can
+    never be read as FTS5 syntax. Returns an empty string if no words remain.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", search))
+
+
+def encode_cursor(*values):
+    """Pack the keyset position of the last row into an opaque URL-safe token."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_segments(column, order, value, row_id, id_column="id"):
+    """WHERE fragments selecting the rows after (value, row_id) in ORDER BY column, id.
+
+    SQLite sorts NULLs first ascending and last descending. A single
+    condition covering both the non-NULL range and the NULL run would need
+    an OR that stops the (column, id) index from being used, so the rows are
+    split into segments that are each a plain index range. Querying them in
+    the returned order and concatenating the results gives the page.
+    """
+    if order == "asc":
+        if value is None:
+            return [
+                (f"{column} IS NULL AND {id_column} > ?", [row_id]),
+                (f"{column} IS NOT NULL", []),
+            ]
+        return [(f"({column}, {id_column}) > (?, ?)", [value, row_id])]
+    if value is None:
+        return [(f"{column} IS NULL AND {id_column} < ?", [row_id])]
+    return [
+        (f"({column}, {id_column}) < (?, ?)", [value, row_id]),
+        (f"{column} IS NULL", []),
+    ]
+
+
+def _timeline_page(conn, sql, params, tiebreak, limit, cursor):
+    """Return (rows, next_cursor) for one newest-first page of ``sql``.
+
+    ``sql`` reads from a table aliased ``t`` and leaves an ``{after}`` slot
+    at the end of its WHERE clause. Rows are ordered by t.timestamp and then
+    by the ``tiebreak`` column, both of which every row must include.
+    """
+    after = ""
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position, list) or len(position) != 2:
+            raise ValueError("Invalid cursor")
+        after = f"AND (t.timestamp, t.{tiebreak}) < (?, ?)"
+        params = params + position
+    rows = conn.execute(
+        sql.format(after=after)
+        + f" ORDER BY t.timestamp DESC, t.{tiebreak} DESC LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+    page = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = encode_cursor(page[-1]["timestamp"], page[-1][tiebreak])
+    return page, next_cursor
+
+
+def _stream_pages(fetch_page, cursor=None):
+    """Yield every row from ``cursor`` on, one STREAM_PAGE_SIZE page at a time.
+
+    ``fetch_page(limit, cursor)`` returns (rows, next_cursor) in its own
+    short read transaction, so an export never holds a transaction open
+    while the client reads and only one page is ever in memory. The first
+    page is read straight away, so a bad cursor raises here rather than
+    partway through a response.
+    """
+    rows, cursor = fetch_page(STREAM_PAGE_SIZE, cursor)
+
+    def generate(rows, cursor):
+        while True:
+            yield from rows
+            if cursor is None:
+                return
+            rows, cursor = fetch_page(STREAM_PAGE_SIZE, cursor)
+
+    return generate(rows, cursor)
+
+
+def get_movies(
+    limit,
+    offset,
+    sort_by,
+    order,
+    genre=None,
+    search=None,
+    collection=None,
+    cursor=None,
+    with_total=True,
+    fields=None,
+):
+    """Return (total, movies, next_cursor) for one page of the movie browser.
+
+    Pages are addressed either by ``offset`` or, preferably, by the
+    ``cursor`` returned with the previous page, which seeks straight to the
+    next row through the (sort column, id) index. ``total`` is only counted
+    when ``with_total`` is set and is None otherwise. ``fields`` limits the
+    movie columns returned (see movie_columns).
+    """
+    if (
+        sort_by not in SORT_COLUMNS
+        and sort_by not in STATS_SORT_COLUMNS
+        and sort_by != "relevance"
+    ):
+        raise ValueError(f"Cannot sort by {sort_by}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Invalid order {order}")
+
+    where_clause = f"WHERE {BROWSABLE}"
     params = []
+    match = fts_query(search) if search else ""
+    if sort_by == "relevance" and not match:
+        sort_by = "vote_average"
 
     if genre:
-        where_clause += " AND genres LIKE ?"
-        params.append(f"%{genre}%")
-
-    if search:
-        where_clause += " AND title LIKE ?"
-        params.append(f"%{search}%")
+        # Exact match through the movie_genres index instead of a LIKE scan
+        where_clause += " AND id IN (SELECT movie_id FROM movie_genres WHERE genre = ?)"
+        params.append(genre)
 
     if collection:
         where_clause += " AND collection = ?"
         params.append(collection)
 
-    count_query = f"SELECT COUNT(*) FROM movies {where_clause}"
-    total = conn.execute(count_query, params).fetchone()[0]
+    if sort_by == "relevance":
+        # Join the ranked matches so bm25 is computed once per matching row;
+        # lower scores are better matches, so ascending is best first.
+        from_clause = f"""
+            movies JOIN (
+                SELECT rowid, bm25(movies_fts, {", ".join(map(str, FTS_WEIGHTS))}) AS rank
+                FROM movies_fts
+                WHERE movies_fts MATCH ?
+            ) fts ON fts.rowid = movies.id
+        """
+        params.insert(0, match)
+        sort_column, sort_order = "fts.rank", "asc"
+    else:
+        from_clause = "movies"
+        if match:
+            where_clause += (
+                " AND id IN (SELECT rowid FROM movies_fts WHERE movies_fts MATCH ?)"
+            )
+            params.append(match)
+        sort_column, sort_order = STATS_SORT_COLUMNS.get(sort_by, sort_by), order
+
+    segments, after = [(None, [])], None
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position, list) or len(position) != 4:
+            raise ValueError("Invalid cursor")
+        cursor_sort, cursor_order, value, row_id = position
+        if (cursor_sort, cursor_order) != (sort_by, order):
+            raise ValueError("Cursor does not match the requested sort")
+        segments = keyset_segments(
+            sort_column, sort_order, value, row_id, id_column="movies.id"
+        )
+        after = (value, row_id)
+        offset = 0
+
+    # Every row carries our users' rating summary. Movies nobody has rated
+    # have no movie_stats row and get NULLs.
+    select, columns = movie_columns(
+        fields, "movies", extra=("user_rating", "user_rating_count")
+    )
+    select += (
+        ", movie_stats.rating_mean AS user_rating, "
+        "movie_stats.rating_count AS user_rating_count"
+    )
+    # The next cursor is built from the sort column, even if it was not asked for
+    hidden_sort = sort_by in SORT_COLUMNS and sort_by not in columns
+    if hidden_sort:
+        select += f", movies.{sort_by}"
+    if sort_by == "relevance":
+        select += ", fts.rank AS _rank"
+    catalog = None
+    if sort_by in SORT_COLUMNS and not match:
+        catalog = get_columnar_catalog()
+    with get_db() as conn:
+        if catalog is not None:
+            total, rows = _columnar_movies_page(
+                conn,
+                catalog,
+                select,
+                sort_by,
+                order,
+                genre,
+                collection,
+                after,
+                offset,
+                limit,
+            )
+            total = total if with_total else None
+        else:
+            total = None
+            if with_total:
+                # Sort order does not change the count, so it is not in the key
+                count_key = (
+                    get_catalog_version(),
+                    genre or None,
+                    match or None,
+                    collection or None,
+                )
+                total = count_cache.get(count_key)
+                if total is None:
+                    count_query = f"SELECT COUNT(*) FROM {from_clause} {where_clause}"
+                    total = conn.execute(count_query, params).fetchone()[0]
+                    count_cache.put(count_key, total)
 
-    movies_query = f"""
-        SELECT *
-        FROM movies
-        {where_clause}
-        ORDER BY {sort_by} {order}
-        LIMIT ? OFFSET ?
+            # One extra row tells us whether there is a next page
+            rows = []
+            for condition, condition_params in segments:
+                page_clause = where_clause
+                if condition:
+                    page_clause += f" AND {condition}"
+                movies_query = f"""
+                    SELECT {select}
+                    FROM {from_clause}
+                    LEFT JOIN movie_stats ON movie_stats.movie_id = movies.id
+                    {page_clause}
+                    ORDER BY {sort_column} {sort_order}, movies.id {sort_order}
+                    LIMIT ? OFFSET ?
+                """
+                rows += conn.execute(
+                    movies_query,
+                    params + condition_params + [limit + 1 - len(rows), offset],
+                ).fetchall()
+                if len(rows) > limit:
+                    break
+
+    movies = [dict(row) for row in rows[:limit]]
+    ranks = [movie.pop("_rank", None) for movie in movies]
+    next_cursor = None
+    if len(rows) > limit:
+        last = movies[-1]
+        key = ranks[-1] if sort_by == "relevance" else last[sort_by]
+        next_cursor = encode_cursor(sort_by, order, key, last["id"])
+    if hidden_sort:
+        for movie in movies:
+            del movie[sort_by]
+    return total, movies, next_cursor
+
+
+def _columnar_movies_page(
+    conn, catalog, select, sort_by, order, genre, collection, after, offset, limit
+):
+    """Return (total, rows) for get_movies from the ColumnarCatalog.
+
+    The catalog picks the page's ids and the rows are then read by primary
+    key, so they are the same rows the SQL path would return.
     """
-    params.extend([limit, offset])
-    movies = conn.execute(movies_query, params).fetchall()
-    conn.close()
+    total, ids = catalog.search(
+        sort_by, order, genre, collection, after, offset, limit + 1
+    )
+    found = {
+        row["id"]: row
+        for row in conn.execute(
+            f"""
+            SELECT {select}
+            FROM movies
+            LEFT JOIN movie_stats ON movie_stats.movie_id = movies.id
+            WHERE movies.id IN ({", ".join("?" * len(ids))})
+            """,
+            ids,
+        ).fetchall()
+    }
+    return total, [found[movie_id] for movie_id in ids if movie_id in found]
 
-    return total, [dict(row) for row in movies]
 
+def get_columnar_catalog():
+    """The ColumnarCatalog, or None unless CATALOG_ENGINE is "columnar".
 
-def add_to_backlog(username, movie_id):
-    conn = get_db()
-    if conn is None:
-        return False, "Database connection error"
+    Loaded on first use and again after the catalog changes.
+    """
+    if CATALOG_ENGINE != "columnar":
+        return None
+    version = get_catalog_version()
+    with _columnar_catalog_lock:
+        if _columnar_catalog["version"] != version:
+            with get_db() as conn:
+                movies = conn.execute(
+                    f"SELECT id, collection, {', '.join(SORT_COLUMNS)} "
+                    f"FROM movies WHERE {BROWSABLE} ORDER BY id"
+                ).fetchall()
+                genres = conn.execute(
+                    "SELECT g.movie_id, g.genre FROM movies m "
+                    f"JOIN movie_genres g ON g.movie_id = m.id WHERE {BROWSABLE}"
+                ).fetchall()
+            _columnar_catalog["catalog"] = ColumnarCatalog(movies, genres, SORT_COLUMNS)
+            _columnar_catalog["version"] = version
+        return _columnar_catalog["catalog"]
 
-    try:
-        with conn:
-            # Check if the movie is already in the backlog
-            cursor = conn.execute(
-                "SELECT 1 FROM backlog WHERE username = ? AND movie_id = ?",
-                (username, movie_id),
-            )
-            if cursor.fetchone():
-                return True, "Movie already in backlog"
 
-            # Insert the movie into the backlog
-            conn.execute(
-                "INSERT INTO backlog (username, movie_id) VALUES (?, ?)",
-                (username, movie_id),
-            )
-            return True, "Movie added to backlog successfully"
+def _add_to_backlog(conn, username, movie_id):
+    # Check if the movie is already in the backlog
+    cursor = conn.execute(
+        "SELECT 1 FROM backlog WHERE username = ? AND movie_id = ?",
+        (username, movie_id),
+    )
+    if cursor.fetchone():
+        return True, "Movie already in backlog"
+
+    # Insert the movie into the backlog
+    conn.execute(
+        "INSERT INTO backlog (username, movie_id) VALUES (?, ?)",
+        (username, movie_id),
+    )
+    return True, "Movie added to backlog successfully"
+
+
+def add_to_backlog(username, movie_id):
+    try:
+        return _write(_add_to_backlog, username, movie_id)
+    except WriteQueueFull:
+        raise
     except sqlite3.Error as e:
-        return False, str(e)
-    finally:
-        if conn:
-            conn.close()
+        return False, _write_error(e)
 
 
-def get_backlog(username):
-    conn = get_db()
-    if conn is None:
-        return None, "Database connection error"
+def get_backlog(username, fields=None):
+    select, _ = movie_columns(fields, "m", extra=("added_on",))
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT m.*, b.timestamp AS added_on FROM movies m
-            JOIN backlog b ON m.id = b.movie_id
-            WHERE b.username = ?
-        """,
-            (username,),
-        )
-        movies = cursor.fetchall()
-        return [dict(movie) for movie in movies], "Success"
+        with get_db() as conn:
+            movies = conn.execute(
+                f"""
+                SELECT {select}, b.timestamp AS added_on FROM movies m
+                JOIN backlog b ON m.id = b.movie_id
+                WHERE b.username = ?
+            """,
+                (username,),
+            ).fetchall()
+            return [dict(movie) for movie in movies], "Success"
     except sqlite3.Error as e:
         return None, str(e)
-    finally:
-        if conn:
-            conn.close()
+
+
+def _remove_from_backlog(conn, username, movie_id):
+    conn.execute(
+        "DELETE FROM backlog WHERE username = ? AND movie_id = ?",
+        (username, movie_id),
+    )
 
 
 def remove_from_backlog(username, movie_id):
-    conn = get_db()
-    if conn is None:
-        return False, "Database connection error"
     try:
-        with conn:
-            conn.execute(
-                "DELETE FROM backlog WHERE username = ? AND movie_id = ?",
-                (username, movie_id),
-            )
+        _write(_remove_from_backlog, username, movie_id)
         return True, "Removed from backlog"
+    except WriteQueueFull:
+        raise
     except sqlite3.Error as e:
         return False, str(e)
 
 
-def mark_movie_as_watched(username, movie_id, review=None, rating=None):
-    conn = get_db()
-    if conn is None:
-        return False, "Database connection error"
+MARK_WATCHED_SQL = """
+    INSERT INTO watched (username, movie_id, review, rating, timestamp)
+    VALUES (:username, :movie_id, :review, :rating, CURRENT_TIMESTAMP)
+    ON CONFLICT(username, movie_id)
+    DO UPDATE SET review = excluded.review, rating = excluded.rating, timestamp = CURRENT_TIMESTAMP;
+"""
+# Also the mark_watched result of apply_bulk
+MARK_WATCHED_MESSAGE = "Movie marked as watched and data updated"
+
+
+def _mark_movie_as_watched(conn, username, movie_id, review, rating, from_backlog):
+    if from_backlog:
+        _remove_from_backlog(conn, username, movie_id)
+    conn.execute(
+        MARK_WATCHED_SQL,
+        {
+            "username": username,
+            "movie_id": movie_id,
+            "review": review,
+            "rating": rating,
+        },
+    )
+
+
+def mark_movie_as_watched(
+    username, movie_id, review=None, rating=None, from_backlog=False
+):
+    """Record a watch, replacing any earlier review and rating.
+
+    ``from_backlog`` also takes the film off the backlog, in the same transaction.
+    """
     try:
-        with conn:
-            conn.execute(
-                """
-                INSERT INTO watched (username, movie_id, review, rating, timestamp)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(username, movie_id) 
-                DO UPDATE SET review = excluded.review, rating = excluded.rating, timestamp = CURRENT_TIMESTAMP;
-            """,
-                (username, movie_id, review, rating),
-            )
-            conn.commit()
-            return True, "Movie marked as watched and data updated"
+        _write(_mark_movie_as_watched, username, movie_id, review, rating, from_backlog)
+    except WriteQueueFull:
+        raise
     except sqlite3.Error as e:
-        return False, str(e)
-    finally:
-        if conn:
-            conn.close()
+        return False, _write_error(e)
+    _expire_catalog_version()
+    _feeds_grew(username)
+    recommender.record_rating(username, movie_id, rating)
+    return True, MARK_WATCHED_MESSAGE
 
 
 def get_user_profile(username):
-    conn = get_db()
-
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT username, bio FROM users WHERE username = ?", (username,)
-        )
-        user = cursor.fetchone()
+        with get_db() as conn:
+            user = conn.execute(
+                "SELECT username, bio FROM users WHERE username = ?", (username,)
+            ).fetchone()
         if user:
             return dict(user)
         else:
@@ -339,67 +1063,506 @@ def get_user_profile(username):
     except sqlite3.Error as e:
         print(f"get_user_profile: SQL error - {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 
-def get_watched_movies(username):
-    conn = get_db()
-    if conn is None:
-        print("get_watched_movies: Failed to get DB connection.")
-        return None
+def _watched_movies_page(username, fields, limit, cursor):
+    select, _ = movie_columns(
+        fields, "m", extra=("username", "movie_id", "review", "rating", "timestamp")
+    )
+    with get_db() as conn:
+        return _timeline_page(
+            conn,
+            f"""
+            SELECT t.*, {select}
+            FROM watched t
+            JOIN movies m ON t.movie_id = m.id
+            WHERE t.username = ? {{after}}
+            """,
+            [username],
+            "movie_id",
+            limit,
+            cursor,
+        )
+
+
+def get_watched_movies(username, fields=None, limit=100, cursor=None):
+    """Return (movies, next_cursor) from the user's watch history, newest first."""
     try:
-        cursor = conn.cursor()
-        cursor.execute(
+        return _watched_movies_page(username, fields, limit, cursor)
+    except sqlite3.Error as e:
+        print(f"get_watched_movies: SQL error - {e}")
+        return None, None
+
+
+def iter_watched_movies(username, fields=None, cursor=None):
+    """The user's whole watch history from ``cursor`` on, as a generator."""
+    return _stream_pages(
+        lambda limit, cursor: _watched_movies_page(username, fields, limit, cursor),
+        cursor,
+    )
+
+
+def get_dashboard(
+    username,
+    limit=20,
+    watched_cursor=None,
+    backlog_cursor=None,
+    with_feed=False,
+    viewer=None,
+):
+    """Everything a profile page shows, read on one connection in one transaction.
+
+    Returns None for an unknown user. The watched and backlog lists are
+    newest first and paged separately by their own cursors. Posters come
+    from the poster cache only; films it has no URL for are listed in
+    ``missing_posters`` for the client to fetch. Counts of the user's friend
+    feed are only included ``with_feed``, as the feed is private. With a
+    ``viewer``, each friend has ``is_friend``: whether the viewer is (or is
+    already friends with) that user.
+    """
+    with get_db() as conn:
+        profile = conn.execute(
+            "SELECT username, bio FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if profile is None:
+            return None
+        counts = conn.execute(
             """
-            SELECT *
-            FROM watched w
-            JOIN movies m ON w.movie_id = m.id
-            WHERE w.username = ?
-            ORDER BY w.timestamp DESC
+            SELECT (SELECT COUNT(*) FROM watched WHERE username = :username) AS watched,
+                   (SELECT COUNT(*) FROM backlog WHERE username = :username) AS backlog,
+                   (SELECT COUNT(*) FROM friends
+                    WHERE user_a = :username AND user_b != :username) AS friends
         """,
-            (username,),
+            {"username": username},
+        ).fetchone()
+        counts = dict(counts)
+        if with_feed:
+            feed = conn.execute(
+                """
+                SELECT COUNT(*) AS friend_activities,
+                       COUNT(CASE WHEN timestamp >= datetime('now', '-7 days')
+                             THEN 1 END) AS friend_activities_this_week
+                FROM feed WHERE owner = ?
+            """,
+                (username,),
+            ).fetchone()
+            counts.update(dict(feed))
+        friends = get_friends(username)
+        if viewer is not None:
+            viewer_friends = {
+                row["user_b"]
+                for row in conn.execute(
+                    "SELECT user_b FROM friends WHERE user_a = ?", (viewer,)
+                )
+            }
+            viewer_friends.add(viewer)
+            for friend in friends:
+                friend["is_friend"] = friend["username"] in viewer_friends
+        watched, watched_next = _timeline_page(
+            conn,
+            """
+            SELECT m.*, t.username, t.movie_id, t.review, t.rating, t.timestamp
+            FROM watched t
+            JOIN movies m ON m.id = t.movie_id
+            WHERE t.username = ? {after}
+            """,
+            [username],
+            "movie_id",
+            limit,
+            watched_cursor,
         )
-        movies = cursor.fetchall()
-        return [dict(movie) for movie in movies]
-    except sqlite3.Error as e:
-        print(f"get_watched_movies: SQL error - {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+        backlog, backlog_next = _timeline_page(
+            conn,
+            """
+            SELECT m.*, t.movie_id, t.timestamp AS timestamp, t.timestamp AS added_on
+            FROM backlog t
+            JOIN movies m ON m.id = t.movie_id
+            WHERE t.username = ? {after}
+            """,
+            [username],
+            "movie_id",
+            limit,
+            backlog_cursor,
+        )
+        imdb_ids = [movie["imdb_id"] for movie in watched + backlog if movie["imdb_id"]]
+        found = poster_cache.lookup(list(dict.fromkeys(imdb_ids)))
+    return {
+        "profile": dict(profile),
+        "counts": counts,
+        "friends": friends,
+        "watched": {"movies": watched, "next_cursor": watched_next},
+        "backlog": {"movies": backlog, "next_cursor": backlog_next},
+        "posters": {
+            imdb_id: poster_url
+            for imdb_id, (cached, poster_url) in found.items()
+            if cached
+        },
+        "missing_posters": [
+            imdb_id for imdb_id, (cached, _) in found.items() if not cached
+        ],
+    }
 
 
 def update_bio(username, bio):
-    conn = get_db()
-    if conn is None:
-        return False, "Database connection error"
     try:
-        with conn:
+        with get_db(write=True) as conn:
             conn.execute("UPDATE users SET bio = ? WHERE username = ?", (bio, username))
-            return True, "Bio updated successfully"
     except sqlite3.Error as e:
         return False, str(e)
-    finally:
-        if conn:
-            conn.close()
+    invalidate_principal(username)
+    return True, "Bio updated successfully"
+
+
+# Also the update_review result of apply_bulk
+UPDATE_REVIEW_MESSAGE = "Review updated"
+UPDATE_REVIEW_SQL = """
+    INSERT INTO watched (username, movie_id, review, rating)
+    VALUES (:username, :movie_id, :review, :rating)
+    ON CONFLICT(username, movie_id)
+    DO UPDATE SET review = excluded.review, rating = excluded.rating
+"""
+
+
+def _update_movie_review(conn, username, movie_id, review, rating):
+    conn.execute(
+        UPDATE_REVIEW_SQL,
+        {
+            "username": username,
+            "movie_id": movie_id,
+            "review": review,
+            "rating": rating,
+        },
+    )
 
 
 def update_movie_review(username, movie_id, review, rating):
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            conn.execute(
-                """
-                INSERT INTO watched (username, movie_id, review, rating)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(username, movie_id)
-                DO UPDATE SET review = ?, rating = ?
-            """,
-                (username, movie_id, review, rating, review, rating),
-            )
-            conn.commit()
-        return True
+        _write(_update_movie_review, username, movie_id, review, rating)
+    except WriteQueueFull:
+        raise
     except sqlite3.Error as e:
         print(f"Database error during review update: {e}")
-        return False
+        return False, _write_error(e)
+    _expire_catalog_version()
+    _feeds_grew(username)
+    recommender.record_rating(username, movie_id, rating)
+    return True, UPDATE_REVIEW_MESSAGE
+
+
+# What each /bulk operation runs. Consecutive operations of the same kind
+# are applied together, one executemany per statement.
+BULK_OPERATIONS = {
+    "add_to_backlog": (
+        "INSERT INTO backlog (username, movie_id) VALUES (:username, :movie_id) "
+        "ON CONFLICT(username, movie_id) DO NOTHING",
+    ),
+    "remove_from_backlog": (
+        "DELETE FROM backlog WHERE username = :username AND movie_id = :movie_id",
+    ),
+    "mark_watched": (
+        "DELETE FROM backlog WHERE username = :username AND movie_id = :movie_id",
+        MARK_WATCHED_SQL,
+    ),
+    "update_review": (UPDATE_REVIEW_SQL,),
+}
+
+
+def _parse_bulk_operation(item):
+    """Return (op, params) for one /bulk operation, or raise ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError("Each operation must be an object")
+    op = item.get("op")
+    if op not in BULK_OPERATIONS:
+        raise ValueError(f"Unknown op: {op}")
+    movie_id = item.get("movie_id")
+    if not isinstance(movie_id, int) or isinstance(movie_id, bool):
+        raise ValueError("movie_id must be an integer")
+    review, rating = item.get("review"), item.get("rating")
+    if review is not None and not isinstance(review, str):
+        raise ValueError("review must be a string")
+    if rating is not None and (
+        not isinstance(rating, int) or isinstance(rating, bool) or not 0 <= rating <= 10
+    ):
+        raise ValueError("rating must be an integer from 0 to 10")
+    return op, {"movie_id": movie_id, "review": review, "rating": rating}
+
+
+def _known_movie_ids(movie_ids):
+    placeholders = ", ".join("?" for _ in movie_ids)
+    with get_db() as conn:
+        rows = conn.execute(
+            f"SELECT id FROM movies WHERE id IN ({placeholders})", list(movie_ids)
+        ).fetchall()
+    return {row["id"] for row in rows}
+
+
+def _apply_bulk(conn, username, operations):
+    # The backlog as it stands, to say which adds and removes change anything
+    movie_ids = list({params["movie_id"] for _, params in operations})
+    placeholders = ", ".join("?" for _ in movie_ids)
+    in_backlog = {
+        row["movie_id"]
+        for row in conn.execute(
+            f"SELECT movie_id FROM backlog WHERE username = ? AND movie_id IN ({placeholders})",
+            [username, *movie_ids],
+        )
+    }
+    messages = []
+    for op, params in operations:
+        movie_id = params["movie_id"]
+        if op == "add_to_backlog":
+            messages.append(
+                "Movie already in backlog"
+                if movie_id in in_backlog
+                else "Movie added to backlog successfully"
+            )
+            in_backlog.add(movie_id)
+        elif op == "remove_from_backlog":
+            messages.append(
+                "Removed from backlog" if movie_id in in_backlog else "Not in backlog"
+            )
+            in_backlog.discard(movie_id)
+        elif op == "mark_watched":
+            in_backlog.discard(movie_id)
+            messages.append(MARK_WATCHED_MESSAGE)
+        else:
+            messages.append(UPDATE_REVIEW_MESSAGE)
+
+    for op, run in itertools.groupby(operations, key=lambda operation: operation[0]):
+        rows = [dict(params, username=username) for _, params in run]
+        for sql in BULK_OPERATIONS[op]:
+            conn.executemany(sql, rows)
+    return messages
+
+
+def apply_bulk(username, operations):
+    """Apply a list of backlog and watched operations for one user, all or nothing.
+
+    Each operation is {"op", "movie_id"} plus "review" and "rating" for
+    mark_watched and update_review. Returns (applied, results, error), with
+    one result per operation in order. If any operation is malformed or
+    names an unknown film nothing is written, and its result says why. A
+    database error also leaves nothing written, and results is None.
+    """
+    parsed, results = [], []
+    for item in operations:
+        try:
+            parsed.append(_parse_bulk_operation(item))
+            results.append({"ok": True})
+        except ValueError as e:
+            parsed.append(None)
+            results.append({"ok": False, "error": str(e)})
+    try:
+        known = _known_movie_ids({item[1]["movie_id"] for item in parsed if item})
+    except sqlite3.Error as e:
+        return False, None, str(e)
+    for item, result in zip(parsed, results):
+        if item and item[1]["movie_id"] not in known:
+            result.update(ok=False, error="Unknown movie_id")
+    if not all(result["ok"] for result in results):
+        return False, results, "Nothing was applied; some operations are invalid"
+
+    try:
+        messages = _write(_apply_bulk, username, parsed)
+    except WriteQueueFull:
+        raise
+    except sqlite3.Error as e:
+        return False, None, str(e)
+    for result, message in zip(results, messages):
+        result["message"] = message
+
+    rated = [
+        (params["movie_id"], params["rating"])
+        for op, params in parsed
+        if op in ("mark_watched", "update_review")
+    ]
+    if rated:
+        _expire_catalog_version()
+        _feeds_grew(username)
+        for movie_id, rating in rated:
+            recommender.record_rating(username, movie_id, rating)
+    return True, results, None
+
+
+def get_title_index():
+    """The catalog's TitleIndex, built on first use and after catalog changes."""
+    version = get_catalog_version()
+    with _title_index_lock:
+        if _title_index["version"] != version:
+            with get_db() as conn:
+                rows = conn.execute(
+                    "SELECT id, imdb_id, title, release_date FROM movies "
+                    "ORDER BY vote_count DESC, id"
+                ).fetchall()
+            _title_index["index"] = TitleIndex(tuple(row) for row in rows)
+            _title_index["version"] = version
+        return _title_index["index"]
+
+
+# Imported rows never overwrite a review or rating with nothing, and keep
+# the later of the two watch dates
+IMPORT_STATEMENTS = {
+    "watched": (
+        "DELETE FROM backlog WHERE username = :username AND movie_id = :movie_id",
+        """
+        INSERT INTO watched (username, movie_id, review, rating, timestamp)
+        VALUES (:username, :movie_id, :review, :rating,
+                COALESCE(:timestamp, CURRENT_TIMESTAMP))
+        ON CONFLICT(username, movie_id) DO UPDATE SET
+            review = COALESCE(excluded.review, review),
+            rating = COALESCE(excluded.rating, rating),
+            timestamp = MAX(timestamp, excluded.timestamp)
+        """,
+    ),
+    "backlog": (
+        """
+        INSERT INTO backlog (username, movie_id, timestamp)
+        VALUES (:username, :movie_id, COALESCE(:timestamp, CURRENT_TIMESTAMP))
+        ON CONFLICT(username, movie_id) DO NOTHING
+        """,
+    ),
+}
+
+
+def _import_chunk(conn, username, target, entries):
+    rows = [dict(entry, username=username) for entry in entries]
+    for sql in IMPORT_STATEMENTS[target]:
+        conn.executemany(sql, rows)
+
+
+def import_history(username, lines, target="watched", chunk_size=IMPORT_CHUNK_SIZE):
+    """Import a Letterboxd-style CSV into the user's watched list or backlog.
+
+    ``lines`` is read and parsed as the import goes, never held whole. Rows
+    are matched to films through the title index, and every ``chunk_size``
+    rows the matches are written in one transaction on the writer thread,
+    so other writes get in between chunks. Raises ValueError for an unknown
+    target or a file without a title or IMDb id column.
+
+    Returns a generator that yields {"rows", "imported", "unmatched"} after
+    each chunk, and last of all the same counts with "unmatched_rows" (the
+    line, title, year and reason of each row that was not imported) and
+    "done": True.
+    """
+    if target not in IMPORT_STATEMENTS:
+        raise ValueError(f"Unknown target: {target}")
+    rows = read_csv(lines)
+    index = get_title_index()
+
+    def run():
+        progress = {"rows": 0, "imported": 0, "unmatched": 0}
+        unmatched_rows = []
+        rated = False
+
+        def write(chunk):
+            _write(_import_chunk, username, target, chunk)
+            progress["imported"] += len(chunk)
+
+        chunk = []
+        for line, entry, error in rows:
+            progress["rows"] += 1
+            movie_id = None
+            if error is None:
+                movie_id = index.match(entry["imdb_id"], entry["title"], entry["year"])
+                error = None if movie_id else "No matching film"
+            if error:
+                progress["unmatched"] += 1
+                if len(unmatched_rows) < IMPORT_UNMATCHED_LIMIT:
+                    unmatched_rows.append(
+                        {
+                            "line": line,
+                            "title": entry.get("title"),
+                            "year": entry.get("year"),
+                            "reason": error,
+                        }
+                    )
+                continue
+            chunk.append(dict(entry, movie_id=movie_id))
+            rated = rated or entry["rating"] is not None
+            if len(chunk) >= chunk_size:
+                write(chunk)
+                chunk = []
+                yield dict(progress)
+        if chunk:
+            write(chunk)
+
+        if target == "watched" and progress["imported"]:
+            _expire_catalog_version()
+            _feeds_grew(username)
+            if rated and recommender.built_at is not None:
+                # One retrain beats applying thousands of ratings one by one
+                _rebuild_recommender_in_background()
+        yield dict(progress, unmatched_rows=unmatched_rows, done=True)
+
+    return run()
+
+
+def rebuild_recommender():
+    """Retrain the recommender from every rating in watched."""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT username, movie_id, rating FROM watched WHERE rating IS NOT NULL"
+        ).fetchall()
+    return recommender.build([tuple(row) for row in rows])
+
+
+def _refresh_recommender():
+    if recommender.built_at is None:
+        with _recommender_rebuilding:
+            if recommender.built_at is None:
+                rebuild_recommender()
+        return
+    if time.time() - recommender.built_at < RECOMMENDER_REBUILD_INTERVAL:
+        return
+    _rebuild_recommender_in_background()
+
+
+def _rebuild_recommender_in_background():
+    if not _recommender_rebuilding.acquire(blocking=False):
+        return  # another request is already rebuilding it
+
+    def run():
+        try:
+            rebuild_recommender()
+        except Exception as e:
+            print(f"Recommender rebuild failed: {e}")
+        finally:
+            _recommender_rebuilding.release()
+
+    # Keep serving the current model while the new one is trained
+    threading.Thread(target=run, name="recommender-rebuild", daemon=True).start()
+
+
+def get_recommendations(username, limit=20):
+    """Return unwatched, non-backlog movies predicted to suit the user, best first."""
+    _refresh_recommender()
+    with get_db() as conn:
+        ratings = {
+            row["movie_id"]: row["rating"]
+            for row in conn.execute(
+                "SELECT movie_id, rating FROM watched WHERE username = ?", (username,)
+            ).fetchall()
+        }
+        backlog = {
+            row["movie_id"]
+            for row in conn.execute(
+                "SELECT movie_id FROM backlog WHERE username = ?", (username,)
+            ).fetchall()
+        }
+        scored = recommender.recommend(ratings, exclude=backlog, n=limit)
+        if not scored:
+            return []
+        placeholders = ", ".join("?" for _ in scored)
+        movies = {
+            row["id"]: dict(row)
+            for row in conn.execute(
+                f"SELECT * FROM movies WHERE id IN ({placeholders})",
+                [movie_id for movie_id, _ in scored],
+            ).fetchall()
+        }
+    recommendations = []
+    for movie_id, score in scored:
+        if movie_id in movies:
+            movies[movie_id]["predicted_rating"] = score
+            recommendations.append(movies[movie_id])
+    return recommendations
@@ -0,0 +1,143 @@
+import csv
+import math
+import re
+import unicodedata
+from datetime import datetime
+
+# Header names each field may appear under, lowercased. Letterboxd exports
+# use Name, Year, Rating, Review and Watched Date or Date; IMDb exports use
+# Const, Title, Year, Your Rating and Date Rated.
+COLUMNS = {
+    "imdb_id": ("imdb id", "imdbid", "imdb_id", "const"),
+    "title": ("name", "title"),
+    "year": ("year",),
+    "rating": ("rating", "your rating"),
+    "review": ("review",),
+    "watched_on": ("watched date", "date rated", "date"),
+}
+# Letterboxd rates in half stars out of five; ratings here are 0-10
+STAR_RATING_COLUMN = "rating"
+
+IMDB_ID = re.compile(r"^tt\d+$")
+
+
+def normalize_title(title):
+    """Casefolded title without accents or punctuation, for matching."""
+    decomposed = unicodedata.normalize("NFKD", title)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", stripped.casefold()))
+
+
+class TitleIndex:
+    """In-memory lookup of movies.id by IMDb id or by title and year.
+
+    Built from (id, imdb_id, title, release_date) rows. When several films
+    share a title and year the first row wins, so rows should come most
+    popular first. A year that is off by one still matches, as release
+    years often differ between countries.
+    """
+
+    def __init__(self, rows):
+        self.by_imdb_id = {}
+        self.by_title = {}  # normalized title -> {year: movie id}
+        for movie_id, imdb_id, title, release_date in rows:
+            if imdb_id:
+                self.by_imdb_id.setdefault(imdb_id, movie_id)
+            if title:
+                year = release_date[:4] if release_date else ""
+                years = self.by_title.setdefault(normalize_title(title), {})
+                years.setdefault(int(year) if year.isdigit() else None, movie_id)
+
+    def __len__(self):
+        return len(self.by_imdb_id)
+
+    def match(self, imdb_id=None, title=None, year=None):
+        """Return the movies.id for a film, or None if there is no clear match."""
+        if imdb_id in self.by_imdb_id:
+            return self.by_imdb_id[imdb_id]
+        years = self.by_title.get(normalize_title(title)) if title else None
+        if not years:
+            return None
+        if year is None:
+            # Without a year the title alone has to be unambiguous
+            return next(iter(years.values())) if len(years) == 1 else None
+        for candidate in (year, year - 1, year + 1):
+            if candidate in years:
+                return years[candidate]
+        return None
+
+
+def parse_entry(values, star_ratings):
+    """Turn one row's raw values into an entry, or raise ValueError."""
+    imdb_id = values.get("imdb_id") or None
+    if imdb_id and not IMDB_ID.match(imdb_id):
+        imdb_id = None
+    title = values.get("title") or None
+    if not imdb_id and not title:
+        raise ValueError("No title or IMDb id")
+
+    year = values.get("year")
+    rating = values.get("rating") or None
+    if rating is not None:
+        try:
+            rating = float(rating)
+        except ValueError:
+            raise ValueError(f"Bad rating: {rating}")
+        if not math.isfinite(rating):
+            raise ValueError(f"Bad rating: {values['rating']}")
+        rating = round(rating * 2) if star_ratings else round(rating)
+        if not 0 <= rating <= 10:
+            raise ValueError("Rating out of range")
+    watched_on = values.get("watched_on")
+    if watched_on:
+        try:
+            watched_on = datetime.strptime(watched_on, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Bad date: {watched_on}")
+    return {
+        "imdb_id": imdb_id,
+        "title": title,
+        "year": int(year) if year and year.isdigit() else None,
+        "rating": rating,
+        "review": values.get("review") or None,
+        # Stored like CURRENT_TIMESTAMP so it sorts with the app's own rows
+        "timestamp": (watched_on.strftime("%Y-%m-%d %H:%M:%S") if watched_on else None),
+    }
+
+
+def read_csv(lines):
+    """Parse a watch-history CSV as it is read.
+
+    ``lines`` is any iterable of text lines, such as an open file. The
+    header is read straight away and a ValueError raised if it has neither
+    a title nor an IMDb id column. Returns a generator of (line_number,
+    entry, error) for the data rows. error is None for a row that parsed;
+    otherwise it says why not and entry holds the row's raw values.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip().lower() for name in next(reader, [])]
+    positions, rating_column = {}, None
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in header:
+                positions[field] = header.index(alias)
+                rating_column = alias if field == "rating" else rating_column
+                break
+    if "imdb_id" not in positions and "title" not in positions:
+        raise ValueError("The CSV needs a Name or Title column, or an IMDb id column")
+    star_ratings = rating_column == STAR_RATING_COLUMN
+
+    def generate():
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            values = {
+                field: row[index].strip() if index < len(row) else ""
+                for field, index in positions.items()
+            }
+            try:
+                yield reader.line_num, parse_entry(values, star_ratings), None
+            except ValueError as e:
+                yield reader.line_num, values, str(e)
+
+    return generate()
@@ -0,0 +1,444 @@
+import bisect
+import contextvars
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+SQL_BUCKETS += (0.1, 0.25, 0.5, 1.0, 2.5)
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+HTTP_BUCKETS += (5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Statements slower than this are printed and kept for /stats
+SLOW_QUERY_SECONDS = float(os.getenv("REELFRIENDS_SLOW_QUERY_MS", "100")) / 1000
+SLOW_QUERY_LOG_SIZE = 100  # slow queries kept for /stats
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Upper bounds are inclusive, as "le" says
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label values.
+
+    Every metric has a fixed label set given when it is declared, so the
+    text output is stable. Updates happen under ``lock``: an observation is a
+    few additions, far cheaper than the statement or request it measures.
+    Hot paths look their series up once with ``series`` and keep it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = {}  # name -> (kind, help, labels, buckets, {values: metric})
+
+    def counter(self, name, help, labels=()):
+        self._metrics[name] = ("counter", help, tuple(labels), None, {})
+
+    def histogram(self, name, help, buckets, labels=()):
+        self._metrics[name] = ("histogram", help, tuple(labels), buckets, {})
+
+    def series(self, name, *label_values):
+        """The Counter or Histogram for one set of label values."""
+        kind, _, _, buckets, series = self._metrics[name]
+        with self.lock:
+            metric = series.get(label_values)
+            if metric is None:
+                metric = Counter() if kind == "counter" else Histogram(buckets)
+                series[label_values] = metric
+            return metric
+
+    def inc(self, name, *label_values, amount=1):
+        counter = self.series(name, *label_values)
+        with self.lock:
+            counter.inc(amount)
+
+    def observe(self, name, value, *label_values):
+        histogram = self.series(name, *label_values)
+        with self.lock:
+            histogram.observe(value)
+
+    def total(self, name):
+        """Sum of a counter, or the observation count of a histogram, over all labels."""
+        kind, _, _, _, series = self._metrics[name]
+        with self.lock:
+            if kind == "counter":
+                return sum(counter.value for counter in series.values())
+            return sum(histogram.count for histogram in series.values())
+
+    def render(self):
+        """Everything in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name, (kind, help, labels, _, series) in self._metrics.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for label_values, value in sorted(series.items()):
+                    label_text = format_labels(labels, label_values)
+                    if kind == "counter":
+                        lines.append(f"{name}{braces(label_text)} {value.value}")
+                        continue
+                    cumulative = 0
+                    bounds = [*map(format_number, value.buckets), "+Inf"]
+                    for bound, count in zip(bounds, value.counts):
+                        cumulative += count
+                        le = join_labels(label_text, f'le="{bound}"')
+                        lines.append(f"{name}_bucket{{{le}}} {cumulative}")
+                    lines.append(
+                        f"{name}_sum{braces(label_text)} {format_number(value.sum)}"
+                    )
+                    lines.append(f"{name}_count{braces(label_text)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels, values):
+    return ",".join(
+        f'{label}="{escape(value)}"' for label, value in zip(labels, values)
+    )
+
+
+def join_labels(*parts):
+    return ",".join(part for part in parts if part)
+
+
+def braces(label_text):
+    return f"{{{label_text}}}" if label_text else ""
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def gauge_lines(name, help, values, label="name"):
+    """Render a set of point-in-time values (pool and cache stats) as a gauge."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f'{name}{{{label}="{escape(key)}"}} {format_number(value)}')
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.histogram(
+    "reelfriends_sql_statement_seconds",
+    "Time to execute a statement and fetch its rows.",
+    SQL_BUCKETS,
+    labels=("helper", "statement"),
+)
+registry.counter(
+    "reelfriends_sql_rows_total",
+    "Rows returned or changed by a statement.",
+    labels=("helper", "statement"),
+)
+registry.counter(
+    "reelfriends_sql_errors_total",
+    "Statements that raised a sqlite3 error.",
+    labels=("helper", "statement"),
+)
+registry.counter(
+    "reelfriends_sql_slow_total",
+    f"Statements slower than {SLOW_QUERY_SECONDS}s.",
+    labels=("helper", "statement"),
+)
+registry.histogram(
+    "reelfriends_http_request_seconds",
+    "Time to handle a request, by route.",
+    HTTP_BUCKETS,
+    labels=("method", "route", "status"),
+)
+registry.histogram(
+    "reelfriends_http_request_queries",
+    "SQL statements run while handling a request, by route.",
+    QUERY_COUNT_BUCKETS,
+    labels=("method", "route"),
+)
+
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+# The statements of the request being handled on this thread, if any
+_request = contextvars.ContextVar("request_queries", default=None)
+
+WHITESPACE = re.compile(r"\s+")
+PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+# The column list of a SELECT, which fields= lets clients choose and order
+PROJECTION = re.compile(r"^(SELECT (?:DISTINCT )?).+? FROM ", re.I)
+
+# Statement series kept per metric. Anything past this is counted under
+# statement="other" for its helper, so a bug that builds SQL per call cannot
+# grow /metrics (or memory) without bound.
+MAX_STATEMENT_SERIES = 1000
+
+
+def normalize(sql):
+    """The SQL of a statement as it is identified and reported.
+
+    IN lists of any length and SELECT lists of any columns are the same
+    statement.
+    """
+    sql = PLACEHOLDER_LIST.sub("?, ...", WHITESPACE.sub(" ", sql).strip())
+    return PROJECTION.sub(r"\1... FROM ", sql, count=1)
+
+
+class Statement:
+    """What is reported about one SQL string run by one helper."""
+
+    __slots__ = ("id", "helper", "sql", "latency", "rows")
+
+    def __init__(self, sql, helper):
+        self.sql = normalize(sql)
+        self.helper = helper
+        self.id = hashlib.sha1(self.sql.encode()).hexdigest()[:10]
+        with _series_lock:
+            if (helper, self.id) not in _statement_info:
+                if len(_statement_info) >= MAX_STATEMENT_SERIES:
+                    self.id = "other"
+                else:
+                    _statement_info[helper, self.id] = self.sql
+        labels = (self.helper, self.id)
+        self.latency = registry.series("reelfriends_sql_statement_seconds", *labels)
+        self.rows = registry.series("reelfriends_sql_rows_total", *labels)
+
+
+# Statements by helper and SQL text. Most are constants; the few built per
+# call would grow this without bound, so it is emptied when it gets large.
+STATEMENT_CACHE_SIZE = 4096
+_statements = {}
+# {(helper, id): normalized sql} for every statement series, for /stats
+_statement_info = {}
+_series_lock = threading.Lock()
+
+
+def statement_for(sql):
+    # The helper is looked up on every call: the same SQL run from two
+    # helpers is two series
+    helper = calling_helper()
+    statement = _statements.get((helper, sql))
+    if statement is None:
+        statement = Statement(sql, helper)
+        if len(_statements) >= STATEMENT_CACHE_SIZE:
+            _statements.clear()
+        _statements[helper, sql] = statement
+    return statement
+
+
+def statements():
+    """{id: {"sql", "helpers"}} for every statement series."""
+    with _series_lock:
+        info = list(_statement_info.items())
+    result = {}
+    for (helper, id), sql in sorted(info):
+        result.setdefault(id, {"sql": sql, "helpers": []})["helpers"].append(helper)
+    return result
+
+
+def calling_helper():
+    """Name of the function in database.py (or posters.py) that ran the statement.
+
+    Transaction control issued by the pool or the group-commit writer is
+    reported as "pool" or "writer".
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module in ("pool", "writer"):
+            return module
+        if module in ("database", "posters"):
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return "other"
+
+
+def parameter_shape(parameters):
+    """The types of the bound parameters, never their values."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+def record(statement, seconds, rows, parameters):
+    with registry.lock:
+        statement.latency.observe(seconds)
+        statement.rows.inc(rows)
+    current = _request.get()
+    if current is not None:
+        current[0] += 1
+    if seconds >= SLOW_QUERY_SECONDS:
+        registry.inc("reelfriends_sql_slow_total", statement.helper, statement.id)
+        shape = parameter_shape(parameters)
+        slow_queries.append(
+            {
+                "at": time.time(),
+                "ms": round(seconds * 1000, 2),
+                "helper": statement.helper,
+                "statement": statement.id,
+                "sql": statement.sql,
+                "parameters": shape,
+                "rows": rows,
+            }
+        )
+        print(
+            f"Slow query ({seconds * 1000:.1f} ms, {statement.helper}): "
+            f"{statement.sql} parameters={shape}"
+        )
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times each statement from execute through its last fetched row.
+
+    A statement that returns rows is recorded when they are fetched
+    (fetchone, fetchall or iteration to the end); one that does not is
+    recorded as soon as it has run.
+    """
+
+    # The statement whose rows are still being fetched, and its totals so far
+    _statement = None
+    _seconds = 0.0
+    _rows = 0
+    _parameters = ()
+
+    def _flush(self):
+        statement = self._statement
+        if statement is not None:
+            self._statement = None
+            record(statement, self._seconds, self._rows, self._parameters)
+
+    def execute(self, sql, parameters=()):
+        if self._statement is not None:
+            self._flush()
+        statement = statement_for(sql)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except sqlite3.Error:
+            registry.inc("reelfriends_sql_errors_total", statement.helper, statement.id)
+            raise
+        elapsed = time.perf_counter() - started
+        if self.description is None:
+            record(statement, elapsed, max(self.rowcount, 0), parameters)
+        else:
+            self._statement = statement
+            self._seconds = elapsed
+            self._rows = 0
+            self._parameters = parameters
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._statement is not None:
+            self._flush()
+        statement = statement_for(sql)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            registry.inc("reelfriends_sql_errors_total", statement.helper, statement.id)
+            raise
+        record(statement, time.perf_counter() - started, max(self.rowcount, 0), ())
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        if self._statement is not None:
+            # Helpers only ever take the first row, so stop the clock here
+            self._seconds += time.perf_counter() - started
+            self._rows += row is not None
+            self._flush()
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if self._statement is not None:
+            self._seconds += time.perf_counter() - started
+            self._rows += len(rows)
+            self._flush()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if self._statement is not None:
+                self._seconds += time.perf_counter() - started
+                self._flush()
+            raise
+        if self._statement is not None:
+            self._seconds += time.perf_counter() - started
+            self._rows += 1
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose statements, commits and rollbacks are all recorded."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        statement = statement_for("COMMIT")
+        started = time.perf_counter()
+        super().commit()
+        record(statement, time.perf_counter() - started, 0, ())
+
+    def rollback(self):
+        statement = statement_for("ROLLBACK")
+        started = time.perf_counter()
+        super().rollback()
+        record(statement, time.perf_counter() - started, 0, ())
+
+
+def start_request():
+    """Start counting statements for the request on this thread."""
+    return _request.set([0])
+
+
+def finish_request(token, method, route, status, seconds):
+    queries = _request.get()
+    _request.reset(token)
+    registry.observe(
+        "reelfriends_http_request_seconds", seconds, method, route, str(status)
+    )
+    if queries is not None:
+        registry.observe("reelfriends_http_request_queries", queries[0], method, route)
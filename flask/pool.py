@@ -0,0 +1,179 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# Applied to every connection the pool opens. WAL lets readers keep going while
+# a writer holds the lock, and busy_timeout makes writers wait instead of
+# failing straight away with "database is locked".
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # negative means KiB, so ~64 MB of page cache
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within the checkout timeout."""
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections shared between request threads.
+
+    Connections are opened lazily, configured once with PRAGMAS and then
+    reused, so schema parsing, page-cache warm-up and prepared statements
+    (``cached_statements``) survive across requests. ``factory`` is the
+    sqlite3.Connection subclass to open, for tools that need to see every
+    statement.
+
+    A thread that checks out a connection keeps it pinned until its outermost
+    ``connection()`` block exits. Nested blocks on the same thread get the same
+    connection and join the surrounding transaction instead of committing it.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_connections=8,
+        timeout=10.0,
+        cached_statements=256,
+        pragmas=None,
+        factory=sqlite3.Connection,
+    ):
+        self.path = path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._stats = {
+            "checkouts": 0,
+            "reuses": 0,
+            "waits": 0,
+            "commits": 0,
+            "rollbacks": 0,
+        }
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.pragmas.get("busy_timeout", 5000) / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            isolation_level=None,  # transactions are managed by connection()
+            factory=self.factory,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            reused = False
+            with self._lock:
+                can_open = self._opened < self.max_connections
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._stats["waits"] += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s"
+                    )
+                reused = True
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            if reused:
+                self._stats["reuses"] += 1
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            # Never hand a connection with an open transaction to another thread.
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, write=False):
+        """Yield this thread's pooled connection inside a transaction.
+
+        The outermost block begins the transaction (``BEGIN IMMEDIATE`` when
+        ``write`` is set, so the write lock is taken up front rather than on
+        the first write) and commits it on success or rolls it back on error.
+        """
+        local = self._local
+        if getattr(local, "conn", None) is not None:
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self._acquire()
+        local.conn = conn
+        local.depth = 1
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                with self._lock:
+                    self._stats["rollbacks"] += 1
+                raise
+            if conn.in_transaction:
+                conn.commit()
+            with self._lock:
+                self._stats["commits"] += 1
+        finally:
+            local.conn = None
+            local.depth = 0
+            self._release(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["opened"] = self._opened
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["opened"] - stats["idle"]
+        stats["max_connections"] = self.max_connections
+        stats["cached_statements"] = self.cached_statements
+        stats["journal_mode"] = self.pragmas.get("journal_mode")
+        return stats
+
+    def close(self):
+        """Close every idle connection. Checked-out connections are left alone."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
@@ -0,0 +1,223 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import LRUCache
+
+
+TMDB_API_URL = "https://api.themoviedb.org/3"  # TMDB_API_URL in the env overrides it
+TMDB_IMAGE_URL = "http://image.tmdb.org/t/p/w500"
+TMDB_TIMEOUT = 5
+
+POSTER_TTL = 7 * 24 * 3600  # posters rarely change once a film is listed
+NEGATIVE_TTL = 24 * 3600  # films without a poster get re-checked daily
+STALE_WINDOW = 30 * 24 * 3600  # how long past its TTL an entry may still be served
+
+# Concurrent TMDB lookups for batch requests, and how long a batch waits on
+# them before answering with what it has
+FETCH_WORKERS = 8
+BATCH_TIMEOUT = 8
+
+# One keep-alive session for every outbound TMDB call, with enough pooled
+# connections for every fetch worker to keep its own
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_maxsize=FETCH_WORKERS))
+session.mount("http://", HTTPAdapter(pool_maxsize=FETCH_WORKERS))
+
+
+def fetch_from_tmdb(imdb_id):
+    """Look a poster up on TMDB. Returns the image URL, or None if there is none.
+
+    Network and HTTP errors are raised so the cache does not remember them.
+    """
+    response = session.get(
+        f"{os.getenv('TMDB_API_URL', TMDB_API_URL)}/find/{imdb_id}",
+        params={
+            "api_key": os.getenv("REELFRIENDS_API_KEY"),
+            "external_source": "imdb_id",
+        },
+        timeout=TMDB_TIMEOUT,
+    )
+    response.raise_for_status()
+    data = response.json()
+    results = data.get("movie_results") or []
+    poster_path = results[0].get("poster_path") if results else None
+    return f"{TMDB_IMAGE_URL}{poster_path}" if poster_path else None
+
+
+class PosterCache:
+    """Two-tier poster URL cache in front of TMDB.
+
+    Lookups go to an in-memory LRU first, then to the ``posters`` table, and
+    only then to TMDB. Films without a poster are cached too, for the shorter
+    NEGATIVE_TTL. An entry past its TTL but within STALE_WINDOW is returned
+    as-is while a background refresh fetches the new value.
+    """
+
+    def __init__(self, get_db, fetch=fetch_from_tmdb, maxsize=10000, refresh_workers=2):
+        self.get_db = get_db
+        self.fetch = fetch
+        self.memory = LRUCache(maxsize=maxsize)
+        self._refresher = ThreadPoolExecutor(
+            max_workers=refresh_workers, thread_name_prefix="poster-refresh"
+        )
+        self._fetcher = ThreadPoolExecutor(
+            max_workers=FETCH_WORKERS, thread_name_prefix="poster-fetch"
+        )
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            "db_hits": 0,
+            "fetches": 0,
+            "fetch_errors": 0,
+            "stale_served": 0,
+            "refreshes": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _ttl(poster_url):
+        return POSTER_TTL if poster_url else NEGATIVE_TTL
+
+    def _load(self, imdb_ids):
+        placeholders = ", ".join("?" for _ in imdb_ids)
+        with self.get_db() as conn:
+            rows = conn.execute(
+                f"SELECT imdb_id, poster_url, fetched_at FROM posters WHERE imdb_id IN ({placeholders})",
+                list(imdb_ids),
+            ).fetchall()
+        return {row["imdb_id"]: (row["poster_url"], row["fetched_at"]) for row in rows}
+
+    def _store(self, imdb_id, poster_url):
+        entry = (poster_url, time.time())
+        with self.get_db(write=True) as conn:
+            conn.execute(
+                """
+                INSERT INTO posters (imdb_id, poster_url, fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT(imdb_id)
+                DO UPDATE SET poster_url = excluded.poster_url, fetched_at = excluded.fetched_at
+                """,
+                (imdb_id, *entry),
+            )
+        self.memory.put(imdb_id, entry)
+        return entry
+
+    def refresh(self, imdb_id):
+        """Fetch from TMDB and store the result. Returns the new URL."""
+        self._count("fetches")
+        try:
+            poster_url = self.fetch(imdb_id)
+        except (requests.RequestException, ValueError):
+            self._count("fetch_errors")
+            raise
+        return self._store(imdb_id, poster_url)[0]
+
+    def _refresh_in_background(self, imdb_id):
+        with self._lock:
+            if imdb_id in self._refreshing:
+                return
+            self._refreshing.add(imdb_id)
+            self._stats["refreshes"] += 1
+
+        def run():
+            try:
+                self.refresh(imdb_id)
+            except Exception as e:
+                print(f"Poster refresh failed for {imdb_id}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(imdb_id)
+
+        self._refresher.submit(run)
+
+    def lookup(self, imdb_ids):
+        """Resolve ids from the cache tiers without calling TMDB.
+
+        Returns {imdb_id: (found, poster_url)}. ``found`` is False when the
+        caller has to fetch from TMDB. A stale entry counts as found and
+        schedules a background refresh.
+        """
+        entries = {}
+        for imdb_id in imdb_ids:
+            entry = self.memory.get(imdb_id)
+            if entry is not None:
+                entries[imdb_id] = entry
+        misses = [imdb_id for imdb_id in imdb_ids if imdb_id not in entries]
+        if misses:
+            for imdb_id, entry in self._load(misses).items():
+                self._count("db_hits")
+                self.memory.put(imdb_id, entry)
+                entries[imdb_id] = entry
+        return {
+            imdb_id: self._check(imdb_id, entries.get(imdb_id)) for imdb_id in imdb_ids
+        }
+
+    def _check(self, imdb_id, entry):
+        if entry is None:
+            return False, None
+
+        poster_url, fetched_at = entry
+        age = time.time() - fetched_at
+        ttl = self._ttl(poster_url)
+        if age <= ttl:
+            return True, poster_url
+        if age <= ttl + STALE_WINDOW:
+            self._count("stale_served")
+            self._refresh_in_background(imdb_id)
+            return True, poster_url
+        return False, poster_url
+
+    def get(self, imdb_id):
+        found, poster_url = self.lookup([imdb_id])[imdb_id]
+        if found:
+            return poster_url
+        try:
+            return self.refresh(imdb_id)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error fetching poster for {imdb_id}: {e}")
+            # Anything we had, however old, beats no poster at all
+            return poster_url
+
+    def get_many(self, imdb_ids, timeout=BATCH_TIMEOUT):
+        """Resolve many ids at once. Returns (posters, failed).
+
+        Cache misses are fetched from TMDB in parallel on the fetch pool.
+        Ids whose fetch or store errors, or that are still running after
+        ``timeout`` seconds, are listed in ``failed`` (with any old URL still
+        in ``posters``). A fetch that is only slow keeps running and fills the
+        cache for the next request.
+        """
+        imdb_ids = list(dict.fromkeys(imdb_ids))
+        posters, failed = {}, []
+        pending = {}
+        for imdb_id, (found, poster_url) in self.lookup(imdb_ids).items():
+            posters[imdb_id] = poster_url
+            if not found:
+                pending[self._fetcher.submit(self.refresh, imdb_id)] = imdb_id
+
+        done, not_done = wait(pending, timeout=timeout)
+        for future in done:
+            imdb_id = pending[future]
+            try:
+                posters[imdb_id] = future.result()
+            except (requests.RequestException, ValueError, sqlite3.Error) as e:
+                # sqlite3.Error covers a full pool (PoolTimeout) when storing
+                print(f"Error fetching poster for {imdb_id}: {e}")
+                failed.append(imdb_id)
+        failed.extend(pending[future] for future in not_done)
+        return posters, failed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["refreshing"] = len(self._refreshing)
+        stats["memory"] = self.memory.stats()
+        return stats
@@ -0,0 +1,241 @@
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+
+# Ratings are centred on the middle of the 0-10 scale, so a 5 is neutral,
+# higher ratings pull neighbours up and lower ones push them down. A fixed
+# centre (rather than each user's mean) keeps incremental updates exact.
+RATING_CENTER = 5.0
+NEIGHBORS = 50  # similar movies kept per movie
+MIN_SUPPORT = 2  # users who must have rated both movies for them to be neighbours
+SHRINKAGE = 10.0  # damps similarities backed by few co-raters
+SCORE_DAMPING = 1.0  # damps predictions backed by few neighbours
+BLOCK_SIZE = 2048  # movies per similarity block during a full build
+
+
+class ItemItemRecommender:
+    """Item-item collaborative filtering over the ratings in ``watched``.
+
+    A full build turns the ratings into a sparse user x movie matrix and
+    keeps the top NEIGHBORS most similar movies (shrunk cosine on centred
+    ratings) for every movie. ``record_rating`` applies a single new or
+    changed rating in place. It updates the matrix, recomputes the
+    neighbour list of that one movie and patches the reverse entries in its
+    neighbours' lists, so ratings show up without a retrain. Patched lists
+    can lose an entry that a full build would have kept, which the next
+    build restores.
+    """
+
+    def __init__(self):
+        self.user_index = {}
+        self.movie_index = {}
+        self.movie_ids = np.zeros(0, dtype=np.int64)
+        self.ratings = sparse.lil_matrix((0, 0))
+        # 1 wherever a rating exists. A rating on the centre is stored as 0 in
+        # ``ratings``, so this is what co-rater counts are taken from.
+        self.rated = sparse.lil_matrix((0, 0))
+        self.movie_raters = []  # column -> set of user rows that rated it
+        self.norms = np.zeros(0)  # squared norm of every movie column
+        self.neighbors = {}  # column -> (neighbour columns, similarities)
+        self.built_at = None
+        self._lock = threading.RLock()
+
+    # -- building -----------------------------------------------------------
+
+    def build(self, rows):
+        """Rebuild everything from (username, movie_id, rating) rows."""
+        started = time.perf_counter()
+        user_index, movie_index = {}, {}
+        user_rows, movie_cols, values = [], [], []
+        for username, movie_id, rating in rows:
+            if rating is None:
+                continue
+            user_rows.append(user_index.setdefault(username, len(user_index)))
+            movie_cols.append(movie_index.setdefault(movie_id, len(movie_index)))
+            values.append(float(rating) - RATING_CENTER)
+
+        shape = (len(user_index), len(movie_index))
+        matrix = sparse.csr_matrix(
+            (values, (user_rows, movie_cols)), shape=shape, dtype=np.float64
+        )
+        # A rating exactly at the centre still counts as having rated the movie
+        rated = sparse.csr_matrix(
+            (np.ones(len(values)), (user_rows, movie_cols)), shape=shape
+        )
+        norms = np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel()
+        raters = [set() for _ in range(shape[1])]
+        for user_row, movie_col in zip(user_rows, movie_cols):
+            raters[movie_col].add(user_row)
+
+        neighbors = {}
+        matrix_csc = matrix.tocsc()
+        rated_csc = rated.tocsc()
+        for start in range(0, shape[1], BLOCK_SIZE):
+            block = slice(start, min(start + BLOCK_SIZE, shape[1]))
+            dots = (matrix.T @ matrix_csc[:, block]).tocsc()
+            support = (rated.T @ rated_csc[:, block]).tocsc()
+            dots.sort_indices()
+            support.sort_indices()
+            for offset in range(dots.shape[1]):
+                indices = dots.indices[dots.indptr[offset] : dots.indptr[offset + 1]]
+                column_dots = dots.data[dots.indptr[offset] : dots.indptr[offset + 1]]
+                # Every non-zero dot product has co-raters, so the dot
+                # indices are a subset of the support indices
+                support_indices = support.indices[
+                    support.indptr[offset] : support.indptr[offset + 1]
+                ]
+                support_values = support.data[
+                    support.indptr[offset] : support.indptr[offset + 1]
+                ]
+                counts = support_values[np.searchsorted(support_indices, indices)]
+                neighbors[start + offset] = self._top_k(
+                    start + offset, indices, column_dots, counts, norms
+                )
+
+        with self._lock:
+            self.user_index = user_index
+            self.movie_index = movie_index
+            self.movie_ids = np.array(list(movie_index), dtype=np.int64)
+            self.ratings = matrix.tolil()
+            self.rated = rated.tolil()
+            self.movie_raters = raters
+            self.norms = norms
+            self.neighbors = neighbors
+            self.built_at = time.time()
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _top_k(col, indices, dots, support, norms):
+        """Pick the NEIGHBORS best (index, similarity) pairs for one movie."""
+        keep = (indices != col) & (support >= MIN_SUPPORT) & (dots > 0)
+        indices, dots, support = indices[keep], dots[keep], support[keep]
+        if len(indices) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        denominator = np.sqrt(norms[col] * norms[indices])
+        similarity = dots / denominator * (support / (support + SHRINKAGE))
+        if len(indices) > NEIGHBORS:
+            best = np.argpartition(-similarity, NEIGHBORS)[:NEIGHBORS]
+            indices, similarity = indices[best], similarity[best]
+        order = np.argsort(-similarity, kind="stable")
+        return indices[order].astype(np.int64), similarity[order]
+
+    # -- incremental updates ------------------------------------------------
+
+    def _grow(self, username, movie_id):
+        user_row = self.user_index.get(username)
+        movie_col = self.movie_index.get(movie_id)
+        n_users, n_movies = self.ratings.shape
+        if user_row is None:
+            user_row = self.user_index[username] = len(self.user_index)
+        if movie_col is None:
+            movie_col = self.movie_index[movie_id] = len(self.movie_index)
+            self.movie_ids = np.append(self.movie_ids, movie_id)
+            self.movie_raters.append(set())
+            self.norms = np.append(self.norms, 0.0)
+        if (len(self.user_index), len(self.movie_index)) != (n_users, n_movies):
+            self.ratings.resize((len(self.user_index), len(self.movie_index)))
+            self.rated.resize((len(self.user_index), len(self.movie_index)))
+        return user_row, movie_col
+
+    def record_rating(self, username, movie_id, rating):
+        """Apply one new or changed rating (None removes it)."""
+        with self._lock:
+            if self.built_at is None:
+                return
+            user_row, movie_col = self._grow(username, movie_id)
+            old = self.ratings[user_row, movie_col]
+            new = 0.0 if rating is None else float(rating) - RATING_CENTER
+            self.ratings[user_row, movie_col] = new
+            self.rated[user_row, movie_col] = 0.0 if rating is None else 1.0
+            self.norms[movie_col] += new * new - old * old
+            if rating is None:
+                self.movie_raters[movie_col].discard(user_row)
+            else:
+                self.movie_raters[movie_col].add(user_row)
+            self._refresh_movie(movie_col)
+
+    def _refresh_movie(self, col):
+        raters = sorted(self.movie_raters[col])
+        if not raters:
+            self.neighbors[col] = (np.zeros(0, dtype=np.int64), np.zeros(0))
+            return
+        sub = self.ratings[raters].tocsr()
+        column = sub[:, col].toarray().ravel()
+        dots = sub.T @ column
+        support = np.asarray(self.rated[raters].tocsr().sum(axis=0)).ravel()
+        candidates = np.flatnonzero(dots)
+        indices, similarity = self._top_k(
+            col, candidates, dots[candidates], support[candidates], self.norms
+        )
+        old_indices = self.neighbors.get(col, (np.zeros(0, dtype=np.int64), None))[0]
+        self.neighbors[col] = (indices, similarity)
+
+        # Similarity is symmetric, so patch this movie into (or out of) the
+        # lists of every movie it is now, or used to be, a neighbour of
+        current = dict(zip(indices.tolist(), similarity.tolist()))
+        for other in set(indices.tolist()) | set(old_indices.tolist()):
+            other_indices, other_sims = self.neighbors.get(
+                other, (np.zeros(0, dtype=np.int64), np.zeros(0))
+            )
+            keep = other_indices != col
+            other_indices, other_sims = other_indices[keep], other_sims[keep]
+            if other in current:
+                other_indices = np.append(other_indices, col)
+                other_sims = np.append(other_sims, current[other])
+            order = np.argsort(-other_sims, kind="stable")[:NEIGHBORS]
+            self.neighbors[other] = (other_indices[order], other_sims[order])
+
+    # -- queries ------------------------------------------------------------
+
+    def recommend(self, user_ratings, exclude=(), n=20):
+        """Return [(movie_id, score)] for a user's {movie_id: rating} history.
+
+        ``score`` is the predicted rating on the 0-10 scale. Movies in
+        ``exclude`` (already watched or in the backlog) are never returned.
+        """
+        with self._lock:
+            neighbor_cols, weights, magnitudes = [], [], []
+            for movie_id, rating in user_ratings.items():
+                col = self.movie_index.get(movie_id)
+                if col is None or rating is None:
+                    continue
+                indices, similarity = self.neighbors.get(col, (None, None))
+                if indices is None or len(indices) == 0:
+                    continue
+                neighbor_cols.append(indices)
+                weights.append(similarity * (float(rating) - RATING_CENTER))
+                magnitudes.append(similarity)
+            if not neighbor_cols:
+                return []
+            movie_ids = self.movie_ids
+
+        cols = np.concatenate(neighbor_cols)
+        unique_cols, inverse = np.unique(cols, return_inverse=True)
+        numerator = np.bincount(inverse, weights=np.concatenate(weights))
+        denominator = np.bincount(inverse, weights=np.concatenate(magnitudes))
+        scores = RATING_CENTER + numerator / (denominator + SCORE_DAMPING)
+
+        candidate_ids = movie_ids[unique_cols]
+        excluded = set(exclude) | set(user_ratings)
+        mask = np.array(
+            [movie_id not in excluded for movie_id in candidate_ids.tolist()],
+            dtype=bool,
+        )
+        candidate_ids, scores = candidate_ids[mask], scores[mask]
+        if len(scores) > n:
+            best = np.argpartition(-scores, n)[:n]
+            candidate_ids, scores = candidate_ids[best], scores[best]
+        order = np.lexsort((candidate_ids, -scores))
+        return [(int(candidate_ids[i]), round(float(scores[i]), 3)) for i in order]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self.user_index),
+                "movies": len(self.movie_index),
+                "ratings": int(self.ratings.nnz),
+                "built_at": self.built_at,
+            }
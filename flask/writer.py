@@ -0,0 +1,135 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+class WriteQueueFull(sqlite3.OperationalError):
+    """Raised when the write queue stays full for longer than the submit timeout."""
+
+
+class GroupCommitWriter:
+    """Runs write operations on one thread, committing them in groups.
+
+    SQLite lets one connection write at a time, so request threads that each
+    take the write lock for their own small transaction mostly wait on one
+    another, and give up with "database is locked" once busy_timeout runs
+    out. Instead, operations are queued and a single writer thread runs
+    every operation waiting (up to ``max_batch``) in one transaction. Each
+    gets its own savepoint, so one that fails is rolled back alone while the
+    rest commit.
+
+    ``submit`` returns a Future that resolves after the group has committed,
+    to the operation's return value or the exception it raised. The queue
+    holds at most ``max_queue`` operations; ``submit`` waits up to
+    ``timeout`` for room and then raises WriteQueueFull.
+    """
+
+    def __init__(self, get_db, max_batch=128, max_queue=1024, timeout=5.0):
+        self.get_db = get_db
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "operations": 0,
+            "failed": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "largest_batch": 0,
+            "rejected": 0,
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="group-commit-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, operation, *args):
+        """Queue ``operation(conn, *args)`` and return a Future for its result."""
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+        future = Future()
+        try:
+            self._queue.put((future, operation, args), timeout=self.timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise WriteQueueFull(
+                f"Write queue still full after {self.timeout}s"
+            ) from None
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                return
+            # Everything that queued up while the last group was committing
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # stop after this group
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        try:
+            with self.get_db(write=True) as conn:
+                for future, operation, args in batch:
+                    conn.execute("SAVEPOINT operation")
+                    try:
+                        result = operation(conn, *args)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO operation")
+                        conn.execute("RELEASE operation")
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute("RELEASE operation")
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # BEGIN or COMMIT failed, so nothing in the group was written
+            with self._lock:
+                self._stats["failed_batches"] += 1
+                self._stats["failed"] += len(batch)
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["operations"] += len(batch)
+            self._stats["failed"] += sum(1 for *_, error in outcomes if error)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["mean_batch"] = (
+            round(stats["operations"] / stats["batches"], 2) if stats["batches"] else 0
+        )
+        return stats
+
+    def close(self, timeout=None):
+        """Finish the queued operations and stop the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
@@ -0,0 +1,40 @@
+import axios from 'axios';
+import { config } from '@/config';
+
+// /get_posters answers at most this many ids per request (POSTER_BATCH_LIMIT
+// in flask/app.py)
+const POSTER_BATCH_LIMIT = 100;
+
+// Fetches the posters for a list of movies, POSTER_BATCH_LIMIT ids to a
+// request with the requests made in parallel, and sets movie.poster on each.
+// Resolves with the same list once they are set.
+export function fetchPosters(movies) {
+    const imdbIds = [...new Set(movies.map((movie) => movie.imdb_id).filter(Boolean))];
+    if (imdbIds.length === 0) {
+        return Promise.resolve(movies);
+    }
+    const batches = [];
+    for (let start = 0; start < imdbIds.length; start += POSTER_BATCH_LIMIT) {
+        batches.push(imdbIds.slice(start, start + POSTER_BATCH_LIMIT));
+    }
+    const requests = batches.map((batch) =>
+        axios.get(`${config.backendUrl}/get_posters`, { params: { imdb_ids: batch.join(',') } })
+    );
+    return Promise.all(requests).then((responses) => {
+        const posters = Object.assign({}, ...responses.map((response) => response.data.posters));
+        movies.forEach((movie) => {
+            movie.poster = posters[movie.imdb_id];
+        });
+        return movies;
+    });
+}
+
+// Sets movie.poster from the posters a response already carried (such as
+// /dashboard's) and fetches only the ones it did not have.
+export function applyPosters(movies, posters) {
+    movies.forEach((movie) => {
+        movie.poster = posters[movie.imdb_id];
+    });
+    const missing = movies.filter((movie) => movie.imdb_id && !(movie.imdb_id in posters));
+    return fetchPosters(missing).then(() => movies);
+}
@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS movie_genres (
+    genre TEXT NOT NULL,
+    movie_id INTEGER NOT NULL,
+    PRIMARY KEY (genre, movie_id),
+    FOREIGN KEY (movie_id) REFERENCES movies(id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_movie_genres_movie ON movie_genres (movie_id, genre);
+
+CREATE INDEX IF NOT EXISTS idx_movies_collection ON movies (collection);
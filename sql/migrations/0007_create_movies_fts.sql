@@ -0,0 +1,31 @@
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5 (
+    title,
+    overview,
+    collection,
+    production_companies,
+    content = 'movies',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Keep the external-content index in step with movies
+CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN
+    INSERT INTO movies_fts (rowid, title, overview, collection, production_companies)
+    VALUES (new.id, new.title, new.overview, new.collection, new.production_companies);
+END;
+
+CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN
+    INSERT INTO movies_fts (movies_fts, rowid, title, overview, collection, production_companies)
+    VALUES ('delete', old.id, old.title, old.overview, old.collection, old.production_companies);
+END;
+
+CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title, overview, collection, production_companies ON movies BEGIN
+    INSERT INTO movies_fts (movies_fts, rowid, title, overview, collection, production_companies)
+    VALUES ('delete', old.id, old.title, old.overview, old.collection, old.production_companies);
+    INSERT INTO movies_fts (rowid, title, overview, collection, production_companies)
+    VALUES (new.id, new.title, new.overview, new.collection, new.production_companies);
+END;
+
+-- Index whatever is already in movies (a no-op on a fresh database)
+INSERT INTO movies_fts (movies_fts) VALUES ('rebuild');
@@ -0,0 +1,9 @@
+-- One (sort column, id) index per sortable column of the movie browser. They
+-- are partial on the browser's base filter so they stay small, and the id
+-- tie-breaker lets keyset pagination seek straight to the next page.
+CREATE INDEX IF NOT EXISTS idx_movies_browse_vote_average ON movies (vote_average, id) WHERE vote_count >= 100;
+CREATE INDEX IF NOT EXISTS idx_movies_browse_popularity ON movies (popularity, id) WHERE vote_count >= 100;
+CREATE INDEX IF NOT EXISTS idx_movies_browse_release_date ON movies (release_date, id) WHERE vote_count >= 100;
+CREATE INDEX IF NOT EXISTS idx_movies_browse_runtime ON movies (runtime, id) WHERE vote_count >= 100;
+CREATE INDEX IF NOT EXISTS idx_movies_browse_title ON movies (title, id) WHERE vote_count >= 100;
+CREATE INDEX IF NOT EXISTS idx_movies_vote_count ON movies (vote_count, id);
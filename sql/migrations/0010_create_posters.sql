@@ -0,0 +1,7 @@
+-- Poster URLs looked up on TMDB. A NULL poster_url records that TMDB has no
+-- poster for the film. fetched_at is a unix timestamp used for expiry.
+CREATE TABLE IF NOT EXISTS posters (
+    imdb_id TEXT PRIMARY KEY,
+    poster_url TEXT,
+    fetched_at REAL NOT NULL
+) WITHOUT ROWID;
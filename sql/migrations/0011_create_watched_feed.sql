@@ -0,0 +1,46 @@
+-- Materialized friend activity: one row per (friend who should see it, watch).
+-- Rows are fanned out by the triggers below when a watch is recorded or a
+-- friendship starts, so /friend_activities reads a single owner range.
+-- data/rebuild_feed.py rebuilds it from scratch and trims it to the
+-- retention limit.
+CREATE TABLE IF NOT EXISTS feed (
+    owner VARCHAR(255) NOT NULL,
+    timestamp DATETIME NOT NULL,
+    actor VARCHAR(255) NOT NULL,
+    movie_id INTEGER NOT NULL,
+    PRIMARY KEY (owner, timestamp, actor, movie_id),
+    FOREIGN KEY (owner) REFERENCES users(username),
+    FOREIGN KEY (actor) REFERENCES users(username),
+    FOREIGN KEY (movie_id) REFERENCES movies(id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_feed_actor_movie ON feed (actor, movie_id);
+
+CREATE TRIGGER IF NOT EXISTS feed_watched_insert AFTER INSERT ON watched BEGIN
+    INSERT OR IGNORE INTO feed (owner, timestamp, actor, movie_id)
+    SELECT user_b, new.timestamp, new.username, new.movie_id
+    FROM friends WHERE user_a = new.username AND user_b != new.username;
+END;
+
+-- Re-watching moves the activity back to the top of everyone's feed
+CREATE TRIGGER IF NOT EXISTS feed_watched_update AFTER UPDATE OF timestamp ON watched BEGIN
+    UPDATE feed SET timestamp = new.timestamp
+    WHERE actor = new.username AND movie_id = new.movie_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS feed_watched_delete AFTER DELETE ON watched BEGIN
+    DELETE FROM feed WHERE actor = old.username AND movie_id = old.movie_id;
+END;
+
+-- A new friendship backfills user_a's feed with user_b's recent history,
+-- capped at the same 200 rows per owner that rebuild_feed.py retains.
+-- Friendships are stored in both directions, so the mirrored row fills
+-- user_b's feed.
+CREATE TRIGGER IF NOT EXISTS feed_friends_insert AFTER INSERT ON friends
+WHEN new.user_a != new.user_b BEGIN
+    INSERT OR IGNORE INTO feed (owner, timestamp, actor, movie_id)
+    SELECT new.user_a, timestamp, username, movie_id FROM (
+        SELECT timestamp, username, movie_id FROM watched
+        WHERE username = new.user_b ORDER BY timestamp DESC LIMIT 200
+    );
+END;
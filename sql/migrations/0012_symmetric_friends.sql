@@ -0,0 +1,5 @@
+-- Friendships are stored in both directions, so every lookup is a single
+-- (user_a = ?) range on the primary key. Mirror any one-way rows written
+-- before that.
+INSERT OR IGNORE INTO friends (user_a, user_b)
+SELECT user_b, user_a FROM friends WHERE user_a != user_b;
@@ -0,0 +1,128 @@
+-- Aggregates of our own users' ratings per movie, kept in step with watched by
+-- the triggers below inside the writing transaction. h0..h10 count the
+-- ratings of each value; rating_mean is NULL until a movie has a rating.
+-- data/check_movie_stats.py compares it against a full recompute.
+CREATE TABLE IF NOT EXISTS movie_stats (
+    movie_id INTEGER PRIMARY KEY,
+    watch_count INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_mean REAL,
+    h0 INTEGER NOT NULL DEFAULT 0,
+    h1 INTEGER NOT NULL DEFAULT 0,
+    h2 INTEGER NOT NULL DEFAULT 0,
+    h3 INTEGER NOT NULL DEFAULT 0,
+    h4 INTEGER NOT NULL DEFAULT 0,
+    h5 INTEGER NOT NULL DEFAULT 0,
+    h6 INTEGER NOT NULL DEFAULT 0,
+    h7 INTEGER NOT NULL DEFAULT 0,
+    h8 INTEGER NOT NULL DEFAULT 0,
+    h9 INTEGER NOT NULL DEFAULT 0,
+    h10 INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (movie_id) REFERENCES movies(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_movie_stats_mean ON movie_stats (rating_mean, movie_id);
+CREATE INDEX IF NOT EXISTS idx_movie_stats_count ON movie_stats (rating_count, movie_id);
+
+-- The stats row is created with NOT EXISTS rather than INSERT OR IGNORE
+-- because an upsert on watched would override the trigger's conflict clause.
+CREATE TRIGGER IF NOT EXISTS movie_stats_watched_insert AFTER INSERT ON watched BEGIN
+    INSERT INTO movie_stats (movie_id) SELECT new.movie_id
+    WHERE NOT EXISTS (SELECT 1 FROM movie_stats WHERE movie_id = new.movie_id);
+    UPDATE movie_stats SET
+        watch_count = watch_count + 1,
+        rating_count = rating_count + (new.rating IS NOT NULL),
+        rating_sum = rating_sum + IFNULL(new.rating, 0),
+        h0 = h0 + (new.rating IS 0),
+        h1 = h1 + (new.rating IS 1),
+        h2 = h2 + (new.rating IS 2),
+        h3 = h3 + (new.rating IS 3),
+        h4 = h4 + (new.rating IS 4),
+        h5 = h5 + (new.rating IS 5),
+        h6 = h6 + (new.rating IS 6),
+        h7 = h7 + (new.rating IS 7),
+        h8 = h8 + (new.rating IS 8),
+        h9 = h9 + (new.rating IS 9),
+        h10 = h10 + (new.rating IS 10)
+    WHERE movie_id = new.movie_id;
+    UPDATE movie_stats SET rating_mean = CAST(rating_sum AS REAL) / NULLIF(rating_count, 0)
+    WHERE movie_id = new.movie_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS movie_stats_watched_update AFTER UPDATE OF rating, movie_id ON watched BEGIN
+    UPDATE movie_stats SET
+        watch_count = watch_count - 1,
+        rating_count = rating_count - (old.rating IS NOT NULL),
+        rating_sum = rating_sum - IFNULL(old.rating, 0),
+        h0 = h0 - (old.rating IS 0),
+        h1 = h1 - (old.rating IS 1),
+        h2 = h2 - (old.rating IS 2),
+        h3 = h3 - (old.rating IS 3),
+        h4 = h4 - (old.rating IS 4),
+        h5 = h5 - (old.rating IS 5),
+        h6 = h6 - (old.rating IS 6),
+        h7 = h7 - (old.rating IS 7),
+        h8 = h8 - (old.rating IS 8),
+        h9 = h9 - (old.rating IS 9),
+        h10 = h10 - (old.rating IS 10)
+    WHERE movie_id = old.movie_id;
+    UPDATE movie_stats SET rating_mean = CAST(rating_sum AS REAL) / NULLIF(rating_count, 0)
+    WHERE movie_id = old.movie_id;
+    INSERT INTO movie_stats (movie_id) SELECT new.movie_id
+    WHERE NOT EXISTS (SELECT 1 FROM movie_stats WHERE movie_id = new.movie_id);
+    UPDATE movie_stats SET
+        watch_count = watch_count + 1,
+        rating_count = rating_count + (new.rating IS NOT NULL),
+        rating_sum = rating_sum + IFNULL(new.rating, 0),
+        h0 = h0 + (new.rating IS 0),
+        h1 = h1 + (new.rating IS 1),
+        h2 = h2 + (new.rating IS 2),
+        h3 = h3 + (new.rating IS 3),
+        h4 = h4 + (new.rating IS 4),
+        h5 = h5 + (new.rating IS 5),
+        h6 = h6 + (new.rating IS 6),
+        h7 = h7 + (new.rating IS 7),
+        h8 = h8 + (new.rating IS 8),
+        h9 = h9 + (new.rating IS 9),
+        h10 = h10 + (new.rating IS 10)
+    WHERE movie_id = new.movie_id;
+    UPDATE movie_stats SET rating_mean = CAST(rating_sum AS REAL) / NULLIF(rating_count, 0)
+    WHERE movie_id = new.movie_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS movie_stats_watched_delete AFTER DELETE ON watched BEGIN
+    UPDATE movie_stats SET
+        watch_count = watch_count - 1,
+        rating_count = rating_count - (old.rating IS NOT NULL),
+        rating_sum = rating_sum - IFNULL(old.rating, 0),
+        h0 = h0 - (old.rating IS 0),
+        h1 = h1 - (old.rating IS 1),
+        h2 = h2 - (old.rating IS 2),
+        h3 = h3 - (old.rating IS 3),
+        h4 = h4 - (old.rating IS 4),
+        h5 = h5 - (old.rating IS 5),
+        h6 = h6 - (old.rating IS 6),
+        h7 = h7 - (old.rating IS 7),
+        h8 = h8 - (old.rating IS 8),
+        h9 = h9 - (old.rating IS 9),
+        h10 = h10 - (old.rating IS 10)
+    WHERE movie_id = old.movie_id;
+    UPDATE movie_stats SET rating_mean = CAST(rating_sum AS REAL) / NULLIF(rating_count, 0)
+    WHERE movie_id = old.movie_id;
+END;
+
+-- Seed the stats for watches recorded before this table existed
+INSERT OR IGNORE INTO movie_stats (
+    movie_id, watch_count, rating_count, rating_sum, rating_mean,
+    h0, h1, h2, h3, h4, h5, h6, h7, h8, h9, h10
+)
+SELECT
+    movie_id,
+    COUNT(*),
+    COUNT(rating),
+    IFNULL(SUM(rating), 0),
+    AVG(rating),
+    SUM(rating IS 0), SUM(rating IS 1), SUM(rating IS 2), SUM(rating IS 3), SUM(rating IS 4), SUM(rating IS 5), SUM(rating IS 6), SUM(rating IS 7), SUM(rating IS 8), SUM(rating IS 9), SUM(rating IS 10)
+FROM watched
+GROUP BY movie_id;
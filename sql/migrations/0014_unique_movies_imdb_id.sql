@@ -0,0 +1,3 @@
+-- Movies are matched on imdb_id when data/insert_movies.py re-runs or
+-- applies a delta, and posters and detail pages look them up by it.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_movies_imdb_id ON movies (imdb_id);
@@ -0,0 +1,15 @@
+-- migrate: online
+-- Indexes for the per-user and per-movie lookups behind the busiest routes.
+-- Each index is built in its own short transaction so a running app only
+-- waits on one build at a time. movies(imdb_id) is already covered by the
+-- unique index from 0014.
+
+-- /reviews/<movie_id>: a movie's reviews, newest first
+CREATE INDEX IF NOT EXISTS idx_watched_movie_timestamp ON watched (movie_id, timestamp);
+
+-- Profile and user pages: a user's watch history, newest first
+CREATE INDEX IF NOT EXISTS idx_watched_username_timestamp ON watched (username, timestamp);
+
+-- The reverse side of a friendship, for foreign-key checks on users and
+-- for finding everyone who lists a given user
+CREATE INDEX IF NOT EXISTS idx_friends_user_b ON friends (user_b, user_a);
@@ -0,0 +1,78 @@
+-- Counters behind the ETags in flask/app.py. A response is current as long
+-- as every counter it was built from is unchanged, so the app can answer
+-- If-None-Match without running the query.
+
+-- Bumped on every change to watched ratings, which /get_movies and
+-- /movies/<imdb_id> report through movie_stats. The catalog itself is
+-- versioned by catalog_version.
+CREATE TABLE IF NOT EXISTS ratings_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO ratings_version (id, version) VALUES (1, 1);
+
+CREATE TRIGGER IF NOT EXISTS ratings_version_watched_insert AFTER INSERT ON watched BEGIN
+    UPDATE ratings_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_version_watched_update AFTER UPDATE OF rating, movie_id ON watched BEGIN
+    UPDATE ratings_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_version_watched_delete AFTER DELETE ON watched BEGIN
+    UPDATE ratings_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+-- One row per user, bumped whenever their watched list, backlog or bio
+-- changes. Users with no row have never changed any of them: version 0.
+CREATE TABLE IF NOT EXISTS user_versions (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Rows are created with NOT EXISTS rather than INSERT OR IGNORE because an
+-- upsert on watched would override the trigger's conflict clause.
+CREATE TRIGGER IF NOT EXISTS user_versions_watched_insert AFTER INSERT ON watched BEGIN
+    INSERT INTO user_versions (username) SELECT new.username
+    WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE username = new.username);
+    UPDATE user_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE username = new.username;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_versions_watched_update AFTER UPDATE ON watched BEGIN
+    INSERT INTO user_versions (username) SELECT new.username
+    WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE username = new.username);
+    UPDATE user_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE username IN (old.username, new.username);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_versions_watched_delete AFTER DELETE ON watched BEGIN
+    INSERT INTO user_versions (username) SELECT old.username
+    WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE username = old.username);
+    UPDATE user_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE username = old.username;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_versions_backlog_insert AFTER INSERT ON backlog BEGIN
+    INSERT INTO user_versions (username) SELECT new.username
+    WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE username = new.username);
+    UPDATE user_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE username = new.username;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_versions_backlog_delete AFTER DELETE ON backlog BEGIN
+    INSERT INTO user_versions (username) SELECT old.username
+    WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE username = old.username);
+    UPDATE user_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE username = old.username;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_versions_users_update AFTER UPDATE OF bio ON users BEGIN
+    INSERT INTO user_versions (username) SELECT new.username
+    WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE username = new.username);
+    UPDATE user_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE username = new.username;
+END;
@@ -0,0 +1,18 @@
+-- 0006 created movie_genres empty, so a database migrated with movies
+-- already loaded had no genres until insert_movies.py --genres-only was
+-- run by hand. Split the comma-joined movies.genres column the way
+-- insert_movies.py does: trimmed, de-duplicated, blanks skipped. Rows that
+-- are already there are left alone, so this is a no-op on a filled table.
+INSERT OR IGNORE INTO movie_genres (genre, movie_id)
+WITH RECURSIVE split (movie_id, genre, rest) AS (
+    SELECT id, '', genres || ',' FROM movies
+    WHERE genres IS NOT NULL AND genres != ''
+    UNION ALL
+    SELECT
+        movie_id,
+        trim(substr(rest, 1, instr(rest, ',') - 1), char(32, 9, 10, 13)),
+        substr(rest, instr(rest, ',') + 1)
+    FROM split
+    WHERE rest != ''
+)
+SELECT genre, movie_id FROM split WHERE genre != '';
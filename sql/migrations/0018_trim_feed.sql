@@ -0,0 +1,29 @@
+-- Keep each owner's feed to its newest 200 rows (FEED_RETENTION in
+-- data/rebuild_feed.py) as rows are fanned out, instead of only when
+-- rebuild_feed.py --prune-only is run. Each insert looks up that owner's
+-- 200th newest row through the primary key and drops anything older, so a
+-- feed that is already at the limit loses exactly its oldest row.
+CREATE TRIGGER IF NOT EXISTS feed_retention AFTER INSERT ON feed BEGIN
+    DELETE FROM feed
+    WHERE owner = new.owner
+      AND (timestamp, actor, movie_id) < (
+          SELECT timestamp, actor, movie_id FROM feed
+          WHERE owner = new.owner
+          ORDER BY timestamp DESC, actor DESC, movie_id DESC
+          LIMIT 1 OFFSET 199
+      );
+END;
+
+-- Bring feeds that grew past the limit before this trigger existed back
+-- under it
+DELETE FROM feed
+WHERE (owner, timestamp, actor, movie_id) IN (
+    SELECT owner, timestamp, actor, movie_id FROM (
+        SELECT owner, timestamp, actor, movie_id, row_number() OVER (
+            PARTITION BY owner
+            ORDER BY timestamp DESC, actor DESC, movie_id DESC
+        ) AS position
+        FROM feed
+    )
+    WHERE position > 200
+);
@@ -0,0 +1,22 @@
+-- A re-watch is an upsert, so it fires feed_watched_update rather than the
+-- insert trigger. That trigger only moved feed rows that still existed, so
+-- once retention had pruned a film's row, re-watching it never reached
+-- friends' feeds again. It now puts one row per friend back at the new time.
+-- The timestamp is part of the feed's primary key, so the old rows are
+-- deleted first rather than replaced. An upsert that keeps the timestamp
+-- (an import of an older watch) leaves the feed alone.
+DROP TRIGGER IF EXISTS feed_watched_update;
+
+CREATE TRIGGER feed_watched_update AFTER UPDATE OF timestamp ON watched
+WHEN new.timestamp IS NOT old.timestamp BEGIN
+    DELETE FROM feed WHERE actor = new.username AND movie_id = new.movie_id;
+    INSERT OR IGNORE INTO feed (owner, timestamp, actor, movie_id)
+    SELECT user_b, new.timestamp, new.username, new.movie_id
+    FROM friends WHERE user_a = new.username AND user_b != new.username;
+END;
+
+-- feed_retention (0018) looked up the owner's 200th newest row for every
+-- fanned-out row, one extra query per friend on every watch. Feeds are now
+-- trimmed in batches by the app (prune_feeds in flask/database.py) and by
+-- data/rebuild_feed.py --prune-only.
+DROP TRIGGER IF EXISTS feed_retention;
@@ -0,0 +1,58 @@
+-- migrate: before 0014
+-- The old pandas loader appended the whole CSV again on every run, so a
+-- database it loaded more than once holds several rows per imdb_id and the
+-- unique index in 0014 cannot be built. This runs ahead of 0014 and merges
+-- each set of duplicates into its lowest id. Watches, backlog entries and
+-- genres move to that row (through the watched triggers, so movie_stats and
+-- feed follow), and the other rows are deleted. An empty imdb_id means none;
+-- it becomes NULL so those films are not merged with each other. On a
+-- database that already has the index there is nothing to merge.
+UPDATE movies SET imdb_id = NULL WHERE imdb_id = '';
+
+CREATE TEMP TABLE movie_duplicates AS
+SELECT m.id AS duplicate, k.keep
+FROM movies m
+JOIN (
+    SELECT imdb_id, MIN(id) AS keep FROM movies
+    WHERE imdb_id IS NOT NULL
+    GROUP BY imdb_id HAVING COUNT(*) > 1
+) k ON k.imdb_id = m.imdb_id
+WHERE m.id != k.keep;
+
+-- A user with a watch on both rows keeps one, with the later date and any
+-- review or rating only the duplicate had. The IN keeps the planner from
+-- scanning all of watched when there is nothing to merge.
+UPDATE watched SET
+    review = COALESCE(watched.review, d.review),
+    rating = COALESCE(watched.rating, d.rating),
+    timestamp = MAX(watched.timestamp, d.timestamp)
+FROM (
+    SELECT w.username, md.keep, w.review, w.rating, w.timestamp
+    FROM watched w JOIN movie_duplicates md ON md.duplicate = w.movie_id
+) d
+WHERE watched.movie_id IN (SELECT keep FROM movie_duplicates)
+  AND watched.username = d.username AND watched.movie_id = d.keep;
+
+INSERT OR IGNORE INTO watched (username, movie_id, review, rating, timestamp)
+SELECT w.username, md.keep, w.review, w.rating, w.timestamp
+FROM watched w JOIN movie_duplicates md ON md.duplicate = w.movie_id;
+
+DELETE FROM watched WHERE movie_id IN (SELECT duplicate FROM movie_duplicates);
+
+INSERT OR IGNORE INTO backlog (username, movie_id, timestamp)
+SELECT b.username, md.keep, b.timestamp
+FROM backlog b JOIN movie_duplicates md ON md.duplicate = b.movie_id;
+
+DELETE FROM backlog WHERE movie_id IN (SELECT duplicate FROM movie_duplicates);
+
+INSERT OR IGNORE INTO movie_genres (genre, movie_id)
+SELECT g.genre, md.keep
+FROM movie_genres g JOIN movie_duplicates md ON md.duplicate = g.movie_id;
+
+DELETE FROM movie_genres WHERE movie_id IN (SELECT duplicate FROM movie_duplicates);
+
+DELETE FROM movie_stats WHERE movie_id IN (SELECT duplicate FROM movie_duplicates);
+
+DELETE FROM movies WHERE id IN (SELECT duplicate FROM movie_duplicates);
+
+DROP TABLE movie_duplicates;
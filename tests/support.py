@@ -0,0 +1,117 @@
+"""Set-up shared by the tests that run database.py or the app against SQLite.
+
+database.py opens its pool on import, at REELFRIENDS_DATABASE, so that is
+pointed at a scratch file before anything imports it. ``use_database`` then
+gives each test its own freshly migrated database.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "flask"))
+sys.path.insert(0, os.path.join(ROOT, "data"))
+MIGRATIONS_DIR = os.path.join(ROOT, "sql", "migrations")
+
+_scratch = tempfile.TemporaryDirectory()
+os.environ["REELFRIENDS_DATABASE"] = os.path.join(_scratch.name, "unused.sqlite")
+
+import database  # noqa: E402
+import metrics  # noqa: E402
+import migrate  # noqa: E402
+from insert_movies import rebuild_movie_genres  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from recommend import ItemItemRecommender  # noqa: E402
+
+
+def create_database(path):
+    """Create a database at ``path`` with every migration applied."""
+    conn = migrate.connect(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate.migrate(conn, directory=MIGRATIONS_DIR)
+    conn.close()
+
+
+def reset_caches():
+    """Forget everything database.py remembers about the last database."""
+    database.count_cache.clear()
+    database.principal_cache.clear()
+    database._catalog_version["version"] = None
+    database._catalog_version["checked"] = 0.0
+    database._title_index["version"] = None
+    database._columnar_catalog["version"] = None
+    database._columnar_catalog["catalog"] = None
+    database.recommender = ItemItemRecommender()
+    database._feed_growth["usernames"].clear()
+
+
+def use_database(test, factory=metrics.InstrumentedConnection):
+    """Point database.py at a new, empty, migrated database until ``test`` ends.
+
+    Returns the database's path.
+    """
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "test.sqlite")
+    create_database(path)
+    previous = database.pool
+    database.pool = ConnectionPool(path, factory=factory)
+    reset_caches()
+
+    def restore():
+        database.pool.close()
+        database.pool = previous
+        reset_caches()
+        tmp.cleanup()
+
+    test.addCleanup(restore)
+    return path
+
+
+def execute(sql, parameters=()):
+    """Run one statement in its own write transaction and return its rows."""
+    with database.get_db(write=True) as conn:
+        return conn.execute(sql, parameters).fetchall()
+
+
+def add_users(*usernames):
+    with database.get_db(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password, bio) VALUES (?, 'x', '')",
+            [(username,) for username in usernames],
+        )
+
+
+def add_movies(count, **columns):
+    """Insert ``count`` browsable films, tt0000001 "Film 1" onwards.
+
+    Every other column defaults to a value derived from the film's number;
+    pass a function of it in ``columns`` to override one. movie_genres is
+    rebuilt from the genres column, as the loader does.
+    """
+    defaults = {
+        "title": lambda i: f"Film {i}",
+        "overview": lambda i: "",
+        "genres": lambda i: "Drama" if i % 2 else "Comedy",
+        "collection": lambda i: None,
+        "release_date": lambda i: f"{1950 + i % 70}-01-01",
+        "runtime": lambda i: 80 + i % 60,
+        "popularity": lambda i: (i * 37 % 101) / 10,
+        "vote_average": lambda i: i * 7 % 10,
+        "vote_count": lambda i: 100 + i % 5,
+    }
+    defaults.update(columns)
+    names = ["imdb_id", *defaults]
+    rows = [
+        (f"tt{i:07d}", *(value(i) for value in defaults.values()))
+        for i in range(1, count + 1)
+    ]
+    with database.get_db(write=True) as conn:
+        conn.executemany(
+            f"INSERT INTO movies ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' for _ in names)})",
+            rows,
+        )
+        rebuild_movie_genres(conn)
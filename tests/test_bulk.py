@@ -0,0 +1,117 @@
+"""/bulk: many backlog and watched changes, all or nothing.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+from werkzeug.security import generate_password_hash
+
+import support
+import app
+import database
+
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        database.create_user("alice", generate_password_hash("pw"))
+        support.add_movies(5)
+        database.add_to_backlog("alice", 5)
+        self.client = app.app.test_client()
+        self.client.post("/login", json={"username": "alice", "password": "pw"})
+
+    def bulk(self, operations):
+        return self.client.post("/bulk", json={"operations": operations})
+
+    def state(self):
+        backlog = support.execute(
+            "SELECT movie_id FROM backlog WHERE username = 'alice' ORDER BY movie_id"
+        )
+        watched = support.execute(
+            "SELECT movie_id, review, rating FROM watched "
+            "WHERE username = 'alice' ORDER BY movie_id"
+        )
+        return [row[0] for row in backlog], [tuple(row) for row in watched]
+
+    def test_operations_apply_in_order(self):
+        response = self.bulk(
+            [
+                {"op": "add_to_backlog", "movie_id": 1},
+                {"op": "add_to_backlog", "movie_id": 2},
+                {"op": "add_to_backlog", "movie_id": 1},
+                {"op": "remove_from_backlog", "movie_id": 1},
+                {"op": "mark_watched", "movie_id": 2, "review": "ok", "rating": 8},
+                {"op": "update_review", "movie_id": 2, "review": "great", "rating": 9},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertTrue(body["applied"])
+        self.assertEqual(
+            [result["message"] for result in body["results"]],
+            [
+                "Movie added to backlog successfully",
+                "Movie added to backlog successfully",
+                "Movie already in backlog",
+                "Removed from backlog",
+                database.MARK_WATCHED_MESSAGE,
+                database.UPDATE_REVIEW_MESSAGE,
+            ],
+        )
+        self.assertEqual(self.state(), ([5], [(2, "great", 9)]))
+
+    def test_one_invalid_operation_applies_nothing(self):
+        before = self.state()
+        response = self.bulk(
+            [
+                {"op": "add_to_backlog", "movie_id": 1},
+                {"op": "mark_watched", "movie_id": 2, "rating": 11},
+                {"op": "remove_from_backlog", "movie_id": 5},
+                {"op": "add_to_backlog", "movie_id": 99},
+                {"op": "rate", "movie_id": 3},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        body = response.get_json()
+        self.assertFalse(body["applied"])
+        self.assertEqual(
+            body["results"],
+            [
+                {"ok": True},
+                {"ok": False, "error": "rating must be an integer from 0 to 10"},
+                {"ok": True},
+                {"ok": False, "error": "Unknown movie_id"},
+                {"ok": False, "error": "Unknown op: rate"},
+            ],
+        )
+        self.assertEqual(self.state(), before)
+
+    def test_a_failing_statement_rolls_back_the_earlier_ones(self):
+        support.execute(
+            "CREATE TRIGGER refuse_movie_3 BEFORE INSERT ON watched "
+            "WHEN new.movie_id = 3 BEGIN SELECT RAISE(ABORT, 'refused'); END"
+        )
+        before = self.state()
+        response = self.bulk(
+            [
+                {"op": "add_to_backlog", "movie_id": 1},
+                {"op": "remove_from_backlog", "movie_id": 5},
+                {"op": "mark_watched", "movie_id": 2, "rating": 6},
+                {"op": "mark_watched", "movie_id": 3, "rating": 7},
+            ]
+        )
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {"applied": False, "error": "refused"})
+        self.assertEqual(self.state(), before)
+
+    def test_empty_and_oversized_requests_are_refused(self):
+        self.assertEqual(self.bulk([]).status_code, 400)
+        self.assertEqual(self.client.post("/bulk", json={}).status_code, 400)
+        too_many = [{"op": "add_to_backlog", "movie_id": 1}] * (app.BULK_LIMIT + 1)
+        self.assertEqual(self.bulk(too_many).status_code, 400)
+        self.assertEqual(self.state(), ([5], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
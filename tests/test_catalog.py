@@ -0,0 +1,120 @@
+"""The columnar catalog engine against the SQLite one.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+import support
+import database
+
+MOVIES = 40
+FILTERS = [
+    {},
+    {"genre": "Drama"},
+    {"genre": "Comedy"},
+    {"collection": "Saga"},
+    {"genre": "Comedy", "collection": "Saga"},
+    {"genre": "Western"},
+]
+
+
+def null_every(n, value):
+    """A column that is NULL for every nth film, with many ties otherwise."""
+    return lambda i: None if i % n == 0 else value(i)
+
+
+class ColumnarEngineTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        support.add_movies(
+            MOVIES,
+            vote_average=null_every(4, lambda i: i % 3),
+            popularity=null_every(5, lambda i: i % 4 / 2),
+            release_date=null_every(6, lambda i: f"199{i % 2}-01-01"),
+            runtime=null_every(3, lambda i: 90 + i % 2),
+            title=null_every(7, lambda i: f"Film {i % 5}"),
+            vote_count=lambda i: 100 + i % 3,
+            genres=lambda i: ["Drama", "Comedy", "Drama, Comedy"][i % 3],
+            collection=lambda i: "Saga" if i % 4 == 1 else None,
+        )
+        # Outside the browser for both engines
+        support.execute("INSERT INTO movies (title, vote_count) VALUES ('Obscure', 3)")
+        engine = database.CATALOG_ENGINE
+        self.addCleanup(setattr, database, "CATALOG_ENGINE", engine)
+
+    def browse(self, engine, sort_by, order, limit, cursor=None, **filters):
+        """(cursor pages, offset pages, total) as lists of ids."""
+        database.CATALOG_ENGINE = engine
+        by_cursor = []
+        while True:
+            _, movies, cursor = database.get_movies(
+                limit, 0, sort_by, order, cursor=cursor, with_total=False, **filters
+            )
+            by_cursor.append([movie["id"] for movie in movies])
+            if cursor is None:
+                break
+        by_offset, total = [], None
+        for offset in range(0, max(len(sum(by_cursor, [])), 1), limit):
+            total, movies, _ = database.get_movies(
+                limit, offset, sort_by, order, **filters
+            )
+            by_offset.append([movie["id"] for movie in movies])
+        return by_cursor, by_offset, total
+
+    def assertEnginesAgree(self, sort_by, order, limit, **filters):
+        sqlite = self.browse("sqlite", sort_by, order, limit, **filters)
+        columnar = self.browse("columnar", sort_by, order, limit, **filters)
+        self.assertEqual(columnar, sqlite)
+        return sqlite
+
+    def test_every_sort_and_filter_agrees(self):
+        for sort_by in database.SORT_COLUMNS:
+            for order in ("asc", "desc"):
+                for filters in FILTERS:
+                    with self.subTest(sort_by=sort_by, order=order, **filters):
+                        self.assertEnginesAgree(sort_by, order, 7, **filters)
+        self.assertIsNotNone(database._columnar_catalog["catalog"])
+
+    def test_cursors_carry_between_engines(self):
+        database.CATALOG_ENGINE = "sqlite"
+        _, first, cursor = database.get_movies(6, 0, "release_date", "asc")
+        rest, _, _ = self.browse("columnar", "release_date", "asc", 6, cursor=cursor)
+        everything, _, _ = self.browse("sqlite", "release_date", "asc", 6)
+        self.assertEqual([[movie["id"] for movie in first]] + rest, everything)
+
+    def test_the_catalog_reloads_after_a_change(self):
+        self.assertEnginesAgree("vote_average", "desc", 10)
+        support.execute("UPDATE movies SET vote_average = 9.5 WHERE id = 3")
+        support.execute(
+            "INSERT INTO movies (title, vote_average, vote_count, genres) "
+            "VALUES ('Newcomer', 9.9, 500, 'Drama')"
+        )
+        support.execute(
+            "INSERT INTO movie_genres (genre, movie_id) "
+            "SELECT 'Drama', id FROM movies WHERE title = 'Newcomer'"
+        )
+        # Stands in for CATALOG_VERSION_TTL passing
+        database._expire_catalog_version()
+        by_cursor, _, total = self.assertEnginesAgree(
+            "vote_average", "desc", 10, genre="Drama"
+        )
+        self.assertEqual(by_cursor[0][:2], [MOVIES + 2, 3])
+        self.assertEqual(
+            total, 1 + len([i for i in range(1, MOVIES + 1) if i % 3 != 1])
+        )
+
+    def test_a_cursor_row_that_changed_since(self):
+        database.CATALOG_ENGINE = "sqlite"
+        _, movies, cursor = database.get_movies(5, 0, "runtime", "asc")
+        support.execute(
+            "UPDATE movies SET runtime = 200 WHERE id = ?", (movies[-1]["id"],)
+        )
+        database._expire_catalog_version()
+        sqlite, _, _ = self.browse("sqlite", "runtime", "asc", 5, cursor=cursor)
+        columnar, _, _ = self.browse("columnar", "runtime", "asc", 5, cursor=cursor)
+        self.assertEqual(columnar, sqlite)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""ETags and 304s on catalog and per-user reads.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+from werkzeug.security import generate_password_hash
+
+import support
+import app
+import database
+
+
+class ConditionalGetTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        for username in ("alice", "bob"):
+            database.create_user(username, generate_password_hash("pw"))
+        support.add_movies(3, collection=lambda i: "Trilogy")
+        self.client = app.app.test_client()
+        self.client.post("/login", json={"username": "alice", "password": "pw"})
+
+    def revalidate(self, path, response):
+        return self.client.get(
+            path, headers={"If-None-Match": response.headers["ETag"]}
+        )
+
+    def test_a_current_copy_is_answered_with_304(self):
+        first = self.client.get("/movies/tt0000001")
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.headers["ETag"].startswith('W/"'))
+        self.assertEqual(first.headers["Cache-Control"], "public, no-cache")
+
+        again = self.revalidate("/movies/tt0000001", first)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b"")
+        self.assertEqual(again.headers["ETag"], first.headers["ETag"])
+
+        since = self.client.get(
+            "/movies/tt0000001",
+            headers={"If-Modified-Since": first.headers["Last-Modified"]},
+        )
+        self.assertEqual(since.status_code, 304)
+
+    def test_a_rating_changes_rated_responses_only(self):
+        movie = self.client.get("/movies/tt0000001")
+        movies = self.client.get("/get_movies")
+        self.assertEqual(movies.headers["Cache-Control"], "private, no-cache")
+        collections = self.client.get("/get_collections")
+        self.client.post(
+            "/mark_watched", json={"username": "bob", "movie_id": 1, "rating": 8}
+        )
+
+        changed = self.revalidate("/movies/tt0000001", movie)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], movie.headers["ETag"])
+        self.assertEqual(changed.get_json()["user_stats"]["watch_count"], 1)
+        self.assertEqual(self.revalidate("/get_movies", movies).status_code, 200)
+        self.assertEqual(
+            self.revalidate("/get_collections", collections).status_code, 304
+        )
+
+    def test_a_catalog_change_changes_every_catalog_response(self):
+        movie = self.client.get("/movies/tt0000001")
+        collections = self.client.get("/get_collections")
+        support.execute("UPDATE movies SET collection = 'Saga' WHERE id = 2")
+        # Stands in for CATALOG_VERSION_TTL passing
+        database._expire_catalog_version()
+
+        self.assertEqual(self.revalidate("/movies/tt0000001", movie).status_code, 200)
+        changed = self.revalidate("/get_collections", collections)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.get_json()["collections"], ["Saga", "Trilogy"])
+
+    def test_user_lists_change_with_their_own_user_only(self):
+        path = "/get_backlog?username=alice"
+        backlog = self.client.get(path)
+        self.assertEqual(backlog.headers["Cache-Control"], "private, no-cache")
+
+        database.add_to_backlog("bob", 1)
+        self.assertEqual(self.revalidate(path, backlog).status_code, 304)
+
+        database.add_to_backlog("alice", 1)
+        changed = self.revalidate(path, backlog)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual([movie["id"] for movie in changed.get_json()["movies"]], [1])
+
+    def test_errors_carry_no_etag(self):
+        response = self.client.get("/movies/tt9999999")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""/dashboard: a profile page in one request.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import time
+import unittest
+
+from werkzeug.security import generate_password_hash
+
+import support
+import app
+import database
+
+
+class DashboardTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        database.create_user("alice", generate_password_hash("pw"))
+        support.add_users("bob", "carol", "dave")
+        support.add_movies(30)
+        for a, b in (("alice", "bob"), ("alice", "carol"), ("bob", "dave")):
+            database.add_friend(a, b)
+        for movie_id in range(1, 26):
+            database.mark_movie_as_watched("bob", movie_id, f"review {movie_id}", 7)
+        database.add_to_backlog("bob", 26)
+        database.mark_movie_as_watched("alice", 27)
+        support.execute(
+            "INSERT INTO posters (imdb_id, poster_url, fetched_at) VALUES (?, ?, ?)",
+            ("tt0000025", "http://posters/25.jpg", time.time()),
+        )
+        self.client = app.app.test_client()
+        self.client.post("/login", json={"username": "alice", "password": "pw"})
+
+    def dashboard(self, username, **params):
+        response = self.client.get(f"/dashboard/{username}", query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_one_request_has_the_whole_page(self):
+        dashboard = self.dashboard("bob", limit=5)
+        self.assertEqual(dashboard["profile"], {"username": "bob", "bio": ""})
+        self.assertEqual(
+            dashboard["counts"], {"watched": 25, "backlog": 1, "friends": 2}
+        )
+        watched = dashboard["watched"]["movies"]
+        self.assertEqual(len(watched), 5)
+        self.assertEqual(watched[0]["review"], "review 25")
+        self.assertEqual(
+            [movie["id"] for movie in dashboard["backlog"]["movies"]], [26]
+        )
+        self.assertEqual(dashboard["posters"], {"tt0000025": "http://posters/25.jpg"})
+        self.assertEqual(
+            set(dashboard["missing_posters"]),
+            {movie["imdb_id"] for movie in watched[1:]} | {"tt0000026"},
+        )
+
+    def test_friends_are_marked_for_the_viewer(self):
+        friends = self.dashboard("bob")["friends"]
+        self.assertEqual(
+            {friend["username"]: friend["is_friend"] for friend in friends},
+            {"alice": True, "dave": False},
+        )
+        friends = self.dashboard("alice")["friends"]
+        self.assertTrue(all(friend["is_friend"] for friend in friends))
+
+    def test_feed_counts_are_only_shown_to_their_owner(self):
+        self.assertEqual(self.dashboard("alice")["counts"]["friend_activities"], 25)
+        self.assertNotIn("friend_activities", self.dashboard("bob")["counts"])
+
+    def test_the_watched_cursor_pages_get_watched_movies_too(self):
+        expected = [
+            movie["id"]
+            for movie in self.client.get(
+                "/get_watched_movies", query_string={"username": "bob"}
+            ).get_json()["movies"]
+        ]
+        dashboard = self.dashboard("bob", limit=10)
+        ids = [movie["id"] for movie in dashboard["watched"]["movies"]]
+        cursor = dashboard["watched"]["next_cursor"]
+        while cursor:
+            page = self.client.get(
+                "/get_watched_movies",
+                query_string={"username": "bob", "cursor": cursor, "limit": 10},
+            ).get_json()
+            ids += [movie["id"] for movie in page["movies"]]
+            cursor = page["next_cursor"]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(ids), 25)
+
+    def test_dashboard_pages_follow_their_own_cursors(self):
+        first = self.dashboard("bob", limit=20)
+        second = self.dashboard(
+            "bob", limit=20, watched_cursor=first["watched"]["next_cursor"]
+        )
+        self.assertEqual(len(second["watched"]["movies"]), 5)
+        self.assertIsNone(second["watched"]["next_cursor"])
+        self.assertEqual(second["backlog"], first["backlog"])
+
+    def test_unknown_users_and_bad_cursors(self):
+        self.assertEqual(self.client.get("/dashboard/nobody").status_code, 404)
+        response = self.client.get("/dashboard/bob?watched_cursor=garbage")
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""The fan-out-on-write friend activity feed.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+import support
+import database
+
+WATCHES = database.FEED_RETENTION + 50
+
+
+def feed(owner):
+    rows = support.execute(
+        "SELECT movie_id FROM feed WHERE owner = ? "
+        "ORDER BY timestamp DESC, actor DESC, movie_id DESC",
+        (owner,),
+    )
+    return [row["movie_id"] for row in rows]
+
+
+class FeedTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        support.add_users("alice", "bob", "carol")
+        support.add_movies(WATCHES)
+        database.add_friend("alice", "bob")
+        database.add_friend("carol", "bob")
+        # Bob watched film n n minutes before film n + 1, an hour ago at the latest
+        support.execute(
+            "INSERT INTO watched (username, movie_id, rating, timestamp) "
+            "SELECT 'bob', id, 5, datetime('now', '-1 hour', (id - ?) || ' minutes') "
+            "FROM movies",
+            (WATCHES,),
+        )
+
+    def test_watches_fan_out_to_friends_only(self):
+        self.assertEqual(feed("alice"), list(range(WATCHES, 0, -1)))
+        self.assertEqual(feed("carol"), feed("alice"))
+        self.assertEqual(feed("bob"), [])
+
+    def test_prune_keeps_the_newest_rows(self):
+        removed = database.prune_feeds(["bob"])
+        self.assertEqual(removed, 2 * (WATCHES - database.FEED_RETENTION))
+        newest = list(range(WATCHES, WATCHES - database.FEED_RETENTION, -1))
+        self.assertEqual(feed("alice"), newest)
+        self.assertEqual(feed("carol"), newest)
+
+    def test_writes_prune_once_the_interval_has_passed(self):
+        database.mark_movie_as_watched("bob", 1, rating=7)
+        self.assertEqual(len(feed("alice")), WATCHES)
+
+        interval, database.FEED_PRUNE_INTERVAL = database.FEED_PRUNE_INTERVAL, 0
+        try:
+            database.mark_movie_as_watched("bob", 2, rating=7)
+        finally:
+            database.FEED_PRUNE_INTERVAL = interval
+        # The prune was queued behind the watch; this waits for it
+        database._write(lambda conn: None)
+        self.assertEqual(feed("alice")[:2], [2, 1])
+        self.assertEqual(len(feed("alice")), database.FEED_RETENTION)
+
+    def test_rewatch_of_a_pruned_film_reaches_friends_again(self):
+        database.prune_feeds(["bob"])
+        self.assertNotIn(1, feed("alice"))
+
+        database.mark_movie_as_watched("bob", 1, rating=9)
+        activities, _ = database.get_friend_activities("alice", limit=1)
+        self.assertEqual(activities[0]["movie_id"], 1)
+        self.assertEqual(activities[0]["rating"], 9)
+        self.assertEqual(feed("carol")[0], 1)
+        self.assertEqual(feed("alice").count(1), 1)
+
+    def test_rewatch_moves_an_existing_row_to_the_top(self):
+        database.mark_movie_as_watched("bob", 100, rating=9)
+        self.assertEqual(feed("alice")[0], 100)
+        self.assertEqual(feed("alice").count(100), 1)
+        self.assertEqual(len(feed("alice")), WATCHES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Genre browsing through the movie_genres index.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import support
+import database
+import migrate
+
+GENRES = [
+    "Drama, Comedy",
+    "Science Fiction",
+    " Fiction ,Drama,,Drama",
+    "",
+    None,
+    "Comedy",
+]
+
+
+class GenreIndexTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        support.add_movies(len(GENRES), genres=lambda i: GENRES[i - 1])
+
+    def test_genre_filter_matches_whole_genres_only(self):
+        for genre in ("Drama", "Comedy", "Fiction", "Science Fiction"):
+            total, movies, _ = database.get_movies(50, 0, "title", "asc", genre=genre)
+            expected = {
+                i
+                for i, genres in enumerate(GENRES, 1)
+                if genres and genre in {g.strip() for g in genres.split(",")}
+            }
+            self.assertEqual({movie["id"] for movie in movies}, expected, genre)
+            self.assertEqual(total, len(expected))
+
+    def test_all_genres_are_listed_once(self):
+        self.assertEqual(
+            database.get_all_genres(),
+            ["Comedy", "Drama", "Fiction", "Science Fiction"],
+        )
+
+
+class FillMovieGenresTest(unittest.TestCase):
+    """0017 fills movie_genres for films loaded before 0006 created it."""
+
+    def test_existing_films_get_their_genres(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = migrate.connect(os.path.join(tmp, "old.sqlite"))
+            with contextlib.redirect_stdout(io.StringIO()):
+                migrate.migrate(conn, target=5, directory=support.MIGRATIONS_DIR)
+                conn.executemany(
+                    "INSERT INTO movies (id, genres) VALUES (?, ?)",
+                    list(enumerate(GENRES, 1)),
+                )
+                migrate.migrate(conn, directory=support.MIGRATIONS_DIR)
+            migrated = set(conn.execute("SELECT genre, movie_id FROM movie_genres"))
+
+            # The same rows the loader builds
+            conn.row_factory = sqlite3.Row
+            conn.execute("BEGIN")
+            support.rebuild_movie_genres(conn)
+            rebuilt = set(
+                tuple(row)
+                for row in conn.execute("SELECT genre, movie_id FROM movie_genres")
+            )
+            conn.execute("ROLLBACK")
+            conn.close()
+        self.assertEqual(migrated, rebuilt)
+        self.assertEqual(
+            migrated,
+            {
+                ("Drama", 1),
+                ("Comedy", 1),
+                ("Science Fiction", 2),
+                ("Fiction", 3),
+                ("Drama", 3),
+                ("Comedy", 6),
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
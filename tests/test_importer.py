@@ -0,0 +1,43 @@
+"""Parsing of watch-history CSVs in importer.py.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "flask"))
+
+from importer import read_csv  # noqa: E402
+
+
+def parse(text):
+    return list(read_csv(io.StringIO(text)))
+
+
+class ReadCsvTest(unittest.TestCase):
+    def test_star_ratings_become_ten_point(self):
+        [(_, entry, error)] = parse("Name,Year,Rating\nAlien,1979,4.5\n")
+        self.assertIsNone(error)
+        self.assertEqual(entry["rating"], 9)
+
+    def test_non_finite_ratings_are_bad_rows(self):
+        rows = parse("Name,Rating\nA,inf\nB,-inf\nC,nan\nD,1e999\nE,3\n")
+        errors = [error for _, _, error in rows]
+        self.assertEqual(
+            errors,
+            [
+                "Bad rating: inf",
+                "Bad rating: -inf",
+                "Bad rating: nan",
+                "Bad rating: 1e999",
+                None,
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
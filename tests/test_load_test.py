@@ -0,0 +1,36 @@
+"""bench/load_test.py has a scenario for every route of the app.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import os
+import sys
+import unittest
+
+import support
+import app
+
+sys.path.insert(0, os.path.join(support.ROOT, "bench"))
+
+import load_test  # noqa: E402
+
+
+class LoadTestCoverageTest(unittest.TestCase):
+    def test_every_route_has_a_scenario(self):
+        routes = {
+            rule.rule
+            for rule in app.app.url_map.iter_rules()
+            if rule.endpoint != "static"
+        }
+        self.assertEqual(sorted(routes - set(load_test.ROUTES.values())), [])
+        self.assertEqual(sorted(set(load_test.ROUTES.values()) - routes), [])
+
+    def test_every_scenario_is_in_the_mix(self):
+        self.assertEqual(
+            set(load_test.ROUTES) - set(load_test.MIX), {"login", "logout"}
+        )
+        self.assertEqual(set(load_test.MIX) - set(load_test.ROUTES), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
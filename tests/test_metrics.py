@@ -0,0 +1,75 @@
+"""Statement series in metrics.py: what identifies one, and how many there are.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import os
+import sqlite3
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "flask"))
+
+import metrics  # noqa: E402
+
+
+def statement_series():
+    _, _, _, _, series = metrics.registry._metrics["reelfriends_sql_statement_seconds"]
+    return set(series)
+
+
+def first_helper(conn, sql):
+    return conn.execute(sql).fetchall()
+
+
+def second_helper(conn, sql):
+    return conn.execute(sql).fetchall()
+
+
+class StatementSeriesTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:", factory=metrics.InstrumentedConnection)
+        self.conn.execute("CREATE TABLE t (a, b, c)")
+        self.cap = metrics.MAX_STATEMENT_SERIES
+
+    def tearDown(self):
+        metrics.MAX_STATEMENT_SERIES = self.cap
+        self.conn.close()
+
+    def test_select_list_is_not_part_of_the_statement(self):
+        self.conn.execute("SELECT a FROM t WHERE a = 1").fetchall()
+        before = statement_series()
+        for select in ("a, b", "b, a", "c", "a, b, c"):
+            self.conn.execute(f"SELECT {select} FROM t WHERE a = 1").fetchall()
+        self.assertEqual(statement_series() - before, set())
+
+    def test_each_caller_gets_its_own_series(self):
+        # Both helpers are reported as "other" outside database.py, so tell
+        # them apart by making calling_helper see this module as database
+        sql = "SELECT a FROM t WHERE b = 2"
+        name = globals()["__name__"]
+        globals()["__name__"] = "database"
+        try:
+            first_helper(self.conn, sql)
+            second_helper(self.conn, sql)
+        finally:
+            globals()["__name__"] = name
+        helpers = {
+            helper
+            for helper, id in statement_series()
+            if id in metrics.statements()
+            and metrics.statements()[id]["sql"] == "SELECT ... FROM t WHERE b = 2"
+        }
+        self.assertEqual(helpers, {"first_helper", "second_helper"})
+
+    def test_statements_past_the_cap_are_counted_as_other(self):
+        metrics.MAX_STATEMENT_SERIES = len(metrics._statement_info) + 1
+        for n in range(10):
+            self.conn.execute(f"SELECT a FROM t WHERE a = {n}").fetchall()
+        self.assertEqual(len(metrics._statement_info), metrics.MAX_STATEMENT_SERIES)
+        self.assertIn(("other", "other"), statement_series())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""The migration runner, and 0020 merging films the old loader duplicated.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import support
+import migrate
+
+
+def run(conn, target=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return migrate.migrate(conn, target=target, directory=support.MIGRATIONS_DIR)
+
+
+class RunOrderTest(unittest.TestCase):
+    def test_merge_runs_just_before_the_unique_index(self):
+        order = [
+            (position, version)
+            for position, version, _, _ in migrate.run_order(
+                migrate.discover(support.MIGRATIONS_DIR)
+            )
+        ]
+        self.assertLess(order.index((14, 20)), order.index((14, 14)))
+        self.assertEqual(order.index((14, 20)), order.index((13, 13)) + 1)
+
+    def test_a_target_below_the_position_leaves_it_pending(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = migrate.connect(os.path.join(tmp, "db.sqlite"))
+            self.assertNotIn(20, run(conn, target=13))
+            self.assertEqual(run(conn, target=14), [20, 14])
+            conn.close()
+
+
+class MergeDuplicateMoviesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.conn = migrate.connect(os.path.join(tmp.name, "db.sqlite"))
+        self.addCleanup(self.conn.close)
+
+    def seed(self):
+        """Three copies of one film and two others, one of them with no id."""
+        self.conn.executescript(
+            """
+            INSERT INTO users (username, password) VALUES ('alice', 'x'), ('bob', 'x');
+            INSERT INTO friends (user_a, user_b) VALUES ('alice', 'bob'), ('bob', 'alice');
+            INSERT INTO movies (id, imdb_id, title, genres) VALUES
+                (1, 'tt1', 'Heat', 'Crime'),
+                (2, 'tt1', 'Heat', 'Crime'),
+                (3, 'tt1', 'Heat', 'Crime, Drama'),
+                (4, '', 'No id', NULL),
+                (5, '', 'No id either', NULL);
+            INSERT INTO movie_genres (genre, movie_id) VALUES
+                ('Crime', 1), ('Crime', 2), ('Crime', 3), ('Drama', 3);
+            INSERT INTO watched (username, movie_id, review, rating, timestamp) VALUES
+                ('alice', 1, NULL, 7, '2020-01-01 00:00:00'),
+                ('alice', 2, 'Great', NULL, '2021-01-01 00:00:00'),
+                ('bob', 3, NULL, 9, '2019-01-01 00:00:00');
+            INSERT INTO backlog (username, movie_id) VALUES ('bob', 2);
+            """
+        )
+
+    def test_duplicates_are_merged_before_the_index_is_built(self):
+        run(self.conn, target=13)
+        self.seed()
+        run(self.conn)
+
+        rows = self.conn.execute
+        self.assertEqual(
+            rows("SELECT id, imdb_id FROM movies ORDER BY id").fetchall(),
+            [(1, "tt1"), (4, None), (5, None)],
+        )
+        self.assertEqual(
+            rows(
+                "SELECT username, movie_id, review, rating, timestamp FROM watched "
+                "ORDER BY username"
+            ).fetchall(),
+            [
+                ("alice", 1, "Great", 7, "2021-01-01 00:00:00"),
+                ("bob", 1, None, 9, "2019-01-01 00:00:00"),
+            ],
+        )
+        self.assertEqual(
+            rows("SELECT username, movie_id FROM backlog").fetchall(), [("bob", 1)]
+        )
+        self.assertEqual(
+            sorted(rows("SELECT genre, movie_id FROM movie_genres").fetchall()),
+            [("Crime", 1), ("Drama", 1)],
+        )
+        self.assertEqual(
+            rows(
+                "SELECT movie_id, watch_count, rating_count, rating_sum "
+                "FROM movie_stats"
+            ).fetchall(),
+            [(1, 2, 2, 16)],
+        )
+        self.assertEqual(
+            sorted(rows("SELECT owner, actor, movie_id FROM feed").fetchall()),
+            [("alice", "bob", 1), ("bob", "alice", 1)],
+        )
+        self.assertEqual(
+            rows(
+                "SELECT rowid FROM movies_fts WHERE movies_fts MATCH 'heat'"
+            ).fetchall(),
+            [(1,)],
+        )
+
+    def test_an_indexed_database_is_left_alone(self):
+        # A database that applied 0014 before 0020 existed
+        with tempfile.TemporaryDirectory() as tmp:
+            for version, _, path in migrate.discover(support.MIGRATIONS_DIR):
+                if version != 20:
+                    os.link(path, os.path.join(tmp, os.path.basename(path)))
+            with contextlib.redirect_stdout(io.StringIO()):
+                migrate.migrate(self.conn, directory=tmp)
+        self.conn.executescript(
+            """
+            INSERT INTO movies (id, imdb_id, title) VALUES (1, 'tt1', 'Heat');
+            INSERT INTO movies (id, imdb_id, title) VALUES (2, 'tt2', 'Ran');
+            """
+        )
+        self.assertEqual(run(self.conn), [20])
+        self.assertEqual(
+            self.conn.execute("SELECT id, imdb_id FROM movies").fetchall(),
+            [(1, "tt1"), (2, "tt2")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""/stats and /metrics answer only the machine itself and configured hosts.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+import support
+import app
+
+MONITORING_ROUTES = ("/stats", "/metrics")
+
+
+class MonitoringAccessTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        self.client = app.app.test_client()
+        hosts = set(app.MONITORING_HOSTS)
+        self.addCleanup(setattr, app, "MONITORING_HOSTS", hosts)
+
+    def get(self, path, remote_addr="127.0.0.1", **kwargs):
+        return self.client.get(
+            path, environ_base={"REMOTE_ADDR": remote_addr}, **kwargs
+        )
+
+    def test_loopback_requests_are_answered(self):
+        for path in MONITORING_ROUTES:
+            self.assertEqual(self.get(path).status_code, 200, path)
+            self.assertEqual(self.get(path, "::1").status_code, 200, path)
+
+    def test_remote_requests_are_refused(self):
+        for path in MONITORING_ROUTES:
+            self.assertEqual(self.get(path, "203.0.113.7").status_code, 403, path)
+
+    def test_proxied_requests_are_refused(self):
+        # A reverse proxy on the same machine connects from loopback
+        headers = {"X-Forwarded-For": "203.0.113.7"}
+        for path in MONITORING_ROUTES:
+            self.assertEqual(self.get(path, headers=headers).status_code, 403, path)
+
+    def test_configured_hosts_are_answered(self):
+        app.MONITORING_HOSTS = app.MONITORING_HOSTS | {"10.0.0.9"}
+        for path in MONITORING_ROUTES:
+            self.assertEqual(self.get(path, "10.0.0.9").status_code, 200, path)
+            self.assertEqual(self.get(path, "10.0.0.10").status_code, 403, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
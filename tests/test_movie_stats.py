@@ -0,0 +1,89 @@
+"""movie_stats, kept in step with watched by triggers.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import random
+import sqlite3
+import unittest
+
+import support
+import database
+from check_movie_stats import find_mismatches
+
+USERS = ["alice", "bob", "carol", "dave"]
+MOVIES = 6
+
+
+class MovieStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = support.use_database(self)
+        support.add_users(*USERS)
+        support.add_movies(MOVIES)
+
+    def mismatches(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return find_mismatches(conn)
+        finally:
+            conn.close()
+
+    def test_random_writes_keep_the_stats_exact(self):
+        rng = random.Random(11)
+        for step in range(300):
+            username = rng.choice(USERS)
+            movie_id = rng.randint(1, MOVIES)
+            rating = rng.choice([None, *range(11)])
+            action = rng.random()
+            if action < 0.4:
+                database.mark_movie_as_watched(username, movie_id, "ok", rating)
+            elif action < 0.6:
+                database.update_movie_review(username, movie_id, "edited", rating)
+            elif action < 0.7:
+                database.apply_bulk(
+                    username,
+                    [
+                        {"op": "mark_watched", "movie_id": movie_id, "rating": rating},
+                        {"op": "update_review", "movie_id": movie_id, "rating": 3},
+                    ],
+                )
+            elif action < 0.8:
+                # Moving a watch to another film updates both films' stats
+                support.execute(
+                    "UPDATE OR IGNORE watched SET movie_id = ? "
+                    "WHERE username = ? AND movie_id = ?",
+                    (rng.randint(1, MOVIES), username, movie_id),
+                )
+            else:
+                support.execute(
+                    "DELETE FROM watched WHERE username = ? AND movie_id = ?",
+                    (username, movie_id),
+                )
+            if step % 50 == 0:
+                self.assertEqual(self.mismatches(), [], step)
+        self.assertEqual(self.mismatches(), [])
+
+    def test_movie_detail_shows_the_stats(self):
+        for username, rating in zip(USERS, (10, 7, None, 7)):
+            database.mark_movie_as_watched(username, 1, rating=rating)
+        stats = database.get_movie_by_imdb_id("tt0000001")["user_stats"]
+        self.assertEqual(stats["watch_count"], 4)
+        self.assertEqual(stats["rating_count"], 3)
+        self.assertEqual(stats["rating_sum"], 24)
+        self.assertAlmostEqual(stats["rating_mean"], 8.0)
+        self.assertEqual(stats["histogram"], [0] * 7 + [2, 0, 0, 1])
+
+        support.execute("DELETE FROM watched WHERE movie_id = 1")
+        stats = database.get_movie_by_imdb_id("tt0000001")["user_stats"]
+        self.assertEqual(stats["watch_count"], 0)
+        self.assertIsNone(stats["rating_mean"])
+
+    def test_unrated_films_have_no_stats(self):
+        self.assertEqual(
+            database.get_movie_by_imdb_id("tt0000002")["user_stats"],
+            database.movie_stats_dict(None),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
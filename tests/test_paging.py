@@ -0,0 +1,84 @@
+"""Keyset (cursor) paging of the movie browser against OFFSET paging.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+import support
+import database
+
+MOVIES = 23
+
+
+def null_every(n, value):
+    """A column that is NULL for every nth film, with many ties otherwise."""
+    return lambda i: None if i % n == 0 else value(i)
+
+
+class KeysetPagingTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        support.add_movies(
+            MOVIES,
+            vote_average=null_every(4, lambda i: i % 3),
+            popularity=null_every(5, lambda i: i % 4 / 2),
+            release_date=null_every(6, lambda i: f"199{i % 2}-01-01"),
+            runtime=null_every(3, lambda i: 90),
+            title=null_every(7, lambda i: f"Film {i % 5}"),
+        )
+        # One film outside the browser, which neither kind of paging shows
+        support.execute("INSERT INTO movies (title, vote_count) VALUES ('Obscure', 3)")
+        support.add_users("alice", "bob")
+        for username, ratings in (("alice", (5, 7, 9, 9)), ("bob", (5, 3, 9))):
+            for movie_id, rating in enumerate(ratings, 1):
+                database.mark_movie_as_watched(username, movie_id, rating=rating)
+
+    def pages(self, sort_by, order, limit, **filters):
+        """Every page by cursor, then by offset, as lists of ids."""
+        by_cursor, cursor = [], None
+        while True:
+            _, movies, cursor = database.get_movies(
+                limit, 0, sort_by, order, cursor=cursor, with_total=False, **filters
+            )
+            by_cursor.append([movie["id"] for movie in movies])
+            if cursor is None:
+                break
+        by_offset = []
+        for offset in range(0, max(len(sum(by_cursor, [])), 1), limit):
+            total, movies, _ = database.get_movies(
+                limit, offset, sort_by, order, **filters
+            )
+            by_offset.append([movie["id"] for movie in movies])
+        return by_cursor, by_offset, total
+
+    def test_every_sort_pages_the_same_both_ways(self):
+        sorts = list(database.SORT_COLUMNS) + list(database.STATS_SORT_COLUMNS)
+        for sort_by in sorts:
+            for order in ("asc", "desc"):
+                for limit in (1, 4, 50):
+                    with self.subTest(sort_by=sort_by, order=order, limit=limit):
+                        by_cursor, by_offset, total = self.pages(sort_by, order, limit)
+                        self.assertEqual(by_cursor, by_offset)
+                        ids = sum(by_cursor, [])
+                        self.assertEqual(sorted(ids), list(range(1, MOVIES + 1)))
+                        self.assertEqual(total, MOVIES)
+
+    def test_filtered_pages_match(self):
+        by_cursor, by_offset, total = self.pages(
+            "vote_average", "desc", 3, genre="Drama"
+        )
+        self.assertEqual(by_cursor, by_offset)
+        self.assertEqual(sorted(sum(by_cursor, [])), list(range(1, MOVIES + 1, 2)))
+        self.assertEqual(total, len(range(1, MOVIES + 1, 2)))
+
+    def test_cursor_must_match_the_sort(self):
+        _, _, cursor = database.get_movies(2, 0, "title", "asc")
+        with self.assertRaises(ValueError):
+            database.get_movies(2, 0, "title", "desc", cursor=cursor)
+        with self.assertRaises(ValueError):
+            database.get_movies(2, 0, "title", "asc", cursor="not a cursor")
+
+
+if __name__ == "__main__":
+    unittest.main()
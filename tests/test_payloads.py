@@ -0,0 +1,138 @@
+"""fields= projection, the JSON provider and response compression.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import decimal
+import gzip
+import json
+import unittest
+
+from werkzeug.security import generate_password_hash
+
+import support
+import app
+import compress
+import database
+
+RATING_COLUMNS = {"user_rating", "user_rating_count"}
+
+
+class FieldsTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        database.create_user("alice", generate_password_hash("pw"))
+        support.add_movies(60)
+        self.client = app.app.test_client()
+        self.client.post("/login", json={"username": "alice", "password": "pw"})
+
+    def pages(self, **params):
+        """Every /get_movies page, following next_cursor."""
+        pages, cursor = [], None
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            body = self.client.get("/get_movies", query_string=query).get_json()
+            pages.append(body["movies"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                return pages
+
+    def test_only_the_requested_columns_are_returned(self):
+        movies = self.client.get(
+            "/get_movies", query_string={"fields": "title,vote_average"}
+        ).get_json()["movies"]
+        self.assertEqual(len(movies), app.MOVIE_LIMIT)
+        for movie in movies:
+            self.assertEqual(
+                set(movie), {"id", "title", "vote_average"} | RATING_COLUMNS
+            )
+
+    def test_paging_by_a_column_that_was_not_requested(self):
+        projected = self.pages(sort_by="popularity", fields="title")
+        full = self.pages(sort_by="popularity")
+        self.assertEqual(
+            [[movie["id"] for movie in page] for page in projected],
+            [[movie["id"] for movie in page] for page in full],
+        )
+        self.assertNotIn("popularity", projected[0][0])
+
+    def test_unknown_fields_are_refused(self):
+        response = self.client.get(
+            "/get_movies", query_string={"fields": "title,password"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.get_json()["error"])
+
+    def test_endpoint_columns_are_always_returned(self):
+        database.add_to_backlog("alice", 3)
+        movies = self.client.get(
+            "/get_backlog", query_string={"username": "alice", "fields": "title"}
+        ).get_json()["movies"]
+        self.assertEqual(
+            movies, [{"id": 3, "title": "Film 3", "added_on": movies[0]["added_on"]}]
+        )
+
+
+class JSONProviderTest(unittest.TestCase):
+    def test_output_is_compact(self):
+        body = app.app.json.dumps({"a": [1, 2], "b": None})
+        self.assertEqual(body, '{"a":[1,2],"b":null}')
+
+    def test_unsupported_types_fall_back_to_the_default_provider(self):
+        body = app.app.json.dumps({"price": decimal.Decimal("1.50")})
+        self.assertEqual(json.loads(body), {"price": "1.50"})
+
+
+class CompressionTest(unittest.TestCase):
+    LARGE = "/get_watched_movies?username=alice"
+    SMALL = "/get_user_profile?username=alice"
+
+    def setUp(self):
+        support.use_database(self)
+        database.create_user("alice", generate_password_hash("pw"))
+        support.add_movies(10, overview=lambda i: "A long overview. " * 10)
+        for movie_id in range(1, 11):
+            database.mark_movie_as_watched("alice", movie_id, "fine", 7)
+        self.client = app.app.test_client()
+
+    def get(self, path, encoding=None, **headers):
+        if encoding:
+            headers["Accept-Encoding"] = encoding
+        return self.client.get(path, headers=headers)
+
+    def test_large_bodies_are_gzipped_for_clients_that_accept_it(self):
+        plain = self.get(self.LARGE)
+        self.assertGreater(len(plain.data), compress.COMPRESS_MIN_SIZE)
+        self.assertNotIn("Content-Encoding", plain.headers)
+
+        compressed = self.get(self.LARGE, "gzip")
+        self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed.headers["Vary"])
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+
+    def test_small_bodies_are_sent_as_they_are(self):
+        response = self.get(self.SMALL, "gzip")
+        self.assertLess(len(response.data), compress.COMPRESS_MIN_SIZE)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_streams_and_304s_are_left_alone(self):
+        stream = self.get(self.LARGE + "&format=ndjson", "gzip")
+        self.assertEqual(stream.mimetype, "application/x-ndjson")
+        self.assertNotIn("Content-Encoding", stream.headers)
+
+        first = self.get(self.LARGE, "gzip")
+        again = self.get(self.LARGE, "gzip", **{"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        self.assertNotIn("Content-Encoding", again.headers)
+
+    @unittest.skipIf(compress.brotli is None, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.get(self.LARGE, "gzip, br")
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(
+            compress.brotli.decompress(response.data), self.get(self.LARGE).data
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""ConnectionPool, and the foreign keys it turns on as write helpers see them.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+import support
+from pool import ConnectionPool, PoolTimeout
+
+import app
+import database
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(
+            os.path.join(self.tmp.name, "pool.sqlite"), max_connections=2, timeout=0.1
+        )
+        with self.pool.connection(write=True) as conn:
+            conn.execute("CREATE TABLE t (n INTEGER)")
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def count(self):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+    def test_connections_are_configured_and_reused(self):
+        for _ in range(3):
+            with self.pool.connection() as conn:
+                self.assertEqual(
+                    conn.execute("PRAGMA journal_mode").fetchone()[0], "wal"
+                )
+                self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        stats = self.pool.stats()
+        self.assertEqual(stats["opened"], 1)
+        self.assertEqual(stats["reuses"], 3)
+
+    def test_nested_blocks_share_one_transaction(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.pool.connection(write=True) as outer:
+                outer.execute("INSERT INTO t VALUES (1)")
+                with self.pool.connection(write=True) as inner:
+                    self.assertIs(inner, outer)
+                    inner.execute("INSERT INTO t VALUES (2)")
+                1 / 0
+        self.assertEqual(self.count(), 0)
+
+        with self.pool.connection(write=True) as outer:
+            with self.pool.connection(write=True) as inner:
+                inner.execute("INSERT INTO t VALUES (3)")
+            # The inner block did not commit on its own
+            self.assertTrue(outer.in_transaction)
+        self.assertEqual(self.count(), 1)
+
+    def test_checkout_times_out_when_every_connection_is_busy(self):
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.pool.connection():
+                held.set()
+                release.wait(5)
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        try:
+            while self.pool.stats()["in_use"] < 2:
+                held.wait(0.01)
+            with self.assertRaises(PoolTimeout):
+                with self.pool.connection():
+                    pass
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+
+
+class ForeignKeyTest(unittest.TestCase):
+    """Writes naming a user or film that does not exist are refused cleanly."""
+
+    def setUp(self):
+        support.use_database(self)
+        support.add_users("alice")
+        support.add_movies(1)
+        self.client = app.app.test_client()
+
+    def test_add_friend_with_an_unknown_user(self):
+        response = self.client.post(
+            "/add_friend", json={"user_a": "alice", "user_b": "nobody"}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()["error"], database.UNKNOWN_REFERENCE)
+        self.assertEqual(support.execute("SELECT * FROM friends"), [])
+
+    def test_watches_of_unknown_users_and_films(self):
+        for username, movie_id in (("nobody", 1), ("alice", 999)):
+            response = self.client.post(
+                "/mark_watched",
+                json={"username": username, "movie_id": movie_id, "rating": 5},
+            )
+            self.assertEqual(response.status_code, 404)
+            response = self.client.post(
+                "/update_movie_review",
+                json={
+                    "username": username,
+                    "movie_id": movie_id,
+                    "review": "?",
+                    "rating": 5,
+                },
+            )
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            database.add_to_backlog("alice", 999),
+            (False, database.UNKNOWN_REFERENCE),
+        )
+        self.assertEqual(support.execute("SELECT * FROM watched"), [])
+
+    def test_other_integrity_errors_keep_their_message(self):
+        success, message = database.mark_movie_as_watched("alice", 1, rating=11)
+        self.assertFalse(success)
+        self.assertIn("CHECK constraint failed", message)
+
+    def test_known_rows_are_written(self):
+        support.add_users("bob")
+        self.assertEqual(database.add_friend("alice", "bob"), (True, "Friend added"))
+        self.assertEqual(
+            database.mark_movie_as_watched("alice", 1, rating=7),
+            (True, database.MARK_WATCHED_MESSAGE),
+        )
+        self.assertEqual(
+            sorted(tuple(row) for row in support.execute("SELECT * FROM friends")),
+            [("alice", "bob"), ("bob", "alice")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+"""PosterCache against a stub TMDB server on localhost.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "flask"))
+
+import posters  # noqa: E402
+from pool import ConnectionPool, PoolTimeout  # noqa: E402
+from posters import NEGATIVE_TTL, POSTER_TTL, STALE_WINDOW, PosterCache  # noqa: E402
+
+
+class StubTMDB(BaseHTTPRequestHandler):
+    """Answers /find/<imdb_id> from ``films``: a poster path, None, or an error.
+
+    ``films`` maps an id to a poster path (None for a film TMDB knows no
+    poster for) or to an int HTTP status to fail with. Ids in ``slow`` are
+    answered after ``slow_seconds``. Every request's id goes into ``calls``.
+    """
+
+    films = {}
+    slow = set()
+    slow_seconds = 1.0
+    calls = []
+
+    def do_GET(self):
+        imdb_id = self.path.split("/find/")[1].split("?")[0]
+        self.calls.append(imdb_id)
+        if imdb_id in self.slow:
+            time.sleep(self.slow_seconds)
+        film = self.films.get(imdb_id)
+        if isinstance(film, int):
+            self.send_response(film)
+            self.end_headers()
+            return
+        results = [{"poster_path": film}] if film else []
+        body = json.dumps({"movie_results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PosterCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubTMDB)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.old_url = os.environ.get("TMDB_API_URL")
+        os.environ["TMDB_API_URL"] = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        if cls.old_url is None:
+            del os.environ["TMDB_API_URL"]
+        else:
+            os.environ["TMDB_API_URL"] = cls.old_url
+
+    def setUp(self):
+        StubTMDB.films = {
+            "tt0000001": "/one.jpg",
+            "tt0000002": None,
+            "tt0000003": 500,
+            "tt0000004": "/four.jpg",
+        }
+        StubTMDB.slow = set()
+        StubTMDB.calls = []
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "posters.sqlite")
+        with open(os.path.join(ROOT, "sql/migrations/0010_create_posters.sql")) as f:
+            schema = f.read()
+        self.pool = ConnectionPool(path)
+        with self.pool.connection(write=True) as conn:
+            conn.executescript(schema)
+        self.cache = PosterCache(self.pool.connection)
+
+    def tearDown(self):
+        self.cache._refresher.shutdown(wait=True)
+        self.cache._fetcher.shutdown(wait=True)
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def age(self, imdb_id, seconds):
+        """Make the cached entry for ``imdb_id`` ``seconds`` older, in both tiers."""
+        poster_url, fetched_at = self.cache.memory.get(imdb_id)
+        entry = (poster_url, fetched_at - seconds)
+        self.cache.memory.put(imdb_id, entry)
+        with self.pool.connection(write=True) as conn:
+            conn.execute(
+                "UPDATE posters SET fetched_at = ? WHERE imdb_id = ?",
+                (entry[1], imdb_id),
+            )
+
+    def wait_for_refreshes(self):
+        deadline = time.monotonic() + 5
+        while self.cache.stats()["refreshing"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_fetches_once_then_serves_both_tiers(self):
+        url = f"{posters.TMDB_IMAGE_URL}/one.jpg"
+        self.assertEqual(self.cache.get("tt0000001"), url)
+        self.assertEqual(self.cache.get("tt0000001"), url)
+        self.assertEqual(StubTMDB.calls, ["tt0000001"])
+
+        # A new process starts with an empty memory tier and reads SQLite
+        restarted = PosterCache(self.pool.connection)
+        self.assertEqual(restarted.get("tt0000001"), url)
+        self.assertEqual(StubTMDB.calls, ["tt0000001"])
+        self.assertEqual(restarted.stats()["db_hits"], 1)
+
+    def test_missing_poster_is_cached_for_the_negative_ttl(self):
+        self.assertIsNone(self.cache.get("tt0000002"))
+        self.assertIsNone(self.cache.get("tt0000002"))
+        self.assertEqual(StubTMDB.calls, ["tt0000002"])
+
+        # Past NEGATIVE_TTL, but long before POSTER_TTL, the film is re-checked
+        self.cache.get("tt0000001")
+        self.age("tt0000001", NEGATIVE_TTL + 60)
+        self.age("tt0000002", NEGATIVE_TTL + 60)
+        StubTMDB.films["tt0000002"] = "/two.jpg"
+        self.assertEqual(self.cache.lookup(["tt0000001"])["tt0000001"][0], True)
+        self.cache.get("tt0000002")
+        self.wait_for_refreshes()
+        self.assertEqual(StubTMDB.calls, ["tt0000002", "tt0000001", "tt0000002"])
+        self.assertEqual(
+            self.cache.get("tt0000002"), f"{posters.TMDB_IMAGE_URL}/two.jpg"
+        )
+
+    def test_expired_entry_is_fetched_again(self):
+        self.cache.get("tt0000001")
+        self.age("tt0000001", POSTER_TTL + STALE_WINDOW + 60)
+        StubTMDB.films["tt0000001"] = "/one-new.jpg"
+        self.assertEqual(
+            self.cache.get("tt0000001"), f"{posters.TMDB_IMAGE_URL}/one-new.jpg"
+        )
+        self.assertEqual(StubTMDB.calls, ["tt0000001", "tt0000001"])
+        self.assertEqual(self.cache.stats()["stale_served"], 0)
+
+    def test_stale_entry_is_served_while_it_revalidates(self):
+        old = f"{posters.TMDB_IMAGE_URL}/one.jpg"
+        self.cache.get("tt0000001")
+        self.age("tt0000001", POSTER_TTL + 60)
+        StubTMDB.films["tt0000001"] = "/one-new.jpg"
+        StubTMDB.slow = {"tt0000001"}
+        StubTMDB.slow_seconds = 0.2
+
+        started = time.perf_counter()
+        self.assertEqual(self.cache.get("tt0000001"), old)
+        self.assertEqual(self.cache.get("tt0000001"), old)
+        self.assertLess(time.perf_counter() - started, 0.2)
+
+        self.wait_for_refreshes()
+        self.assertEqual(
+            self.cache.get("tt0000001"), f"{posters.TMDB_IMAGE_URL}/one-new.jpg"
+        )
+        # Two stale reads, one refresh
+        self.assertEqual(StubTMDB.calls, ["tt0000001", "tt0000001"])
+        self.assertEqual(self.cache.stats()["refreshes"], 1)
+
+    def test_upstream_error_is_not_cached(self):
+        self.assertIsNone(self.cache.get("tt0000003"))
+        self.assertIsNone(self.cache.get("tt0000003"))
+        self.assertEqual(StubTMDB.calls, ["tt0000003", "tt0000003"])
+        self.assertEqual(self.cache.stats()["fetch_errors"], 2)
+
+        StubTMDB.films["tt0000003"] = "/three.jpg"
+        self.assertEqual(
+            self.cache.get("tt0000003"), f"{posters.TMDB_IMAGE_URL}/three.jpg"
+        )
+
+    def test_upstream_error_keeps_the_expired_url(self):
+        old = f"{posters.TMDB_IMAGE_URL}/one.jpg"
+        self.cache.get("tt0000001")
+        self.age("tt0000001", POSTER_TTL + STALE_WINDOW + 60)
+        StubTMDB.films["tt0000001"] = 503
+        self.assertEqual(self.cache.get("tt0000001"), old)
+
+    def test_timeout(self):
+        StubTMDB.slow = {"tt0000004"}
+        StubTMDB.slow_seconds = 0.5
+        timeout, posters.TMDB_TIMEOUT = posters.TMDB_TIMEOUT, 0.1
+        try:
+            self.assertIsNone(self.cache.get("tt0000004"))
+        finally:
+            posters.TMDB_TIMEOUT = timeout
+        self.assertEqual(self.cache.stats()["fetch_errors"], 1)
+
+    def test_get_many_answers_what_it_has(self):
+        StubTMDB.slow = {"tt0000004"}
+        StubTMDB.slow_seconds = 0.5
+        found, failed = self.cache.get_many(
+            ["tt0000001", "tt0000002", "tt0000003", "tt0000004"], timeout=0.2
+        )
+        self.assertEqual(
+            found,
+            {
+                "tt0000001": f"{posters.TMDB_IMAGE_URL}/one.jpg",
+                "tt0000002": None,
+                "tt0000003": None,
+                "tt0000004": None,
+            },
+        )
+        self.assertEqual(sorted(failed), ["tt0000003", "tt0000004"])
+
+        # The slow fetch kept running and filled the cache for next time
+        self.cache._fetcher.shutdown(wait=True)
+        self.assertEqual(
+            self.cache.lookup(["tt0000004"])["tt0000004"],
+            (True, f"{posters.TMDB_IMAGE_URL}/four.jpg"),
+        )
+
+    def test_get_many_lists_ids_it_could_not_store(self):
+        def get_db(write=False):
+            if write:
+                raise PoolTimeout("No database connection free")
+            return self.pool.connection()
+
+        cache = PosterCache(get_db)
+        try:
+            found, failed = cache.get_many(["tt0000001", "tt0000002"])
+        finally:
+            cache._fetcher.shutdown(wait=True)
+            cache._refresher.shutdown(wait=True)
+        self.assertEqual(found, {"tt0000001": None, "tt0000002": None})
+        self.assertEqual(sorted(failed), ["tt0000001", "tt0000002"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""The logged-in user cache behind flask-login's user_loader.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import time
+import unittest
+
+from werkzeug.security import generate_password_hash
+
+import support
+import app
+import database
+from cache import LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=60)
+        cache.put("short", 1, ttl=0.01)
+        cache.put("long", 2)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual(cache.get("long"), 2)
+        stats = cache.stats()
+        self.assertEqual((stats["expired"], stats["hits"], stats["misses"]), (1, 1, 1))
+
+
+class PrincipalCacheTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        database.create_user("alice", generate_password_hash("pw"))
+        self.client = app.app.test_client()
+
+    def lookups(self):
+        stats = database.principal_cache.stats()
+        return stats["hits"], stats["misses"]
+
+    def test_principals_hold_no_password(self):
+        self.assertEqual(database.get_principal("alice"), {"username": "alice"})
+
+    def test_requests_after_login_are_served_from_the_cache(self):
+        self.client.post("/login", json={"username": "alice", "password": "pw"})
+        hits, misses = self.lookups()
+        for _ in range(3):
+            self.assertEqual(self.client.get("/get_genres").status_code, 200)
+        self.assertEqual(self.lookups(), (hits + 2, misses + 1))
+
+    def test_a_cached_user_stays_until_invalidated(self):
+        database.get_principal("alice")
+        support.execute("DELETE FROM users WHERE username = 'alice'")
+        # Another process removed the user; this one notices within PRINCIPAL_TTL
+        self.assertEqual(database.get_principal("alice"), {"username": "alice"})
+        database.invalidate_principal("alice")
+        self.assertIsNone(database.get_principal("alice"))
+
+    def test_signing_up_forgets_a_missing_lookup(self):
+        self.assertIsNone(database.get_principal("bob"))
+        database.create_user("bob", generate_password_hash("pw"))
+        self.assertEqual(database.get_principal("bob"), {"username": "bob"})
+
+    def test_logging_out_drops_the_entry(self):
+        self.client.post("/login", json={"username": "alice", "password": "pw"})
+        self.client.get("/get_genres")
+        self.client.post("/logout")
+        self.assertEqual(database.principal_cache.stats()["size"], 0)
+        # login_view sends anonymous requests to /login
+        self.assertEqual(self.client.get("/get_genres").status_code, 302)
+
+
+if __name__ == "__main__":
+    unittest.main()
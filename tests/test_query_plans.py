@@ -0,0 +1,292 @@
+"""Query plans for every statement flask/database.py issues.
+
+Every helper is called against a small seeded database, and each distinct
+statement it ran is put through EXPLAIN QUERY PLAN. The test fails on a full
+table scan not listed in ALLOWED_SCANS, and on a helper that issued no
+queries (so a new one cannot dodge the check by never being called).
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import inspect
+import io
+import re
+import sqlite3
+import sys
+import time
+import unittest
+
+import support
+import database
+
+# Full scans that are the point of the query, by (function, table)
+ALLOWED_SCANS = {
+    ("rebuild_recommender", "watched"): "trains on every rating",
+    ("get_all_genres", "movie_genres"): "distinct genres, read in primary-key order",
+    ("get_columnar_catalog", "movies"): "loads every browsable movie into memory",
+}
+
+# "SCAN <table or alias>" with nothing after it is a full table scan. Index
+# scans ("USING INDEX"), virtual tables and constant rows all add more.
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+NOT_ALIASES = {"where", "join", "left", "inner", "on", "order", "group", "limit"}
+# Issued by the pool around every helper, not by the helpers themselves
+TRANSACTION_CONTROL = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA)\b", re.I)
+
+
+class RecordingConnection(sqlite3.Connection):
+    """Remembers every statement issued from database.py, with its parameters."""
+
+    statements = []  # (innermost database.py function, sql, parameters)
+    callers = set()  # every database.py function a statement was issued under
+
+    def _record(self, sql, parameters):
+        if TRANSACTION_CONTROL.match(sql):
+            return
+        callers = []
+        frame = sys._getframe(2)
+        while frame:
+            if frame.f_globals.get("__name__") == "database":
+                callers.append(frame.f_code.co_name)
+            frame = frame.f_back
+        if callers:
+            self.statements.append((callers[0], sql, parameters))
+            self.callers.update(callers)
+
+    def execute(self, sql, parameters=()):
+        self._record(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        if seq_of_parameters:
+            self._record(sql, seq_of_parameters[0])
+        return super().executemany(sql, seq_of_parameters)
+
+
+def seed(db_path):
+    """Fill a migrated database with enough rows for every helper to do real work."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (username, password, bio) VALUES (?, 'x', '')",
+        [(name,) for name in ("alice", "bob", "carol", "dave", "erin")],
+    )
+    conn.executemany(
+        """
+        INSERT INTO movies (imdb_id, title, overview, genres, collection,
+                            release_date, runtime, popularity, vote_average, vote_count)
+        VALUES (?, ?, 'a film about space', 'Drama, Comedy', ?, '1999-01-01',
+                ?, ?, ?, 500)
+        """,
+        [
+            (
+                f"tt{i:07d}",
+                f"Star {i}",
+                "Star Collection" if i % 3 else None,
+                90 + i,
+                i / 10,
+                i % 10,
+            )
+            for i in range(1, 41)
+        ],
+    )
+    conn.execute(
+        "INSERT INTO movie_genres (genre, movie_id) "
+        "SELECT 'Drama', id FROM movies UNION ALL SELECT 'Comedy', id FROM movies"
+    )
+    conn.executemany(
+        "INSERT INTO friends (user_a, user_b) VALUES (?, ?)",
+        [("alice", "bob"), ("bob", "alice"), ("alice", "carol"), ("carol", "alice")],
+    )
+    conn.executemany(
+        "INSERT INTO watched (username, movie_id, review, rating, timestamp) "
+        "VALUES (?, ?, 'ok', ?, datetime('now', ?))",
+        [
+            (user, movie_id, (movie_id + offset) % 11, f"-{movie_id} minutes")
+            for offset, user in enumerate(("alice", "bob", "carol", "dave"))
+            for movie_id in range(1, 21)
+            if not (user == "alice" and movie_id > 10)
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO backlog (username, movie_id) VALUES (?, ?)",
+        [("alice", 30), ("alice", 31)],
+    )
+    conn.executemany(
+        "INSERT INTO posters (imdb_id, poster_url, fetched_at) VALUES (?, ?, ?)",
+        [(f"tt{i:07d}", f"http://posters/{i}.jpg", time.time()) for i in (1, 2)],
+    )
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def exercise():
+    """Call every database helper, following cursors so keyset pages run too."""
+    database.stats()
+    database.get_catalog_validators(with_ratings=True)
+    database.get_user_validators("alice")
+    database.get_user("alice")
+    database.get_principal("alice")
+    database.get_user_profile("alice")
+    database.get_friends("alice")
+    _, cursor = database.get_friend_activities("alice", limit=2)
+    database.get_friend_activities("alice", limit=2, cursor=cursor)
+    _, cursor = database.get_non_friends("alice", limit=1)
+    database.get_non_friends("alice", search="d", limit=1, cursor=cursor)
+    database.get_friends_page("alice", limit=1)
+    _, cursor = database.get_movie_reviews(1, limit=2)
+    database.get_movie_reviews(1, limit=2, cursor=cursor)
+    list(database.iter_movie_reviews(1))
+    database.get_movies_count()
+    database.get_all_genres()
+    database.get_collections()
+    database.get_movie_by_imdb_id("tt0000001")
+    database.fetch_movie_poster("tt0000001")
+    database.fetch_movie_posters(["tt0000001", "tt0000002"])
+
+    sorts = list(database.SORT_COLUMNS) + list(database.STATS_SORT_COLUMNS)
+    for sort_by in sorts:
+        for order in ("asc", "desc"):
+            _, _, cursor = database.get_movies(5, 0, sort_by, order)
+            database.get_movies(5, 0, sort_by, order, cursor=cursor, with_total=False)
+    filters = [
+        {"genre": "Drama"},
+        {"collection": "Star Collection"},
+        {"search": "star"},
+        {"search": "space", "genre": "Comedy"},
+    ]
+    for extra in filters:
+        _, _, cursor = database.get_movies(5, 0, "vote_average", "desc", **extra)
+        database.get_movies(5, 0, "vote_average", "desc", cursor=cursor, **extra)
+    _, _, cursor = database.get_movies(5, 0, "relevance", "asc", search="star")
+    database.get_movies(5, 0, "relevance", "asc", search="star", cursor=cursor)
+    database.get_movies(5, 10, "popularity", "desc")
+    database.CATALOG_ENGINE = "columnar"
+    _, _, cursor = database.get_movies(5, 0, "title", "asc", genre="Drama")
+    database.get_movies(5, 0, "title", "asc", genre="Drama", cursor=cursor)
+    database.CATALOG_ENGINE = "sqlite"
+
+    database.get_backlog("alice")
+    _, cursor = database.get_watched_movies("alice", limit=2)
+    database.get_watched_movies("alice", limit=2, cursor=cursor)
+    list(database.iter_watched_movies("alice", fields=["title"]))
+    dashboard = database.get_dashboard("alice", limit=1, with_feed=True)
+    database.get_dashboard("bob", limit=1, viewer="alice")
+    database.get_dashboard(
+        "alice",
+        limit=1,
+        watched_cursor=dashboard["watched"]["next_cursor"],
+        backlog_cursor=dashboard["backlog"]["next_cursor"],
+    )
+    database.get_recommendations("alice")
+
+    database.create_user("frank", "x")
+    database.update_bio("frank", "hello")
+    database.add_friend("frank", "alice")
+    database.add_to_backlog("frank", 5)
+    database.remove_from_backlog("frank", 5)
+    database.add_to_backlog("frank", 6)
+    database.remove_movie_from_backlog("frank", 6)
+    database.mark_movie_as_watched("frank", 7, "good", 8)
+    database.update_movie_review("frank", 7, "better", 9)
+    database.mark_movie_as_watched("frank", 6, "fine", 6, from_backlog=True)
+    database.prune_feeds(["frank"])
+    database.apply_bulk(
+        "frank",
+        [
+            {"op": "add_to_backlog", "movie_id": 8},
+            {"op": "add_to_backlog", "movie_id": 9},
+            {"op": "remove_from_backlog", "movie_id": 8},
+            {"op": "mark_watched", "movie_id": 9, "review": "fun", "rating": 7},
+            {"op": "update_review", "movie_id": 9, "review": "great", "rating": 9},
+        ],
+    )
+    for target in database.IMPORT_STATEMENTS:
+        diary = io.StringIO("Name,Year,Rating\nStar 1,,4\nNot A Film,2001,3\n")
+        list(database.import_history("frank", diary, target))
+
+
+def database_helpers():
+    """Names of the functions in database.py that query the database."""
+    return {
+        name
+        for name, function in inspect.getmembers(database, inspect.isfunction)
+        if function.__module__ == "database"
+        and name not in ("get_db", "_write")
+        and re.search(
+            r"get_db\(|poster_cache\.get|_write\(", inspect.getsource(function)
+        )
+    }
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in TABLE_REFERENCE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in NOT_ALIASES:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn, sql, parameters, tables):
+    """Return (tables fully scanned, plan lines) for one statement."""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+    aliases = table_aliases(sql)
+    scanned = []
+    for line in plan:
+        match = FULL_SCAN.match(line)
+        if match:
+            table = aliases.get(match.group(1), match.group(1))
+            # Subquery results and CTEs show up as SCAN of their alias
+            if table in tables:
+                scanned.append(table)
+    return scanned, plan
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.path = support.use_database(self, factory=RecordingConnection)
+        seed(self.path)
+        RecordingConnection.statements = []
+        RecordingConnection.callers = set()
+        engine = database.CATALOG_ENGINE
+        self.addCleanup(setattr, database, "CATALOG_ENGINE", engine)
+        exercise()
+
+    def test_no_query_scans_a_whole_table(self):
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        tables = {
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        failures, seen = [], set()
+        for function, sql, parameters in RecordingConnection.statements:
+            if (function, sql) in seen:
+                continue
+            seen.add((function, sql))
+            scanned, plan = full_scans(conn, sql, parameters, tables)
+            for table in scanned:
+                if (function, table) not in ALLOWED_SCANS:
+                    failures.append(
+                        f"FULL SCAN of {table} in {function}: {' '.join(sql.split())}"
+                        + "".join(f"\n    {line}" for line in plan)
+                    )
+        self.assertFalse(failures, "\n".join(failures))
+
+    def test_every_helper_is_exercised(self):
+        # Writes run on the writer thread, in an operation named after the
+        # helper with a leading underscore, so the helper itself is never on
+        # that stack
+        covered = RecordingConnection.callers | {
+            name[1:] for name in RecordingConnection.callers if name.startswith("_")
+        }
+        self.assertEqual(sorted(database_helpers() - covered), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Item-item recommendations from the ratings in watched.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import random
+import unittest
+
+import support
+import database
+from recommend import ItemItemRecommender
+
+ACTION, ROMANCE = range(1, 6), range(6, 11)
+
+
+def ratings(seed=0):
+    """Ten users who love ACTION and dislike ROMANCE, and ten the other way round."""
+    rng = random.Random(seed)
+    rows = []
+    for user in range(20):
+        loves, dislikes = (ACTION, ROMANCE) if user < 10 else (ROMANCE, ACTION)
+        for movie_id in loves:
+            if rng.random() < 0.8:
+                rows.append((f"user{user}", movie_id, rng.choice((8, 9, 10))))
+        for movie_id in dislikes:
+            if rng.random() < 0.8:
+                rows.append((f"user{user}", movie_id, rng.choice((0, 1, 2))))
+    return rows
+
+
+class RecommenderTest(unittest.TestCase):
+    def test_recommends_what_similar_raters_liked(self):
+        recommender = ItemItemRecommender()
+        recommender.build(ratings())
+        scored = recommender.recommend({1: 10, 6: 1}, n=8)
+        ids = [movie_id for movie_id, _ in scored]
+        self.assertEqual(sorted(ids[:4]), [2, 3, 4, 5])
+        self.assertTrue(all(score > 5 for _, score in scored[:4]))
+        self.assertTrue(all(score < 5 for _, score in scored[4:]))
+
+    def test_watched_and_excluded_films_are_never_recommended(self):
+        recommender = ItemItemRecommender()
+        recommender.build(ratings())
+        scored = recommender.recommend({1: 10, 2: 9}, exclude={3})
+        self.assertFalse({1, 2, 3} & {movie_id for movie_id, _ in scored})
+
+    def test_recorded_ratings_match_a_full_rebuild(self):
+        rows = ratings()
+        new = [
+            ("user0", 6, 9),
+            ("user3", 11, 10),
+            ("newcomer", 2, 10),
+            ("user1", 1, None),
+        ]
+        incremental = ItemItemRecommender()
+        incremental.build(rows)
+        for row in new:
+            incremental.record_rating(*row)
+
+        rebuilt = ItemItemRecommender()
+        latest = {(username, movie_id): rating for username, movie_id, rating in rows}
+        latest.update(
+            {(username, movie_id): rating for username, movie_id, rating in new}
+        )
+        rebuilt.build([(*key, rating) for key, rating in latest.items()])
+
+        for history in ({1: 10}, {6: 9, 2: 3}, {11: 8, 4: 1}):
+            got = dict(incremental.recommend(history, n=20))
+            expected = dict(rebuilt.recommend(history, n=20))
+            self.assertEqual(got.keys(), expected.keys(), history)
+            for movie_id, score in expected.items():
+                self.assertAlmostEqual(got[movie_id], score, places=2)
+
+
+class GetRecommendationsTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        rows = ratings()
+        support.add_users(*sorted({username for username, _, _ in rows}), "alice")
+        support.add_movies(10)
+        with database.get_db(write=True) as conn:
+            conn.executemany(
+                "INSERT INTO watched (username, movie_id, rating) VALUES (?, ?, ?)",
+                rows + [("alice", 1, 10)],
+            )
+
+    def test_backlog_films_are_left_out(self):
+        database.add_to_backlog("alice", 2)
+        recommended = [movie["id"] for movie in database.get_recommendations("alice")]
+        self.assertEqual(sorted(recommended[:3]), [3, 4, 5])
+        self.assertNotIn(1, recommended)
+        self.assertNotIn(2, recommended)
+
+    def test_new_ratings_count_without_a_rebuild(self):
+        database.get_recommendations("alice")
+        built_at = database.recommender.built_at
+        database.mark_movie_as_watched("alice", 6, rating=10)
+        recommended = database.get_recommendations("alice")
+        self.assertEqual(database.recommender.built_at, built_at)
+        romance = [movie for movie in recommended if movie["id"] in ROMANCE]
+        self.assertTrue(romance)
+        self.assertTrue(all(movie["predicted_rating"] > 5 for movie in romance))
+
+
+if __name__ == "__main__":
+    unittest.main()
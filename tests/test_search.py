@@ -0,0 +1,80 @@
+"""Text search on /get_movies through the movies_fts index.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import unittest
+
+import support
+import database
+
+TITLES = {
+    1: "Galaxy Quest",
+    2: "A Quiet Place",
+    3: "Amélie",
+    4: "The Long Walk",
+    5: "Quest for Fire",
+}
+OVERVIEWS = {
+    2: "A family hides from creatures, far from any galaxy.",
+    4: "A quest across the country on foot.",
+}
+
+
+def search(text, sort_by="relevance", limit=50, cursor=None):
+    _, movies, next_cursor = database.get_movies(
+        limit, 0, sort_by, "asc", search=text, cursor=cursor
+    )
+    return [movie["id"] for movie in movies], next_cursor
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        support.add_movies(
+            len(TITLES),
+            title=TITLES.get,
+            overview=lambda i: OVERVIEWS.get(i, ""),
+        )
+
+    def test_title_matches_rank_above_overview_matches(self):
+        self.assertEqual(search("galaxy")[0], [1, 2])
+        ids, _ = search("quest")
+        self.assertEqual(sorted(ids[:2]), [1, 5])
+        self.assertEqual(ids[2:], [4])
+
+    def test_prefixes_and_accents_match(self):
+        self.assertEqual(search("gal")[0], [1, 2])
+        self.assertEqual(search("amelie")[0], [3])
+        self.assertEqual(search("galaxy quest")[0], [1])
+
+    def test_query_syntax_in_the_input_is_just_text(self):
+        for text in ('quest"', "quest AND", "NEAR(quest", "quest*", "-quest"):
+            ids, _ = search(text)
+            self.assertTrue(set(ids) <= {1, 4, 5}, text)
+        # No words at all is no search
+        self.assertEqual(sorted(search("?!")[0]), list(TITLES))
+
+    def test_other_sorts_filter_by_the_search(self):
+        self.assertEqual(search("quest", sort_by="title")[0], [1, 5, 4])
+
+    def test_relevance_pages_cover_every_match_once(self):
+        seen, cursor = [], None
+        while True:
+            ids, cursor = search("quest", limit=1, cursor=cursor)
+            seen += ids
+            if cursor is None:
+                break
+        self.assertEqual(seen, search("quest")[0])
+
+    def test_index_follows_title_changes_and_deletes(self):
+        support.execute("UPDATE movies SET title = 'Moon' WHERE id = 1")
+        self.assertEqual(search("galaxy")[0], [2])
+        self.assertEqual(search("moon")[0], [1])
+        support.execute("DELETE FROM movie_genres WHERE movie_id = 1")
+        support.execute("DELETE FROM movies WHERE id = 1")
+        self.assertEqual(search("moon")[0], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
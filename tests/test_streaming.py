@@ -0,0 +1,107 @@
+"""Cursor pages and NDJSON exports of reviews and watch history.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import json
+import unittest
+
+import support
+import app
+import database
+
+USERS = [f"user{n:02d}" for n in range(30)]
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        support.use_database(self)
+        support.add_users(*USERS)
+        support.add_movies(40)
+        # Groups of rows share a timestamp, so pages split ties
+        rows = [
+            (username, 1, f"review by {username}", n % 11, n // 4)
+            for n, username in enumerate(USERS)
+        ]
+        rows += [
+            ("user00", movie_id, None, None, movie_id // 3) for movie_id in range(2, 41)
+        ]
+        with database.get_db(write=True) as conn:
+            conn.executemany(
+                "INSERT INTO watched (username, movie_id, review, rating, timestamp) "
+                "VALUES (?, ?, ?, ?, datetime('2024-01-01', ? || ' days'))",
+                rows,
+            )
+        page_size = database.STREAM_PAGE_SIZE
+        database.STREAM_PAGE_SIZE = 7
+        self.addCleanup(setattr, database, "STREAM_PAGE_SIZE", page_size)
+        self.client = app.app.test_client()
+
+    def pages(self, path, key, **params):
+        """Every row of ``path``, following next_cursor a JSON page at a time."""
+        rows, cursor = [], None
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            body = self.client.get(path, query_string=query).get_json()
+            rows += body[key]
+            cursor = body["next_cursor"]
+            if not cursor:
+                return rows
+
+    def export(self, path, **params):
+        response = self.client.get(path, query_string=dict(params, format="ndjson"))
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        return [json.loads(line) for line in response.data.decode().splitlines()]
+
+    def test_review_exports_match_the_pages(self):
+        pages = self.pages("/reviews/1", "reviews", limit=4)
+        self.assertEqual(len(pages), len(USERS))
+        self.assertEqual(len({review["username"] for review in pages}), len(USERS))
+        self.assertEqual(self.export("/reviews/1"), pages)
+        timestamps = [review["timestamp"] for review in pages]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_history_exports_match_the_pages(self):
+        path = "/get_watched_movies"
+        pages = self.pages(path, "movies", username="user00", limit=6)
+        self.assertEqual(pages[-1]["id"], 1)
+        self.assertEqual(len(pages), 40)
+        self.assertEqual(self.export(path, username="user00"), pages)
+
+        fields = {"username": "user00", "fields": "title"}
+        projected = self.export(path, **fields)
+        self.assertEqual(projected, self.pages(path, "movies", limit=9, **fields))
+        self.assertEqual(
+            set(projected[0]),
+            {"id", "title", "username", "movie_id", "review", "rating", "timestamp"},
+        )
+
+    def test_an_export_resumes_from_a_cursor(self):
+        first = self.client.get("/reviews/1", query_string={"limit": 10}).get_json()
+        rest = self.export("/reviews/1", cursor=first["next_cursor"])
+        self.assertEqual(first["reviews"] + rest, self.export("/reviews/1"))
+
+    def test_writes_during_an_export_are_not_repeated(self):
+        rows = database.iter_watched_movies("user00")
+        seen = [next(rows)["movie_id"] for _ in range(10)]
+        # Rewatching films already sent moves them to the front, behind the keyset
+        for movie_id in seen[:3]:
+            database.mark_movie_as_watched("user00", movie_id, rating=5)
+        seen += [row["movie_id"] for row in rows]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 40)
+
+    def test_bad_cursors_are_refused_before_streaming(self):
+        for path, params in (
+            ("/reviews/1", {}),
+            ("/get_watched_movies", {"username": "user00"}),
+        ):
+            for format in ("json", "ndjson"):
+                response = self.client.get(
+                    path, query_string=dict(params, cursor="garbage", format=format)
+                )
+                self.assertEqual(response.status_code, 400, (path, format))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""GroupCommitWriter: grouped commits, per-operation savepoints, back-pressure.
+
+Run from the repository root with ``python -m unittest discover tests``.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import support  # noqa: F401 (puts flask/ on the path)
+from pool import ConnectionPool
+from writer import GroupCommitWriter, WriteQueueFull
+
+
+def insert(conn, n):
+    conn.execute("INSERT INTO t (n) VALUES (?)", (n,))
+    return n
+
+
+def insert_then_fail(conn, n):
+    conn.execute("INSERT INTO t (n) VALUES (?)", (n,))
+    raise ValueError(f"operation {n} failed")
+
+
+class GroupCommitWriterTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.pool = ConnectionPool(os.path.join(tmp.name, "writer.sqlite"))
+        self.addCleanup(self.pool.close)
+        with self.pool.connection(write=True) as conn:
+            conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+            conn.execute(
+                "CREATE TABLE t (n INTEGER CHECK (n >= 0), "
+                "parent INTEGER REFERENCES parent (id))"
+            )
+
+    def writer(self, **kwargs):
+        writer = GroupCommitWriter(self.pool.connection, **kwargs)
+        self.addCleanup(writer.close, 5)
+        return writer
+
+    def hold(self, writer):
+        """Keep the writer busy until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+
+        def wait(conn):
+            started.set()
+            release.wait(5)
+
+        writer.submit(wait)
+        started.wait(5)
+        return release
+
+    def rows(self):
+        with self.pool.connection() as conn:
+            return sorted(row[0] for row in conn.execute("SELECT n FROM t"))
+
+    def test_waiting_operations_commit_as_one_group(self):
+        writer = self.writer()
+        release = self.hold(writer)
+        futures = [writer.submit(insert, n) for n in range(10)]
+        release.set()
+        self.assertEqual([future.result(5) for future in futures], list(range(10)))
+        stats = writer.stats()
+        self.assertEqual((stats["batches"], stats["largest_batch"]), (2, 10))
+        self.assertEqual(self.rows(), list(range(10)))
+
+    def test_a_failed_operation_is_rolled_back_alone(self):
+        writer = self.writer()
+        release = self.hold(writer)
+        futures = [
+            writer.submit(insert, 1),
+            writer.submit(insert_then_fail, 2),
+            writer.submit(insert, -3),  # violates the CHECK
+            writer.submit(insert, 4),
+        ]
+        release.set()
+        self.assertEqual(futures[0].result(5), 1)
+        with self.assertRaisesRegex(ValueError, "operation 2 failed"):
+            futures[1].result(5)
+        with self.assertRaises(sqlite3.IntegrityError):
+            futures[2].result(5)
+        self.assertEqual(futures[3].result(5), 4)
+        self.assertEqual(self.rows(), [1, 4])
+        self.assertEqual(writer.stats()["failed"], 2)
+
+    def test_a_failed_commit_fails_the_whole_group(self):
+        def orphan(conn):
+            # Checked at COMMIT, after every savepoint was released
+            conn.execute("PRAGMA defer_foreign_keys = ON")
+            conn.execute("INSERT INTO t (n, parent) VALUES (99, 1)")
+
+        writer = self.writer()
+        release = self.hold(writer)
+        futures = [writer.submit(insert, 1), writer.submit(orphan)]
+        release.set()
+        for future in futures:
+            with self.assertRaises(sqlite3.IntegrityError):
+                future.result(5)
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(writer.stats()["failed_batches"], 1)
+
+        # The writer carries on with the next group
+        self.assertEqual(writer.submit(insert, 2).result(5), 2)
+        self.assertEqual(self.rows(), [2])
+
+    def test_a_full_queue_rejects_new_writes(self):
+        writer = self.writer(max_queue=2, timeout=0.05)
+        release = self.hold(writer)
+        queued = [writer.submit(insert, n) for n in range(2)]
+        with self.assertRaises(WriteQueueFull):
+            writer.submit(insert, 2)
+        release.set()
+        self.assertEqual([future.result(5) for future in queued], [0, 1])
+        self.assertEqual(writer.stats()["rejected"], 1)
+
+    def test_close_finishes_queued_operations(self):
+        writer = self.writer()
+        release = self.hold(writer)
+        futures = [writer.submit(insert, n) for n in range(3)]
+        release.set()
+        writer.close(5)
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.rows(), [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()